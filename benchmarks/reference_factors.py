@@ -0,0 +1,121 @@
+# benchmarks/reference_factors.py
+"""
+基准测试用的 Alpha101 参考因子: 按代码生成 Prompt 的规范手写的 pandas 实现 (代表 LLM 生成代码的典型开销)、
+调用 engine.ts_ops 算子库与预计算派生字段的写法，以及等价的 DSL 公式 (走 Executor.run_formula 原生求值)。
+"""
+import numpy as np
+import pandas as pd
+from engine.ts_ops import correlation, ts_rank
+
+
+def Alpha006(df_raw, df_index):
+    """-1 * correlation(open, volume, 10)"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay', 'OpenPrice', 'TurnOverVolume']].copy()
+    df['ov'] = df['OpenPrice'] * df['TurnOverVolume']
+    g = df.groupby('SecuCode')
+    mean_o = g['OpenPrice'].rolling(10).mean().reset_index(level=0, drop=True)
+    mean_v = g['TurnOverVolume'].rolling(10).mean().reset_index(level=0, drop=True)
+    mean_ov = g['ov'].rolling(10).mean().reset_index(level=0, drop=True)
+    std_o = g['OpenPrice'].rolling(10).std(ddof=0).reset_index(level=0, drop=True)
+    std_v = g['TurnOverVolume'].rolling(10).std(ddof=0).reset_index(level=0, drop=True)
+    corr = (mean_ov - mean_o * mean_v) / (std_o * std_v)
+    df['Alpha006'] = (-1 * corr).replace([np.inf, -np.inf], np.nan)
+    return df[['SecuCode', 'TradingDay', 'Alpha006']]
+
+
+def Alpha012(df_raw, df_index):
+    """sign(delta(volume, 1)) * (-1 * delta(close, 1))"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    g = df_raw.groupby('SecuCode')
+    df['Alpha012'] = np.sign(g['TurnOverVolume'].diff(1)) * (-1 * g['ClosePrice'].diff(1))
+    return df
+
+
+def Alpha033(df_raw, df_index):
+    """rank(-1 * (1 - open / close))"""
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    df['x'] = -1 * (1 - df_raw['OpenPrice'] / (df_raw['ClosePrice'] + 1e-9))
+    df['Alpha033'] = df.groupby('TradingDay')['x'].rank(pct=True)
+    return df[['SecuCode', 'TradingDay', 'Alpha033']]
+
+
+def Alpha004(df_raw, df_index):
+    """-1 * ts_rank(rank(low), 9)"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    df['r'] = df_raw.groupby('TradingDay')['LowPrice'].rank(pct=True)
+    ts_rank = df.groupby('SecuCode')['r'].rolling(9).rank(pct=True).reset_index(level=0, drop=True)
+    df['Alpha004'] = -1 * ts_rank
+    return df[['SecuCode', 'TradingDay', 'Alpha004']]
+
+
+def Alpha006Ops(df_raw, df_index):
+    """Alpha006 的算子库写法 (engine.ts_ops)"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    df['Alpha006Ops'] = -1 * correlation(df_raw['OpenPrice'], df_raw['TurnOverVolume'], 10, by=df_raw['SecuCode'])
+    return df
+
+
+def Alpha004Ops(df_raw, df_index):
+    """Alpha004 的算子库写法 (engine.ts_ops)"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    r = df_raw.groupby('TradingDay')['LowPrice'].rank(pct=True)
+    df['Alpha004Ops'] = -1 * ts_rank(r, 9, by=df_raw['SecuCode'])
+    return df
+
+
+def Alpha101(df_raw, df_index):
+    """(close - open) / ((high - low) + 0.001)"""
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    df['Alpha101'] = (df_raw['ClosePrice'] - df_raw['OpenPrice']) / (df_raw['HighPrice'] - df_raw['LowPrice'] + 0.001)
+    return df
+
+
+def BetaHS300(df_raw, df_index):
+    """个股 20 日收益与沪深 300 收益的协方差 / 指数方差 (指数 merge 的典型写法)"""
+    idx = df_index[['TradingDay']].copy()
+    idx['idx_ret'] = df_index['HS300'].pct_change()
+    df = pd.merge(df_raw[['SecuCode', 'TradingDay', 'ClosePrice', 'PrevClosePrice']], idx, on='TradingDay', how='left')
+    df = df.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df['ret'] = df['ClosePrice'] / df['PrevClosePrice'] - 1
+    df['xy'] = df['ret'] * df['idx_ret']
+    g = df.groupby('SecuCode')
+    mean_x = g['ret'].rolling(20).mean().reset_index(level=0, drop=True)
+    mean_y = g['idx_ret'].rolling(20).mean().reset_index(level=0, drop=True)
+    mean_xy = g['xy'].rolling(20).mean().reset_index(level=0, drop=True)
+    var_y = g['idx_ret'].rolling(20).var(ddof=0).reset_index(level=0, drop=True)
+    df['BetaHS300'] = ((mean_xy - mean_x * mean_y) / (var_y + 1e-12)).replace([np.inf, -np.inf], np.nan)
+    return df[['SecuCode', 'TradingDay', 'BetaHS300']]
+
+
+def BetaHS300Aligned(df_raw, df_index):
+    """BetaHS300 的预对齐写法: 直接读取 df_raw 中的 returns / idx_HS300_ret，无需 merge"""
+    df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
+    df = df_raw[['SecuCode', 'TradingDay']].copy()
+    df['ret'] = df_raw['returns']
+    df['idx_ret'] = df_raw['idx_HS300_ret']
+    df['xy'] = df['ret'] * df['idx_ret']
+    g = df.groupby('SecuCode')
+    mean_x = g['ret'].rolling(20).mean().reset_index(level=0, drop=True)
+    mean_y = g['idx_ret'].rolling(20).mean().reset_index(level=0, drop=True)
+    mean_xy = g['xy'].rolling(20).mean().reset_index(level=0, drop=True)
+    var_y = g['idx_ret'].rolling(20).var(ddof=0).reset_index(level=0, drop=True)
+    df['BetaHS300Aligned'] = ((mean_xy - mean_x * mean_y) / (var_y + 1e-12)).replace([np.inf, -np.inf], np.nan)
+    return df[['SecuCode', 'TradingDay', 'BetaHS300Aligned']]
+
+
+REFERENCE_FACTORS = [Alpha006, Alpha012, Alpha033, Alpha004, Alpha006Ops, Alpha004Ops, Alpha101, BetaHS300,
+                     BetaHS300Aligned]
+
+# 与上面 pandas 实现等价的 DSL 公式
+REFERENCE_FORMULAS = {
+    "Alpha006": "-1 * correlation(open, volume, 10)",
+    "Alpha012": "sign(delta(volume, 1)) * (-1 * delta(close, 1))",
+    "Alpha033": "rank(-1 * (1 - open / close))",
+    "Alpha004": "-1 * ts_rank(rank(low), 9)",
+    "Alpha101": "(close - open) / ((high - low) + 0.001)",
+}
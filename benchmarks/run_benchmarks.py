@@ -0,0 +1,242 @@
+# benchmarks/run_benchmarks.py
+"""
+性能基准: 在合成 A 股数据 (data_loader.synthetic) 上测量
+    load               DataLoader.load
+    run:<因子>         Executor.run (参考 pandas 因子，含冒烟测试与写入，后台写入时等待写完)
+    run:_all           依次执行全部参考因子后等待写入完成 (启用后台写入时执行与写盘重叠)
+    formula:<因子>     Executor.run_formula (参考 DSL 公式)
+    write:<因子>       因子输出写入 (write_factor)
+每个规模在独立子进程中运行，峰值 RSS 互不影响。结果写为 JSON；指定 --baseline 时与基线比较，
+吞吐量下降或峰值分配内存增长超过 --tolerance 记为回归 (退出码 1)。
+
+用法:
+    python -m benchmarks.run_benchmarks --stocks 1000 --years 1
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/bench_xxx.json
+    python -m benchmarks.run_benchmarks --load-profile compact
+    python -m benchmarks.run_benchmarks --sync-write
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config import settings
+from data_loader.loader import DataLoader
+from data_loader.synthetic import TRADING_DAYS_PER_YEAR, write_synthetic_dataset
+from engine.executor import Executor
+from engine.factor_store import get_factor_store, write_factor
+from engine.factor_writer import flush_factor_writes
+from engine.profiler import measure, peak_rss_mb
+from benchmarks.reference_factors import REFERENCE_FACTORS, REFERENCE_FORMULAS
+from utils.logger import logger
+
+DEFAULT_STOCKS = [1000, 5000]
+DEFAULT_YEARS = [1, 5, 15]
+# 写入基准使用的因子 (计算开销最小，只测写入)
+WRITE_FACTOR = "Alpha101"
+
+
+def _measured(fn, trace_allocations):
+    settings.PROFILE_TRACE_ALLOCATIONS = trace_allocations
+    profile = {}
+    with measure(profile):
+        success, message = fn()
+    # 每个规模在独立子进程中运行，进程生命周期的峰值 RSS 即该规模到目前为止的峰值
+    profile["peak_rss_mb"] = peak_rss_mb()
+    return success, message, profile
+
+
+def _timed(results, scale, case, rows, repeat, fn, trace_allocations=True):
+    """
+    重复执行 fn，记录最短墙钟时间 (及对应 CPU 时间) 与进程峰值 RSS；
+    tracemalloc 会显著拖慢创建大量 Python 对象的操作，因此计时轮次不统计分配，峰值分配内存另跑一轮测量
+    :param fn: 返回 (success, message)
+    Returns:
+        结果字典，失败时含 'error'
+    """
+    profiles = []
+    for _ in range(repeat):
+        success, message, profile = _measured(fn, False)
+        if not success:
+            logger.error(f"[{scale}] {case} 失败: {message}")
+            result = {"scale": scale, "case": case, "error": str(message)[-500:]}
+            results.append(result)
+            return result
+        profiles.append(profile)
+        logger.info(f"[{scale}] {case}: {profile['wall_sec']:.2f}s")
+
+    alloc_peak = None
+    if trace_allocations:
+        success, _, profile = _measured(fn, True)
+        alloc_peak = profile["alloc_peak_mb"] if success else None
+
+    fastest = min(profiles, key=lambda p: p["wall_sec"])
+    result = {
+        "scale": scale, "case": case, "rows": rows,
+        "wall_sec": fastest["wall_sec"], "cpu_sec": fastest["cpu_sec"],
+        "alloc_peak_mb": alloc_peak,
+        "peak_rss_mb": max(p["peak_rss_mb"] or 0 for p in profiles) or None,
+    }
+    _set_rows(result, rows)
+    results.append(result)
+    return result
+
+
+def _set_rows(result, rows):
+    result["rows"] = rows
+    result["rows_per_sec"] = rows / result["wall_sec"] if rows and result["wall_sec"] > 0 else None
+
+
+def bench_scale(num_stocks, years, data_root, repeat, trace_allocations=True, load_profile=None, async_write=None):
+    """单个规模的全部基准 (在子进程中执行)"""
+    num_days = years * TRADING_DAYS_PER_YEAR
+    scale = f"{num_stocks}x{years}y"
+    stock_path, index_path = write_synthetic_dataset(os.path.join(data_root, scale), num_stocks, num_days)
+    results = []
+    bundle = None
+
+    def load():
+        nonlocal bundle
+        bundle = DataLoader(stock_path, index_path, profile=load_profile).load()
+        return True, "Success"
+
+    # 行数在加载后才知道，吞吐量事后补算
+    load_result = _timed(results, scale, "load", None, repeat, load, trace_allocations)
+    rows = len(bundle["stock"])
+    _set_rows(load_result, rows)
+    load_result["data_mb"] = sum(bundle[key].memory_usage(deep=True).sum() for key in ("stock", "index")) / 1024 / 1024
+
+    output_dir = tempfile.mkdtemp(prefix="factor_bench_")
+    try:
+        if settings.FACTOR_STORE_ENABLED:
+            # 分区因子库需先建立键 (每次运行只做一次)
+            def sync_keys():
+                get_factor_store(output_dir).sync_keys(bundle["stock"])
+                return True, "Success"
+            _timed(results, scale, "write:_keys", rows, 1, sync_keys, trace_allocations=False)
+
+        executor = Executor(bundle, async_write=async_write)
+
+        def run_and_wait(func):
+            success, message = executor.run(func, func.__name__, output_dir)
+            return executor.wait_written(func.__name__, output_dir) if success else (success, message)
+
+        for func in REFERENCE_FACTORS:
+            _timed(results, scale, f"run:{func.__name__}", rows, repeat, lambda: run_and_wait(func), trace_allocations)
+
+        def run_all():
+            for func in REFERENCE_FACTORS:
+                success, message = executor.run(func, func.__name__, output_dir)
+                if not success:
+                    return success, message
+            failures = flush_factor_writes()
+            return (False, str(failures)) if failures else (True, "Success")
+        _timed(results, scale, "run:_all", rows * len(REFERENCE_FACTORS), repeat, run_all, trace_allocations=False)
+
+        for name, formula in REFERENCE_FORMULAS.items():
+            def run_formula():
+                # 清空子表达式缓存，重复执行时不命中上一轮的结果
+                executor.expr_cache.clear()
+                return executor.run_formula(formula, f"{name}_dsl", output_dir)
+            _timed(results, scale, f"formula:{name}", rows, repeat, run_formula, trace_allocations)
+
+        func = next(f for f in REFERENCE_FACTORS if f.__name__ == WRITE_FACTOR)
+        df_factor, message = executor.compute(func, WRITE_FACTOR)
+        if df_factor is None:
+            results.append({"scale": scale, "case": f"write:{WRITE_FACTOR}", "error": message})
+        else:
+            def write():
+                write_factor(output_dir, df_factor, WRITE_FACTOR)
+                return True, "Success"
+            _timed(results, scale, f"write:{WRITE_FACTOR}", rows, repeat, write, trace_allocations)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线逐项比较
+    Returns:
+        回归项列表 [描述字符串]
+    """
+    base = {(r["scale"], r["case"]): r for r in baseline if "error" not in r}
+    regressions = []
+    for r in results:
+        old = base.get((r["scale"], r["case"]))
+        if old is None or "error" in r:
+            continue
+        if old.get("rows_per_sec") and r.get("rows_per_sec") and r["rows_per_sec"] < old["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"{r['scale']} {r['case']}: 吞吐量 {old['rows_per_sec']:,.0f} -> {r['rows_per_sec']:,.0f} 行/秒")
+        if old.get("alloc_peak_mb") and r.get("alloc_peak_mb") and r["alloc_peak_mb"] > old["alloc_peak_mb"] * (1 + tolerance):
+            regressions.append(f"{r['scale']} {r['case']}: 峰值分配 {old['alloc_peak_mb']:.0f} -> {r['alloc_peak_mb']:.0f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成数据上的性能基准")
+    parser.add_argument("--stocks", type=int, nargs="+", default=DEFAULT_STOCKS, help="股票数列表")
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS, help="年数列表 (每年 252 个交易日)")
+    parser.add_argument("--repeat", type=int, default=1, help="每项重复次数，取最短时间")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "quantfactor_synthetic"),
+                        help="合成数据缓存目录 (相同规模复用)")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 benchmarks/results/bench_<时间>.json")
+    parser.add_argument("--baseline", default=None, help="基线结果 JSON，用于检测回归")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="回归阈值 (相对变化)")
+    parser.add_argument("--no-alloc", action="store_true", help="不单独测量峰值分配内存 (节省一轮执行)")
+    parser.add_argument("--load-profile", choices=["full", "compact"], default=None,
+                        help="数据加载内存档位，默认取 settings.DATA_LOAD_PROFILE")
+    parser.add_argument("--sync-write", action="store_true", help="关闭后台写入 (与默认的后台写入对比)")
+    args = parser.parse_args()
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for num_stocks in args.stocks:
+        for years in args.years:
+            logger.info(f"\n====== 基准规模: {num_stocks} 只股票 x {years} 年 ======")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results.extend(pool.submit(bench_scale, num_stocks, years, args.data_dir, args.repeat,
+                                           not args.no_alloc, args.load_profile,
+                                           False if args.sync_write else None).result())
+
+    output = args.output or os.path.join(
+        project_root, "benchmarks", "results", f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"),
+                   "factor_store": settings.FACTOR_STORE_ENABLED,
+                   "load_profile": args.load_profile or settings.DATA_LOAD_PROFILE,
+                   "async_write": settings.ASYNC_WRITE_ENABLED and not args.sync_write,
+                   "results": results}, f, ensure_ascii=False, indent=2)
+    logger.info(f"基准结果已保存至: {output}")
+
+    logger.info("\n====== 基准汇总 ======")
+    for r in results:
+        if "error" in r:
+            logger.info(f"{r['scale']:>10} {r['case']:<22} 失败")
+            continue
+        alloc = f"{r['alloc_peak_mb']:.0f} MB" if r['alloc_peak_mb'] is not None else "N/A"
+        data = f" / 数据 {r['data_mb']:.0f} MB" if "data_mb" in r else ""
+        logger.info(f"{r['scale']:>10} {r['case']:<22} {r['wall_sec']:8.2f}s {r['rows_per_sec'] or 0:>14,.0f} 行/秒 "
+                    f"峰值分配 {alloc} / 进程 RSS {r['peak_rss_mb'] or 0:.0f} MB{data}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            logger.error(f"发现 {len(regressions)} 项性能回归 (阈值 {args.tolerance:.0%}):\n" + "\n".join(regressions))
+            sys.exit(1)
+        logger.info("与基线相比没有性能回归。")
+
+
+if __name__ == "__main__":
+    main()
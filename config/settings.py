@@ -27,12 +27,18 @@ MODEL_CONFIG = {
         "coding_model": "glm-4.7",
         "temperature_ideation": 0.7,
         "temperature_coding": 0.0,
+        "requests_per_minute": 60,
+        "tokens_per_minute": 1000000,
+        "max_concurrency": 8,
     },
     # "gemini": {
     #     "ideation_model": "gemini-3-pro-preview",
     #     "coding_model": "gemini-2.5-flash",
     #     "temperature_ideation": 0.7,
     #     "temperature_coding": 0.0,
+    #     "requests_per_minute": 60,
+    #     "tokens_per_minute": 1000000,
+    #     "max_concurrency": 8,
     # },
     "kimi": {
         "base_url": "https://api.moonshot.cn/v1",
@@ -40,6 +46,9 @@ MODEL_CONFIG = {
         "coding_model": "moonshot-v1-32k",
         "temperature_ideation": 0.7,
         "temperature_coding": 0.0,
+        "requests_per_minute": 60,
+        "tokens_per_minute": 128000,
+        "max_concurrency": 4,
     },
     "qwen": {
         "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
@@ -47,6 +56,9 @@ MODEL_CONFIG = {
         "coding_model": "qwen-max",  
         "temperature_ideation": 0.7,
         "temperature_coding": 0.0,
+        "requests_per_minute": 600,
+        "tokens_per_minute": 1000000,
+        "max_concurrency": 8,
     },
     "zhipu": {
         "base_url": "https://open.bigmodel.cn/api/paas/v4",
@@ -54,8 +66,23 @@ MODEL_CONFIG = {
         "coding_model": "glm-4.7",      
         "temperature_ideation": 0.7,
         "temperature_coding": 0.0,
+        "requests_per_minute": 300,
+        "tokens_per_minute": 1000000,
+        "max_concurrency": 8,
     }
 }
+# 以上 requests_per_minute / tokens_per_minute / max_concurrency 为各提供商的限流配额，请按账号等级调整
+
+# 限流 / 超时重试: 带抖动的指数退避 (秒)
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 60.0
+
+# LLM 补全磁盘缓存: 相同 (提供商, 模型, 温度, Prompt) 直接复用结果
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = r"D:\框架\QuantFactorAI\output\llm_cache.sqlite"
+LLM_CACHE_MAX_MB = 512
+LLM_CACHE_BYPASS_IDEATION = True   # 构思阶段温度较高，默认不走缓存
 
 # ===========================
 # 2. 数据与字段定义
@@ -77,8 +104,89 @@ INDEX_COLUMNS_DESC = """
 REQUIRED_OUTPUT_COLS = ['SecuCode', 'TradingDay']
 DEFAULT_NUM_VARIATIONS = 1
 
+# 数据加载内存档位:
+#   'full'    原始类型
+#   'compact' 价格 / 成交等字段 float32、SecuCode 分类编码、TradingDay int32 日期键 (YYYYMMDD)，常驻内存约减半；
+#             因子输出在 Executor 中还原为 6 位字符串代码与日期类型
+DATA_LOAD_PROFILE = 'full'
+DATA_LOAD_STOCK_COLUMNS = None   # 只读取这些股票字段 (TradingDay / SecuCode 总会读取)，None 表示全部
+DATA_LOAD_INDEX_COLUMNS = None   # 只读取这些指数字段，None 表示全部
+COMPACT_FLOAT32_RTOL = 1e-6      # 转为 float32 允许的最大相对误差，超过则该列保留原类型
+
+# ===========================
+# 3. 执行引擎配置
+# ===========================
+# DSL 子表达式缓存上限 (MB)，同一 Executor 内的因子共享中间面板
+SUBEXPR_CACHE_MAX_MB = 2048
+
+# 输入数据隔离方式: 'readonly' 全局共享一份只读数据 (零拷贝)，'copy' 每次执行深拷贝
+EXECUTION_ISOLATION = 'readonly'
+
+# 冒烟测试: 先在抽样子面板 (等间隔 N 只股票 x 最近 M 个交易日) 上试运行，通过后再跑全量数据
+SMOKE_TEST_ENABLED = True
+SMOKE_TEST_STOCKS = 50
+SMOKE_TEST_DAYS = 300
+
+# 并行执行的工作进程数，1 表示在主进程中顺序执行
+NUM_WORKERS = 1
+
+# 沙箱执行: LLM 生成的因子函数在独立子进程中运行，超限时终止并交给 LLM 修复
+# 开启后由沙箱负责并行 (最多 NUM_WORKERS 个子进程同时执行)，DSL 公式仍在主进程中求值
+SANDBOX_EXECUTION = True
+SANDBOX_WALL_TIME_SEC = 600     # 墙钟时间上限 (秒)
+SANDBOX_CPU_TIME_SEC = 1800     # CPU 时间上限 (秒)，仅 Linux/macOS 生效
+SANDBOX_MAX_RSS_MB = 16384      # 常驻内存上限 (MB)，不含共享的行情数据
+
+# 增量更新 (python main.py --update): 只在 回看窗口 + 新交易日 的数据切片上重算并追加新行
+INCREMENTAL_LOOKBACK_MARGIN = 10        # 额外预热的交易日数 (覆盖停牌缺口)
+INCREMENTAL_LOOKBACK_OVERRIDES = {}     # 手动声明回看窗口 {因子名: 交易日数}，也可在因子代码中定义 LOOKBACK = N
+
+# 因子代码在内存中编译加载，只有执行成功的因子才写入 .py 文件
+CODE_CACHE_SIZE = 256       # 按源码哈希缓存的代码对象数 (相同的 LLM 输出只编译一次)
+CODE_MODULE_LIMIT = 64      # sys.modules 中保留的因子模块数，超出时移除最早加载的
+
+# 异步流水线: 构思、编码、执行、记录四个阶段重叠进行；False 时按种子逐个顺序处理
+ASYNC_PIPELINE = True
+PIPELINE_IDEATION_CONCURRENCY = 2   # 同时构思的种子数
+PIPELINE_CODING_CONCURRENCY = 4     # 同时处于 编码/修复 循环中的因子数
+PIPELINE_QUEUE_SIZE = 16            # 阶段间队列容量
+
+# 因子存储: True 时 factors/ 为按年 (或月) 分区的宽表因子库 (每个分区一个 parquet 文件，键只存一份，每个因子一列)，False 时每个因子一个 parquet
+FACTOR_STORE_ENABLED = True
+FACTOR_STORE_PARTITION = 'year'   # 'year' 或 'month'
+FACTOR_WRITE_COMPRESSION = 'snappy'   # parquet 压缩算法 ('snappy' / 'zstd' / 'gzip' / None)
+FACTOR_WRITE_ROW_GROUP_SIZE = None    # parquet 行组行数，None 为 pyarrow 默认
+
+# 因子输出后台写入: 执行成功后结果交给后台线程写盘，下一个因子无需等待；记录前确认写入结果
+ASYNC_WRITE_ENABLED = True
+ASYNC_WRITE_MAX_PENDING_MB = 512      # 排队中的结果超过该内存时提交阻塞 (背压)
+
+# 批量因子评价: 运行结束后对成功的因子计算 IC / RankIC / IC 衰减 / 分层收益 / 换手率
+EVALUATE_AFTER_RUN = True
+EVAL_HORIZONS = [1, 5, 10, 20]   # 预测期 (交易日)，第一个用于 IC 与分层收益
+EVAL_QUANTILES = 5
+EVAL_BATCH_SIZE = 16             # 每批同时评价的因子数 (内存约 因子数 x 交易日 x 股票数 x 8 字节 x 数倍)
+
+# 相关性过滤: 与因子库 (factors/ 下已有因子) 的平均横截面相关 |rho| 达到阈值时记为 Redundant 并删除输出
+CORR_FILTER_ENABLED = True
+CORR_FILTER_THRESHOLD = 0.7
+CORR_FILTER_SAMPLE_DATES = 250   # 等间隔抽样的交易日数，索引内存约 因子数 x 抽样日 x 股票数 x 3 字节
+CORR_FILTER_CHUNK = 32           # 每次转换为 float32 参与计算的因子数
+
+# 挖掘记录: 所有运行共用 <输出目录>/factor_records.sqlite (WAL)，运行结束时导出本次的 factor_records_*.csv
+RECORDER_BATCH_SIZE = 20         # 缓冲区达到该条数时批量写入
+RECORDER_FLUSH_SEC = 30          # 距上次写入超过该秒数时写入 (限制异常退出时丢失的记录)
+
+# 资源画像: 每个因子记录 LLM 各阶段耗时与执行的墙钟 / CPU 时间、RSS 增量 (沙箱中另有独占进程的峰值 RSS)，
+# 运行结束时列出最慢的因子
+PROFILE_RSS_SAMPLE_SEC = 0.05    # 执行期间采样常驻内存的间隔 (秒)
+# 用 tracemalloc 统计峰值分配内存: 开销很大 (groupby / rolling 因子墙钟时间约翻倍)，只在基准测试或专门的画像运行中开启；
+# tracemalloc 为进程全局，统计值包含同一进程中其他线程 (异步流水线、并发因子) 的分配，不是单个因子独立的数值
+PROFILE_TRACE_ALLOCATIONS = False
+PROFILE_TOP_N = 10
+
 # ===========================
-# 3. 因子挖掘任务清单
+# 4. 因子挖掘任务清单
 # ===========================
 FACTOR_MINING_TASKS = [
     # momentum
@@ -1,7 +1,12 @@
 # core/llm_base.py
 from abc import ABC, abstractmethod
+from config import settings
+from core.llm_cache import CompletionCache, get_completion_cache
 
 class BaseLLM(ABC):
+    # 提供商名称，参与缓存键的计算
+    provider = None
+
     @abstractmethod
     def ideation(self, user_base_idea: str, num_variations: int) -> list[dict]:
         """构思因子，返回字典列表"""
@@ -10,4 +15,24 @@ class BaseLLM(ABC):
     @abstractmethod
     def code_generation(self, factor_description: str, factor_name: str) -> str:
         """生成代码，返回代码字符串"""
-        pass
\ No newline at end of file
+        pass
+
+    def cached_completion(self, stage, model, temperature, system, prompt, fetch):
+        """
+        带磁盘缓存的补全调用
+        :param stage: 'ideation' / 'code_generation' / 'code_refinement'
+        :param fetch: 无参函数，真正请求 API 并返回文本
+        """
+        cache = get_completion_cache()
+        if cache is None or (stage == "ideation" and settings.LLM_CACHE_BYPASS_IDEATION):
+            return fetch()
+
+        key = CompletionCache.make_key(self.provider, model, temperature, system, prompt)
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+        content = fetch()
+        if content:
+            cache.put(key, content)
+        return content
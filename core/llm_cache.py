@@ -0,0 +1,97 @@
+# core/llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from config import settings
+from utils.logger import logger
+
+
+class CompletionCache:
+    """
+    基于内容寻址的 LLM 补全缓存。
+    键为 (provider, model, temperature, system, prompt) 的 SHA-256，值为 zlib 压缩后的文本，
+    存放在单个 SQLite 文件中，超过容量上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON completions (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    @staticmethod
+    def make_key(provider, model, temperature, system, prompt):
+        payload = json.dumps([provider, model, temperature, system, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key, text):
+        value = zlib.compress(text.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            self._total_bytes += len(value) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到容量降到上限的 90%"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM completions ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", evicted)
+        logger.info(f"LLM 缓存已淘汰 {len(evicted)} 条记录。")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_completion_cache():
+    """全局共享的补全缓存，settings.LLM_CACHE_ENABLED 为 False 时返回 None"""
+    global _CACHE
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = CompletionCache(settings.LLM_CACHE_PATH, settings.LLM_CACHE_MAX_MB * 1024 * 1024)
+        return _CACHE
@@ -1,19 +1,41 @@
 # core/llm_deepseek.py
 from openai import OpenAI
 import json
+import re
 from core.llm_base import BaseLLM
+from core.rate_limiter import get_rate_limiter, estimate_tokens
 from core.prompts import IDEATION_PROMPT_TEMPLATE, CODE_GEN_PROMPT_TEMPLATE, CODE_REFINE_PROMPT_TEMPLATE
 from config import settings
 from utils.logger import logger
 
 class DeepSeekLLM(BaseLLM):
+    provider = 'deepseek'
+
     def __init__(self, api_key):
         self.config = settings.MODEL_CONFIG['deepseek']
+        self.limiter = get_rate_limiter('deepseek')
         self.client = OpenAI(
             api_key=api_key, 
             base_url=self.config['base_url']
         )
-        
+
+    def _chat(self, stage, model, system, prompt, temperature):
+        """带限流与缓存的 chat completion，返回文本"""
+        def fetch():
+            response = self.limiter.call(
+                self.client.chat.completions.create,
+                estimated_tokens=estimate_tokens(prompt),
+                model=model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+
+        return self.cached_completion(stage, model, temperature, system, prompt, fetch)
+
     def ideation(self, user_base_idea: str, num_variations: int) -> list[dict]:
         prompt = IDEATION_PROMPT_TEMPLATE.format(
             user_base_idea=user_base_idea, 
@@ -23,17 +45,14 @@ class DeepSeekLLM(BaseLLM):
         )
         
         try:
-            response = self.client.chat.completions.create(
+            content = self._chat(
+                stage="ideation",
                 model=self.config['ideation_model'],
-                messages=[
-                    {"role": "system", "content": "你是一个量化因子构思专家，只输出JSON。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
+                system="你是一个量化因子构思专家，只输出JSON。",
+                prompt=prompt,
                 temperature=self.config['temperature_ideation']
             )
             
-            content = response.choices[0].message.content
             content = content.strip().replace("```json", "").replace("```", "")
             return json.loads(content)
             
@@ -50,16 +69,13 @@ class DeepSeekLLM(BaseLLM):
         )
         
         try:
-            response = self.client.chat.completions.create(
+            return self._chat(
+                stage="code_generation",
                 model=self.config['coding_model'],
-                messages=[
-                    {"role": "system", "content": "你是一个量化因子代码生成器。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
+                system="你是一个量化因子代码生成器。",
+                prompt=prompt,
                 temperature=self.config['temperature_coding']
             )
-            return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"DeepSeek 代码生成失败: {e}")
@@ -77,16 +93,13 @@ class DeepSeekLLM(BaseLLM):
         )
         
         try:
-            response = self.client.chat.completions.create(
+            content = self._chat(
+                stage="code_refinement",
                 model=self.config['coding_model'],
-                messages=[
-                    {"role": "system", "content": "你是一个Python代码Debug专家。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
-                temperature=0.0 
+                system="你是一个Python代码Debug专家。",
+                prompt=prompt,
+                temperature=0.0
             )
-            content = response.choices[0].message.content
             
             content = re.sub(r"```python\s*", "", content, flags=re.IGNORECASE)
             content = re.sub(r"```", "", content)
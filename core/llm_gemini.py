@@ -1,16 +1,40 @@
 # core/llm_gemini.py
 import google.generativeai as genai
 import json
+import re
 from core.llm_base import BaseLLM
+from core.rate_limiter import get_rate_limiter, estimate_tokens
 from core.prompts import IDEATION_PROMPT_TEMPLATE, CODE_GEN_PROMPT_TEMPLATE, CODE_REFINE_PROMPT_TEMPLATE
 from config import settings
 from utils.logger import logger
 
 class GeminiLLM(BaseLLM):
+    provider = 'gemini'
+
     def __init__(self, api_key):
         genai.configure(api_key=api_key)
         self.config = settings.MODEL_CONFIG['gemini']
-        
+        self.limiter = get_rate_limiter('gemini')
+
+    def _generate(self, model, system, prompt, temperature, mime_type="text/plain"):
+        """经过令牌桶限流的 generate_content 调用，返回文本"""
+        client = genai.GenerativeModel(
+            model_name=model,
+            system_instruction=system,
+            generation_config={
+                "response_mime_type": mime_type,
+                "temperature": temperature
+            }
+        )
+        return self.limiter.call(client.generate_content, prompt, estimated_tokens=estimate_tokens(prompt)).text
+
+    def _chat(self, stage, model, system, prompt, temperature, mime_type="text/plain"):
+        """带限流与缓存的补全，返回文本"""
+        return self.cached_completion(
+            stage, model, temperature, system, prompt,
+            fetch=lambda: self._generate(model, system, prompt, temperature, mime_type)
+        )
+
     def ideation(self, user_base_idea: str, num_variations: int) -> list[dict]:
         prompt = IDEATION_PROMPT_TEMPLATE.format(
             user_base_idea=user_base_idea, 
@@ -20,17 +44,15 @@ class GeminiLLM(BaseLLM):
         )
         
         try:
-            model = genai.GenerativeModel(
-                model_name=self.config['ideation_model'],
-                system_instruction="你是一个量化因子构思专家，只输出JSON。",
-                generation_config={
-                    "response_mime_type": "application/json", 
-                    "temperature": self.config['temperature_ideation']
-                }
+            content = self._chat(
+                stage="ideation",
+                model=self.config['ideation_model'],
+                system="你是一个量化因子构思专家，只输出JSON。",
+                prompt=prompt,
+                temperature=self.config['temperature_ideation'],
+                mime_type="application/json"
             )
-            
-            response = model.generate_content(prompt)
-            return json.loads(response.text)
+            return json.loads(content)
             
         except Exception as e:
             logger.error(f"Gemini 构思失败: {e}")
@@ -45,18 +67,14 @@ class GeminiLLM(BaseLLM):
         )
         
         try:
-            model = genai.GenerativeModel(
-                model_name=self.config['coding_model'],
-                system_instruction="你是一个量化因子代码生成器。",
-                generation_config={
-                    "response_mime_type": "text/plain", 
-                    "temperature": self.config['temperature_coding']
-                }
+            return self._chat(
+                stage="code_generation",
+                model=self.config['coding_model'],
+                system="你是一个量化因子代码生成器。",
+                prompt=prompt,
+                temperature=self.config['temperature_coding']
             )
-            
-            response = model.generate_content(prompt)
-            return response.text
-            
+
         except Exception as e:
             logger.error(f"Gemini 代码生成失败: {e}")
             return None
@@ -73,18 +91,13 @@ class GeminiLLM(BaseLLM):
         )
         
         try:
-
-            response = self.client.chat.completions.create(
+            content = self._chat(
+                stage="code_refinement",
                 model=self.config['coding_model'],
-                messages=[
-                    {"role": "system", "content": "你是一个Python代码Debug专家。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
+                system="你是一个Python代码Debug专家。",
+                prompt=prompt,
                 temperature=0.0
             )
-            content = response.choices[0].message.content
-            
             content = re.sub(r"```python\s*", "", content, flags=re.IGNORECASE)
             content = re.sub(r"```", "", content)
             return content.strip()
@@ -1,6 +1,7 @@
 # core/llm_kimi.py
 from openai import OpenAI
 from core.llm_base import BaseLLM
+from core.rate_limiter import get_rate_limiter, estimate_tokens
 from config import settings
 from utils.logger import logger
 import json
@@ -13,12 +14,32 @@ from core.prompts import (
 )
 
 class KimiLLM(BaseLLM):
+    provider = 'kimi'
+
     def __init__(self, api_key):
         self.client = OpenAI(
             api_key=api_key,
             base_url=settings.MODEL_CONFIG['kimi']['base_url']
         )
         self.config = settings.MODEL_CONFIG['kimi']
+        self.limiter = get_rate_limiter('kimi')
+
+    def _chat(self, stage, model, system, prompt, temperature):
+        """带限流与缓存的 chat completion，返回文本"""
+        def fetch():
+            response = self.limiter.call(
+                self.client.chat.completions.create,
+                estimated_tokens=estimate_tokens(prompt),
+                model=model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+
+        return self.cached_completion(stage, model, temperature, system, prompt, fetch)
 
     def ideation(self, base_idea, num_variations=3):
         """Kimi 构思阶段"""
@@ -30,15 +51,13 @@ class KimiLLM(BaseLLM):
         )
 
         try:
-            response = self.client.chat.completions.create(
+            content = self._chat(
+                stage="ideation",
                 model=self.config['ideation_model'],
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are a helpful assistant.",
+                prompt=prompt,
                 temperature=self.config['temperature_ideation']
             )
-            content = response.choices[0].message.content
             
             # 清洗 Markdown 标记 (Kimi 经常喜欢包 ```json ... ```)
             content = re.sub(r"```json\s*", "", content)
@@ -59,15 +78,13 @@ class KimiLLM(BaseLLM):
         )
 
         try:
-            response = self.client.chat.completions.create(
+            code = self._chat(
+                stage="code_generation",
                 model=self.config['coding_model'],
-                messages=[
-                    {"role": "system", "content": "You are a Python expert."},
-                    {"role": "user", "content": prompt}
-                ],
+                system="You are a Python expert.",
+                prompt=prompt,
                 temperature=self.config['temperature_coding']
             )
-            code = response.choices[0].message.content
             
             # 清洗代码块标记
             code = re.sub(r"```python\s*", "", code)
@@ -90,16 +107,13 @@ class KimiLLM(BaseLLM):
         
         try:
             # 使用 coding_model 进行修复
-            response = self.client.chat.completions.create(
+            content = self._chat(
+                stage="code_refinement",
                 model=self.config['coding_model'],
-                messages=[
-                    {"role": "system", "content": "你是一个Python代码Debug专家。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
-                temperature=0.0 # 修复bug时温度要低，越精确越好
+                system="你是一个Python代码Debug专家。",
+                prompt=prompt,
+                temperature=0.0  # 修复bug时温度要低，越精确越好
             )
-            content = response.choices[0].message.content
             
             # 清洗代码
             content = re.sub(r"```python\s*", "", content, flags=re.IGNORECASE)
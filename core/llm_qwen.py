@@ -1,13 +1,17 @@
 from core.llm_kimi import KimiLLM
 from config import settings
+from core.rate_limiter import get_rate_limiter
 from openai import OpenAI
 
 class QwenLLM(KimiLLM):
     """Qwen 完全兼容 OpenAI 格式，继承 Kimi 的逻辑但重置 Client"""
+    provider = 'qwen'
+
     def __init__(self, api_key):
         super().__init__(api_key)
         
         self.config = settings.MODEL_CONFIG['qwen']
+        self.limiter = get_rate_limiter('qwen')
         
         self.client = OpenAI(
             api_key=api_key,
@@ -10,7 +10,7 @@ IDEATION_PROMPT_TEMPLATE = """
 
 [数据字典 (Input Data)]
 可用字段: {stock_columns}, {index_columns}。
-以下需自行处理
+以下派生字段已预先计算，可直接使用
 * **returns**: 日收益率 (close_to_close)
 * **vwap**: 成交量加权平均价
 * **adv{{d}}**: 过去d天的平均成交额 (Average Daily Volume)
@@ -80,17 +80,22 @@ CODE_GEN_PROMPT_TEMPLATE = """
 * **因子公式 (DSL)**: `{factor_description}` (请仔细阅读此处的公式)
 
 # [数据字段定义]
-# * df_raw (Long Format): {stock_columns}, (注意：不包含 ret，需通过 close 计算)
-# * df_index (Time Series): {index_columns} ，表示指数的每日价格
+# * df_raw (Long Format): {stock_columns}，另有预先计算的派生列 (见下文)
+# * df_index (Time Series): {index_columns} ，表示指数的每日价格 (通常无需直接使用，见下文 idx_ 列)
+# * TradingDay / SecuCode 可能是整数日期键 / 分类编码，只用于排序、分组与合并，不要转换其类型；价格等字段可能为 float32
 
 [函数签名强制约束 - 必须严格遵守]
 1. **函数定义**: 必须严格定义为 `def {factor_name}(df_raw, df_index):`
 2. **参数保留**: 即使因子逻辑**不需要**使用 `df_index`，也**必须**在函数参数中保留它，**严禁删除**。
 3. **导入库**: 必须导入必要的库，如 `import pandas as pd`, `import numpy as np`。
 
-如果你需要用到以下数据需根据输入信息计算：
-* **vwap**: 成交量加权平均价
-* **adv{{d}}**: 过去d天的平均成交额 (Average Daily Volume)
+以下派生列已由框架统一预先计算，**必须**直接读取 (如 `df_raw['returns']`、`df_raw['adv20']`)，**严禁**自行用 pct_change / rolling 重算:
+* **returns**: 日收益率 = ClosePrice / PrevClosePrice - 1
+* **vwap**: 成交量加权平均价 = TurnOverValue / TurnOverVolume
+* **adv{{d}}**: 过去d天的平均成交额 (TurnOverValue 的 d 日均值，窗口内有停牌时为 NaN)，d 为任意正整数，如 `adv20`
+* **cap**: 市值 (FloatMarketValue)
+* **idx_{{指数}}** / **idx_{{指数}}_ret**: 指数点位 / 指数日收益，已按 TradingDay 对齐到每一行，如 `df_raw['idx_HS300']`、`df_raw['idx_ZZ500_ret']`
+列名必须以字符串字面量写出 (不要写 f'adv{{d}}')，框架只附加代码中出现的派生列；sort_values / merge 后这些列随行保留。
 
 [DSL -> Pandas 翻译对照表 (必须严格查阅)]
 1. **基础运算**:
@@ -101,40 +106,46 @@ CODE_GEN_PROMPT_TEMPLATE = """
 
 2. **横截面 (Cross-Sectional)**:
    * `rank(x)` -> `df.groupby('TradingDay')['x'].rank(pct=True)`
-   * `scale(x)` -> `df.groupby('TradingDay')['x'].apply(lambda s: s.div(s.abs().sum()))` (或使用 transform 优化)
+   * `scale(x)` -> `df['x'] / df['x'].abs().groupby(df['TradingDay']).transform('sum')` (禁止 groupby().apply)
    
 3. **时序 (Time-Series) - 必须先 groupby('SecuCode')**:
    * `delay(x, d)` -> `.shift(d)`
    * `delta(x, d)` -> `.diff(d)`
-   * `ts_min(x, d)` -> `.rolling(d).min()`
-   * `ts_argmax(x, d)` -> `.rolling(d).apply(np.argmax)` (注意处理返回索引)
-   * `ts_rank(x, d)` -> `.rolling(d).rank()` (Pandas >= 1.4 支持，否则需自定义)
-   * `decay_linear(x, d)` -> 使用 `.rolling(d)` 配合自定义权重函数，或者简化为 `.ewm(span=d).mean()` 进行近似。
+   * `sum(x, d)` / `mean(x, d)` / `stddev(x, d)` -> `.rolling(d).sum()` / `.mean()` / `.std()`
+   * 以下算子**必须**调用算子库 `engine.ts_ops` (编译实现，比 rolling().apply 快 10-100 倍且语义精确)，**严禁**用 rolling().apply / ewm 自行实现或近似:
+     ```python
+     from engine.ts_ops import ts_min, ts_max, ts_argmin, ts_argmax, ts_rank, decay_linear, correlation, covariance
+     # 参数: 列 (Series)、窗口 d、by=df['SecuCode']；返回与 df 同索引的 Series，可直接赋值，无需 reset_index
+     df['a'] = ts_rank(df['LowPrice'], 9, by=df['SecuCode'])
+     df['b'] = correlation(df['OpenPrice'], df['TurnOverVolume'], 10, by=df['SecuCode'])
+     ```
+   * `ts_min(x, d)` / `ts_max(x, d)` -> `ts_min(x, d, by=df['SecuCode'])` / `ts_max(...)`
+   * `ts_argmax(x, d)` / `ts_argmin(x, d)` -> `ts_argmax(x, d, by=df['SecuCode'])` (最值距今的天数，0 表示今天)
+   * `ts_rank(x, d)` -> `ts_rank(x, d, by=df['SecuCode'])` (百分位排名)
+   * `decay_linear(x, d)` -> `decay_linear(x, d, by=df['SecuCode'])` (权重 d, d-1, ..., 1)
 
 4. **相关性 (特别注意)**:
-   * `correlation(x, y, d)` -> **严禁**直接用 `rolling().corr()`。
-   * **必须**展开为: `(rolling_cov(x, y, d) / (rolling_std(x, d) * rolling_std(y, d)))`。
+   * `correlation(x, y, d)` -> `correlation(x, y, d, by=df['SecuCode'])`，`covariance` 同理。
+   * **严禁**使用 `rolling().corr()` / `rolling().cov()`。
 
 [代码编写规范 - 必须严格遵守]
 1. **预处理 (修复 incompatible index 核心)**: 
    * ```python
-      # 1. 如果需要指数数据，先 merge，再执行下一步
-      if 'HS300' in factor_formula:
-            # ... merge 逻辑 ...
-      
-      # 2. 只有在所有 merge 完成后，才能执行最终排序和索引重置
+      # 指数数据已对齐在 df_raw 的 idx_ 列中，无需 merge，直接排序和索引重置
       df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)
       ```
    * 函数开始时，**必须**先执行 `df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)`。
    * **解释**: 必须加上 `.reset_index(drop=True)`，确保 DataFrame 的物理行号与索引 Index (0, 1, 2...) 完全对齐，否则后续赋值会报错。
    
 2. **指数数据处理 (修复 KeyError)**:
-   * 如果因子需要 `HS300` 或其他指数数据，**严禁**直接在 `df_raw` 中读取。
-   * **正确模式**: 
-     1. 先在 `df_index` 上计算指数指标 (如 `idx_ret = df_index['HS300'].pct_change()`)。
-     2. 将计算好的 `idx_ret` 与 `df_index[['TradingDay']]` 组成小表。
-     3. 使用 `pd.merge(df_raw, idx_temp, on='TradingDay', how='left')` 合并到主表。
-     4. **非常重要**: Merge 后必须再次执行 `df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True)`，因为 Merge 会打乱索引。
+   * df_raw 中**没有** `HS300` 等原始指数列，指数点位与收益已由框架对齐为 `idx_` 列，**必须**直接读取，**严禁** merge df_index:
+     ```python
+     # 个股收益与沪深 300 收益 (均已与行对齐)
+     ret = df_raw['returns']
+     mkt = df_raw['idx_HS300_ret']      # 指数日收益
+     level = df_raw['idx_HS300']        # 指数点位
+     ```
+   * 指数上的时序运算 (如 mean(idx_ret, 20)) 与个股字段一样在 groupby('SecuCode') 后计算。
 
 3. **禁止 Rolling 对象直接运算 (修复 unsupported operand)**:
    * **错误原因**: Pandas 的 `rolling()` 返回的是一个窗口对象（Rolling Object），不是 Series。
@@ -156,8 +167,7 @@ CODE_GEN_PROMPT_TEMPLATE = """
 
 5. **相关性计算优化**:
    * **严禁**使用 `rolling().corr()` (内存消耗极大)。
-   * **必须**使用公式分解: `corr(A, B) = rolling_cov(A, B) / (rolling_std(A) * rolling_std(B))`。
-   * **注意**: 分母中的 `rolling_std` 也是聚合后的 Series，符合第 3、4 条规范。
+   * **必须**使用算子库: `correlation(A, B, d, by=df['SecuCode'])`，调用前 df 必须已按第 1 条排序。
 
 6. **数学安全**:
    * `log(x)` 必须处理负数和零: `np.log(np.maximum(x, 1e-9))` 或 `np.log1p(np.abs(x)) * np.sign(x)`。
@@ -203,11 +213,12 @@ CODE_REFINE_PROMPT_TEMPLATE = """
 原始公式: {factor_formula}
 可用字段: {stock_columns}, {index_columns}  分别是接收的 (df_raw, df_index) 两个参数，仔细区分变量名称
 
-以下需自行处理
+df_raw 中另有以下预先计算的派生列，按字符串字面量列名直接读取 (如 df_raw['adv20'])
 * **returns**: 日收益率 (close_to_close)
 * **vwap**: 成交量加权平均价
 * **adv{{d}}**: 过去d天的平均成交额 (Average Daily Volume)
 * **cap**: 市值
+* **idx_{{指数}}** / **idx_{{指数}}_ret**: 已对齐到每一行的指数点位 / 指数日收益 (如 df_raw['idx_HS300_ret'])，无需 merge df_index
 
 [原始代码]
 ```python
@@ -230,10 +241,18 @@ CODE_REFINE_PROMPT_TEMPLATE = """
 
 如果是 IndexError，检查是否在 rolling/groupby 后忘记了 reset_index。
 
-如果是 KeyError，请检查列名拼写。
+如果是 KeyError，请检查列名拼写；派生列 returns / vwap / adv{{d}} / cap / idx_{{指数}} 的列名必须以字符串字面量写出 (如 df_raw['adv20'])；指数数据请直接读取 df_raw['idx_HS300_ret'] 等列，不要 merge df_index。
 
 如果是 ZeroDivisionError，请使用 replace([np.inf, -np.inf], np.nan)。
 
+如果是 ReadOnlyViolation，说明代码原地修改了输入数据 (如 inplace=True、对 df_raw 原有列赋值)，请先执行 df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True) 得到新表再操作。
+
+如果是 Timeout，说明代码运行超时，请把 rolling().apply / groupby().apply 中的 Python 函数改写为向量化运算 (rolling().mean()/std() 等)，ts_rank / ts_argmax / decay_linear / correlation 等改用 engine.ts_ops 算子库，不要逐行循环。
+
+如果是 PerformanceLint，请逐条改写报告中指出的行: 用内置聚合或 engine.ts_ops 算子替代 rolling().apply(lambda)，用 transform 替代 groupby().apply，用 engine.ts_ops.correlation / covariance 替代 rolling().corr() / cov()，删除 iterrows 与 print。
+
+如果是 MemoryExceeded，说明内存超限，请避免按 TradingDay 等非唯一键 merge 造成行数膨胀，避免 rolling().corr() 及大量中间副本。
+
 [约束条件 Constraints]
 1. 函数必须接收 (df_raw, df_index) 两个参数，你可以不用df_index。
 2. **严禁使用 `print()` 函数**：不要输出任何调试信息，否则会导致系统崩溃！
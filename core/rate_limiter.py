@@ -0,0 +1,165 @@
+# core/rate_limiter.py
+import random
+import threading
+import time
+from config import settings
+from utils.logger import logger
+
+# 需要退避重试的 HTTP 状态码 (限流 / 服务端暂时不可用)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 不同 SDK 的限流 / 超时异常类名片段 (openai、google-generativeai 等)
+RETRYABLE_NAMES = ("RateLimit", "Timeout", "APIConnectionError", "ResourceExhausted", "ServiceUnavailable")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数 (中英文混合按 2 字符 / token)，调用结束后再按实际用量校正"""
+    return max(1, len(text) // 2) if text else 1
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    return any(name in type(exc).__name__ for name in RETRYABLE_NAMES)
+
+
+def _retry_after(exc):
+    """读取服务端返回的 Retry-After (秒)"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _usage_tokens(response):
+    """从响应中读取实际消耗的 token 数 (OpenAI: usage.total_tokens, Gemini: usage_metadata.total_token_count)"""
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None):
+        return usage.total_tokens
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None and getattr(metadata, "total_token_count", None):
+        return metadata.total_token_count
+    return None
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶，允许在实际用量超出预估时透支"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.scale = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = self.capacity * self.scale / 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * rate)
+        self._updated = now
+        return rate
+
+    def acquire(self, amount):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                rate = self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """按实际用量补扣 (正数) 或退还 (负数)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """
+    单个提供商的限流器: 请求数 / token 数两个令牌桶 + 并发上限。
+    遇到限流或超时时按带抖动的指数退避重试，并把速率减半 (成功后逐步恢复)。
+    """
+
+    def __init__(self, name, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.name = name
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _buckets(self):
+        return [b for b in (self._requests, self._tokens) if b is not None]
+
+    def _set_scale(self, update):
+        for bucket in self._buckets():
+            bucket.scale = update(bucket.scale)
+
+    def call(self, fn, *args, estimated_tokens=1, **kwargs):
+        """在限流约束下调用 fn(*args, **kwargs)，可重试的异常自动退避，其余异常原样抛出"""
+        for attempt in range(self.max_retries + 1):
+            if self._requests:
+                self._requests.acquire(1)
+            if self._tokens:
+                self._tokens.acquire(estimated_tokens)
+
+            try:
+                if self._slots:
+                    with self._slots:
+                        response = fn(*args, **kwargs)
+                else:
+                    response = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                # 乘性减速，避免持续触发限流
+                self._set_scale(lambda s: max(0.1, s * 0.5))
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                    delay = random.uniform(delay / 2, delay)
+                logger.warning(f"[{self.name}] 触发限流/超时 ({type(e).__name__})，{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                continue
+
+            # 加性恢复
+            self._set_scale(lambda s: min(1.0, s + 0.1))
+            actual = _usage_tokens(response)
+            if self._tokens and actual:
+                self._tokens.adjust(actual - estimated_tokens)
+            return response
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """按提供商共享限流器 (构思与编码使用同一提供商时共享配额)"""
+    with _LIMITERS_LOCK:
+        if provider not in _LIMITERS:
+            config = settings.MODEL_CONFIG.get(provider, {})
+            _LIMITERS[provider] = RateLimiter(
+                name=provider,
+                requests_per_minute=config.get("requests_per_minute"),
+                tokens_per_minute=config.get("tokens_per_minute"),
+                max_concurrency=config.get("max_concurrency"),
+                max_retries=settings.LLM_MAX_RETRIES,
+                backoff_base=settings.LLM_BACKOFF_BASE,
+                backoff_max=settings.LLM_BACKOFF_MAX,
+            )
+        return _LIMITERS[provider]
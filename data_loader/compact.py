@@ -0,0 +1,93 @@
+# data_loader/compact.py
+"""
+紧凑内存档位 (DATA_LOAD_PROFILE = 'compact') 的类型约定:
+    TradingDay   int32 日期键 YYYYMMDD
+    SecuCode     category，取值表按代码排序
+    其余数值字段  float32 (往返相对误差不超过 COMPACT_FLOAT32_RTOL 时，否则保留原类型)
+因子函数直接在紧凑类型上计算；输出在 Executor 中经 restore_keys 还原为 datetime64 日期与 6 位字符串代码。
+"""
+import numpy as np
+import pandas as pd
+from config import settings
+
+DATE_KEY_DTYPE = np.dtype(np.int32)
+
+
+def is_date_key(values):
+    return getattr(values, "dtype", None) == DATE_KEY_DTYPE
+
+
+def encode_dates(values):
+    """日期 (datetime / 'YYYY-MM-DD' / YYYYMMDD) -> int32 日期键，按唯一值转换"""
+    codes, uniques = pd.factorize(np.asarray(values))
+    if pd.api.types.is_integer_dtype(uniques):
+        dates = pd.to_datetime(pd.Index(uniques).astype(str), format="%Y%m%d")
+    else:
+        dates = pd.to_datetime(pd.Index(uniques))
+    keys = (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy().astype(DATE_KEY_DTYPE)
+    return keys[codes]
+
+
+def decode_dates(values):
+    """int32 日期键 -> datetime64 (Series 返回同索引的 Series)，其他类型原样返回"""
+    if not is_date_key(values):
+        return values
+    codes, uniques = pd.factorize(np.asarray(values))
+    dates = pd.to_datetime(pd.Index(uniques).astype(str), format="%Y%m%d").to_numpy()[codes]
+    if isinstance(values, pd.Series):
+        return pd.Series(dates, index=values.index, name=values.name)
+    return dates
+
+
+def restore_codes(values):
+    """SecuCode (分类编码 / 数值 / 字符串) -> 6 位字符串代码，只转换唯一值 (分类列直接用取值表)"""
+    series = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    fixed = pd.Index(uniques).astype(str).str.zfill(6).str.slice(0, 6)
+    return pd.Series(fixed.to_numpy()[codes], index=series.index, name=series.name, dtype=fixed.dtype)
+
+
+def restore_keys(df):
+    """把 ['SecuCode', 'TradingDay', ...] 表的键还原为 6 位字符串代码与日期类型 (返回新表)"""
+    df = df.copy()
+    if 'SecuCode' in df.columns:
+        df['SecuCode'] = restore_codes(df['SecuCode'])
+    if 'TradingDay' in df.columns:
+        df['TradingDay'] = decode_dates(df['TradingDay'])
+    return df
+
+
+def _float32_safe(values, rtol):
+    """转为 float32 后相对误差不超过 rtol (且不溢出) 时返回 float32 数组，否则返回 None"""
+    compact = values.astype(np.float32)
+    with np.errstate(invalid="ignore", over="ignore"):
+        error = np.abs(compact.astype(np.float64) - values)
+        bad = ~(error <= rtol * np.abs(values)) & ~np.isnan(values)
+    return None if bad.any() else compact
+
+
+def compact_column(name, series, rtol=None):
+    """
+    单列转换为紧凑类型 (不修改输入)
+    :param rtol: float32 允许的最大相对误差，默认取 settings.COMPACT_FLOAT32_RTOL
+    """
+    rtol = settings.COMPACT_FLOAT32_RTOL if rtol is None else rtol
+    if name == 'TradingDay':
+        return encode_dates(series)
+    if name == 'SecuCode':
+        codes = pd.Categorical(series)
+        # 按字典编码读取时取值表为出现顺序，统一为排序后的取值表
+        return codes.reorder_categories(codes.categories.sort_values())
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) \
+            and series.dtype != np.float32:
+        compact = _float32_safe(series.to_numpy(dtype=np.float64, na_value=np.nan), rtol)
+        return series.to_numpy() if compact is None else compact
+    return series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+
+
+def compact_frame(df, rtol=None):
+    """转换为紧凑类型 (返回新表，不修改输入)"""
+    return pd.DataFrame({col: compact_column(col, df[col], rtol) for col in df.columns}, index=df.index)
@@ -0,0 +1,222 @@
+# data_loader/derived.py
+"""
+股票长表的派生字段 (定义与 DSL 求值器一致):
+    returns   ClosePrice / PrevClosePrice - 1 (用前收盘价计算，天然跳过停牌缺口)
+    vwap      TurnOverValue / TurnOverVolume (成交量为 0 时为 NaN)
+    cap       FloatMarketValue
+    adv{d}    过去 d 个交易日 TurnOverValue 的均值 (窗口内有停牌或不足 d 天时为 NaN)
+    idx_{指数}       指数点位 (如 idx_HS300)，按 TradingDay 对齐到每一行
+    idx_{指数}_ret   指数日收益 (在指数自身的交易日序列上计算)，按 TradingDay 对齐到每一行
+
+DataLoader 把股票数据整理为 (SecuCode, TradingDay) 的规范顺序，并在数据包中挂载 DerivedFields；
+派生字段在首次访问时计算并缓存 (全局一次，adv 按 d 分别缓存)。Executor 只把因子代码中
+以字符串字面量出现的派生字段 (如 df_raw['adv20']) 附加到 df_raw，未使用的字段不占内存。
+指数字段先对齐到股票数据的日期轴 (每个交易日一个值)，再按每行的日期位置展开，因子无需 merge df_index。
+"""
+import re
+import types
+import numpy as np
+import pandas as pd
+
+DERIVED_FIELDS = ('returns', 'vwap', 'cap')
+ADV_PATTERN = re.compile(r"^adv([1-9]\d*)$")
+INDEX_PATTERN = re.compile(r"^idx_(\w+?)(_ret)?$")
+
+
+def is_derived(name):
+    """行情派生字段 (returns / vwap / cap / adv{d})；指数字段取决于数据包中的指数，见 DerivedFields.__contains__"""
+    return isinstance(name, str) and (name in DERIVED_FIELDS or ADV_PATTERN.match(name) is not None)
+
+
+def field_lookback(name):
+    """派生字段自带的回看交易日数 (adv{d} 为 d - 1，指数收益为 1)，用于增量更新的预热窗口"""
+    adv = ADV_PATTERN.match(name)
+    if adv:
+        return int(adv.group(1)) - 1
+    index = INDEX_PATTERN.match(name)
+    return 1 if index and index.group(2) else 0
+
+
+def returns_of(close, prev_close):
+    return close / prev_close - 1.0
+
+
+def vwap_of(amount, volume):
+    return amount / np.where(volume > 0, volume, np.nan)
+
+
+def referenced_fields(func, fields=None):
+    """
+    因子函数代码中以字符串常量或属性名出现的派生字段名 (含嵌套函数)
+    :param fields: DerivedFields，传入时同时识别其中的指数字段
+    """
+    names = set()
+    pending = [func.__code__]
+    while pending:
+        code = pending.pop()
+        names.update(code.co_names)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                pending.append(const)
+            elif isinstance(const, str):
+                names.add(const)
+            elif isinstance(const, (tuple, frozenset)):
+                # df[['returns', 'vwap']] 等列表常量会被折叠为元组
+                names.update(c for c in const if isinstance(c, str))
+    if fields is None:
+        return sorted(name for name in names if is_derived(name))
+    return sorted(name for name in names if name in fields)
+
+
+def _key_positions(df):
+    """每行的股票编码、日期位置 (均按排序后的取值编号) 与排序后的日期"""
+    codes = df['SecuCode']
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        code_pos = codes.cat.codes.to_numpy()
+    else:
+        code_pos = pd.factorize(codes.to_numpy(), sort=True)[0]
+    day_pos, days = pd.factorize(df['TradingDay'].to_numpy(), sort=True)
+    return code_pos, day_pos, days
+
+
+def _canonical_order(code_pos, day_pos):
+    """已是 (SecuCode, TradingDay) 顺序时返回 None，否则返回排序下标"""
+    same_code = code_pos[1:] == code_pos[:-1]
+    if np.all((code_pos[1:] > code_pos[:-1]) | (same_code & (day_pos[1:] > day_pos[:-1]))):
+        return None
+    return np.lexsort((day_pos, code_pos))
+
+
+def canonical_sort(df):
+    """按 (SecuCode, TradingDay) 排序并重置索引；已是规范顺序时不复制数据"""
+    code_pos, day_pos, _ = _key_positions(df)
+    order = _canonical_order(code_pos, day_pos)
+    if order is not None:
+        return df.take(order).reset_index(drop=True)
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return df.reset_index(drop=True)
+    return df
+
+
+class DerivedFields:
+    """
+    股票长表的派生字段，首次访问时计算并缓存，结果为与 df_stock 行对齐的只读 float64 数组。
+    df_stock 不是规范顺序时 (如外部构造的数据包) 在内部排序计算，再还原为原有行顺序。
+    """
+
+    def __init__(self, df_stock, df_index=None):
+        self._source = df_stock
+        self._index = df_index
+        self._cache = {}
+        self._daily = {}
+        self._keys = None
+        self._layout = None
+
+    def __contains__(self, name):
+        if is_derived(name):
+            return True
+        index = INDEX_PATTERN.match(name) if isinstance(name, str) else None
+        return bool(index) and self._index is not None and index.group(1) in self._index.columns \
+            and index.group(1) != 'TradingDay'
+
+    @property
+    def index_names(self):
+        """可用的指数字段名 (点位与收益)"""
+        if self._index is None:
+            return []
+        columns = [c for c in self._index.columns if c != 'TradingDay']
+        return [f"idx_{c}" for c in columns] + [f"idx_{c}_ret" for c in columns]
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self:
+                raise KeyError(f"未知的派生字段: {name}")
+            values = self._compute(name)
+            values.flags.writeable = False
+            self._cache[name] = values
+        return self._cache[name]
+
+    def _column(self, name):
+        if name not in self._source.columns:
+            raise KeyError(f"股票数据中缺少字段: {name}")
+        return self._source[name].to_numpy(dtype=np.float64)
+
+    def _key_positions(self):
+        if self._keys is None:
+            self._keys = _key_positions(self._source)
+        return self._keys
+
+    def _segments(self):
+        """(排序下标或 None, 每行所在股票段的起点, 每行的日期位置)，均为规范顺序"""
+        if self._layout is None:
+            code_pos, day_pos, _ = self._key_positions()
+            order = _canonical_order(code_pos, day_pos)
+            if order is not None:
+                code_pos, day_pos = code_pos[order], day_pos[order]
+            rows = np.arange(len(code_pos))
+            is_start = np.ones(len(code_pos), dtype=bool)
+            is_start[1:] = code_pos[1:] != code_pos[:-1]
+            seg_start = np.maximum.accumulate(np.where(is_start, rows, 0))
+            self._layout = (order, seg_start, day_pos)
+        return self._layout
+
+    def _compute(self, name):
+        if name == 'returns':
+            return returns_of(self._column('ClosePrice'), self._column('PrevClosePrice'))
+        if name == 'vwap':
+            return vwap_of(self._column('TurnOverValue'), self._column('TurnOverVolume'))
+        if name == 'cap':
+            return np.array(self._column('FloatMarketValue'))
+        adv = ADV_PATTERN.match(name)
+        if adv:
+            return self._adv(int(adv.group(1)))
+        _, day_pos, _ = self._key_positions()
+        return self.daily(name)[day_pos]
+
+    def daily(self, name):
+        """
+        指数字段对齐到股票数据日期轴 (排序后的 TradingDay) 的逐日数组，股票数据中某日指数缺失时为 NaN
+        逐行的列只是按日期位置的查表，多个因子共用同一份缓存
+        """
+        if name not in self._daily:
+            index = INDEX_PATTERN.match(name)
+            if not index or name not in self:
+                raise KeyError(f"未知的指数字段: {name}")
+            df_index = self._index.drop_duplicates('TradingDay').sort_values('TradingDay')
+            series = pd.Series(df_index[index.group(1)].to_numpy(dtype=np.float64),
+                               index=df_index['TradingDay'].to_numpy())
+            if index.group(2):
+                series = series.pct_change()
+            _, _, days = self._key_positions()
+            values = series.reindex(days).to_numpy(copy=True)
+            values.flags.writeable = False
+            self._daily[name] = values
+        return self._daily[name]
+
+    def _adv(self, d):
+        order, seg_start, day_pos = self._segments()
+        amount = self._column('TurnOverValue')
+        if order is not None:
+            amount = amount[order]
+        values = pd.Series(amount).rolling(d).mean().to_numpy(copy=True)
+
+        # 窗口不跨股票，且覆盖连续的 d 个交易日 (与面板上的 rolling 一致)
+        rows = np.arange(len(amount))
+        first = np.maximum(rows - (d - 1), 0)
+        complete = (rows - seg_start >= d - 1) & (day_pos - day_pos[first] == d - 1)
+        values[~complete] = np.nan
+        if order is not None:
+            restored = np.empty_like(values)
+            restored[order] = values
+            values = restored
+        return values
+
+    def attach(self, df, names, copy=False):
+        """
+        把派生字段作为列附加到 df (原地，df 应为浅拷贝视图或副本)；已有同名列时保留原列
+        :param copy: False 时附加零拷贝的只读列，True 时附加可写副本
+        """
+        for name in names:
+            if name not in df.columns:
+                df[name] = pd.Series(self[name], index=df.index, copy=copy)
+        return df
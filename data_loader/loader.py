@@ -1,13 +1,50 @@
 # data_loader/loader.py
 import pandas as pd
+import pyarrow
+import pyarrow.parquet as pq
 import os
+from config import settings
+from data_loader.compact import compact_column
+from data_loader.derived import DerivedFields, canonical_sort
+from data_loader.panel import KEY_COLUMNS, PanelData
 from utils.logger import logger
 
 class DataLoader:
-    def __init__(self, stock_path, index_path):
+    def __init__(self, stock_path, index_path, profile=None, stock_columns=None, index_columns=None):
+        """
+        :param profile: 'full' 或 'compact'，默认取 settings.DATA_LOAD_PROFILE (见 data_loader.compact)
+        :param stock_columns: 只读取的股票字段 (键列总会读取)，默认取 settings.DATA_LOAD_STOCK_COLUMNS，None 为全部
+        :param index_columns: 只读取的指数字段，默认取 settings.DATA_LOAD_INDEX_COLUMNS，None 为全部
+        """
         self.stock_path = stock_path
         self.index_path = index_path
+        self.profile = profile or settings.DATA_LOAD_PROFILE
+        self.stock_columns = settings.DATA_LOAD_STOCK_COLUMNS if stock_columns is None else stock_columns
+        self.index_columns = settings.DATA_LOAD_INDEX_COLUMNS if index_columns is None else index_columns
         self.data_bundle = None
+        self.panel = None
+
+        if self.profile not in ("full", "compact"):
+            raise ValueError(f"未知的数据加载档位: {self.profile}")
+
+    def _read(self, path, keys, columns):
+        if columns is not None:
+            columns = keys + [c for c in columns if c not in keys]
+        if self.profile != "compact":
+            return pd.read_parquet(path, columns=columns)
+        # 逐列读取并转换，内存峰值只多出一列原始类型的数据；SecuCode 按字典编码读取，不物化逐行字符串
+        if columns is None:
+            columns = pq.ParquetFile(path).schema_arrow.names
+        data = {}
+        for col in columns:
+            table = pq.read_table(path, columns=[col], read_dictionary=[col] if col == 'SecuCode' else None)
+            data[col] = compact_column(col, table.column(col).to_pandas())
+            del table
+        # 不合并为二维块，避免再复制一遍全部数值列
+        df = pd.DataFrame(data, copy=False)
+        # 归还 arrow 读取缓冲区
+        pyarrow.default_memory_pool().release_unused()
+        return df
 
     def load(self):
         """加载数据并返回字典包"""
@@ -21,15 +58,35 @@ class DataLoader:
             raise FileNotFoundError("数据文件未找到")
 
         try:
-            df_stock = pd.read_parquet(self.stock_path)
-            df_index = pd.read_parquet(self.index_path)
-            
+            df_stock = self._read(self.stock_path, KEY_COLUMNS, self.stock_columns)
+            df_index = self._read(self.index_path, ['TradingDay'], self.index_columns)
+            # 规范顺序 (SecuCode, TradingDay)，派生字段在此顺序上按需计算
+            df_stock = canonical_sort(df_stock)
+
             self.data_bundle = {
                 "stock": df_stock,
-                "index": df_index
+                "index": df_index,
+                "derived": DerivedFields(df_stock, df_index)
             }
-            logger.info("所有原始数据加载完毕。")
+            memory_mb = sum(df.memory_usage(deep=True).sum() for df in (df_stock, df_index)) / 1024 / 1024
+            logger.info(f"所有原始数据加载完毕 ({self.profile}, {len(df_stock)} 行，约 {memory_mb:.0f} MB)。")
             return self.data_bundle
         except Exception as e:
             logger.error(f"加载数据时出错: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def load_panel(self, columns=None):
+        """
+        加载数据并转换为 日期 x 股票 宽面板 (全局一次)
+        :param columns: 需要立即转换的字段，None 表示全部数值字段
+        :return: PanelData，同时挂载到 data_bundle['panel']
+        """
+        if self.panel is not None:
+            return self.panel
+
+        data_bundle = self.load()
+        logger.info("正在构建 日期 x 股票 面板...")
+        self.panel = PanelData(data_bundle['stock'], data_bundle['index'], columns=columns)
+        data_bundle['panel'] = self.panel
+        logger.info(f"面板构建完毕: {self.panel.shape[0]} 个交易日 x {self.panel.shape[1]} 只股票。")
+        return self.panel
\ No newline at end of file
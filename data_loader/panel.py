@@ -0,0 +1,117 @@
+# data_loader/panel.py
+import numpy as np
+import pandas as pd
+from data_loader.compact import decode_dates
+
+KEY_COLUMNS = ['TradingDay', 'SecuCode']
+
+
+def _unique_codes(codes):
+    """排序后的股票代码与每行的位置；分类列直接使用编码，不物化逐行字符串"""
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        used, positions = np.unique(codes.cat.codes.to_numpy(), return_inverse=True)
+        return codes.cat.categories.to_numpy()[used], positions
+    return np.unique(codes.to_numpy(), return_inverse=True)
+
+
+class PanelData:
+    """
+    日期 x 股票 宽面板。
+    所有字段共享同一组日期轴 (axis 0) 与股票轴 (axis 1)，
+    时序运算沿 axis 0，横截面运算沿 axis 1，无需 groupby。
+    """
+
+    def __init__(self, df_stock, df_index=None, columns=None):
+        """
+        :param df_stock: 长表格式的股票数据 (含 TradingDay, SecuCode)
+        :param df_index: 指数数据 (含 TradingDay)，可为 None
+        :param columns: 需要立即转换的字段，None 表示全部数值字段；其余字段首次访问时再转换
+        """
+        dates, date_pos = np.unique(df_stock['TradingDay'].to_numpy(), return_inverse=True)
+        # 紧凑档位的 int32 日期键还原为日期，面板的日期轴与因子库 / 因子输出一致
+        self.dates = decode_dates(dates)
+        self.codes, code_pos = _unique_codes(df_stock['SecuCode'])
+        self.shape = (len(self.dates), len(self.codes))
+
+        self._source = df_stock
+        self._rows = date_pos.ravel()
+        self._cols = code_pos.ravel()
+        self._fields = {}
+        self._index_fields = {}
+        self._df_index = None
+        self._code_index = None
+        if df_index is not None:
+            df_index = df_index.drop_duplicates('TradingDay')
+            index_dates = pd.Index(decode_dates(df_index['TradingDay'].to_numpy()), name='TradingDay')
+            self._df_index = df_index.drop(columns='TradingDay').set_index(index_dates)
+
+        # 有效性掩码: 当天该股票存在一条记录
+        self.valid_mask = np.zeros(self.shape, dtype=bool)
+        self.valid_mask[self._rows, self._cols] = True
+
+        if columns is None:
+            columns = [c for c in df_stock.columns
+                       if c not in KEY_COLUMNS and pd.api.types.is_numeric_dtype(df_stock[c])]
+        for column in columns:
+            self.field(column)
+
+    @property
+    def field_names(self):
+        return [c for c in self._source.columns if c not in KEY_COLUMNS]
+
+    @property
+    def index_names(self):
+        return list(self._df_index.columns) if self._df_index is not None else []
+
+    def __contains__(self, name):
+        return name in self._source.columns or name in self.index_names
+
+    def __getitem__(self, name):
+        if name in self.index_names and name not in self._source.columns:
+            return self.index_field(name)
+        return self.field(name)
+
+    def field(self, name):
+        """股票字段面板 (T, N)，只转换一次"""
+        if name not in self._fields:
+            if name not in self._source.columns:
+                raise KeyError(f"股票数据中缺少字段: {name}")
+            panel = np.full(self.shape, np.nan)
+            panel[self._rows, self._cols] = self._source[name].to_numpy(dtype=float)
+            self._fields[name] = panel
+        return self._fields[name]
+
+    def index_field(self, name):
+        """指数字段按日期轴对齐，形状 (T, 1)，可直接与股票面板广播运算"""
+        if name not in self._index_fields:
+            if self._df_index is None or name not in self._df_index.columns:
+                raise KeyError(f"指数数据中缺少字段: {name}")
+            series = self._df_index[name].reindex(self.dates)
+            self._index_fields[name] = series.to_numpy(dtype=float)[:, None]
+        return self._index_fields[name]
+
+    def pivot(self, df, column):
+        """
+        把 ['TradingDay', 'SecuCode', column] 长表 (如因子输出) 对齐到面板 (T, N)
+        股票代码按 6 位字符串匹配 (与 Executor 输出一致)，面板之外的行被忽略
+        """
+        if self._code_index is None:
+            self._code_index = pd.Index(self.codes.astype(str)).str.zfill(6)
+        rows = pd.Index(self.dates).get_indexer(df['TradingDay'])
+        cols = self._code_index.get_indexer(df['SecuCode'].astype(str).str.zfill(6))
+        keep = (rows >= 0) & (cols >= 0)
+
+        values = np.full(self.shape, np.nan)
+        values[rows[keep], cols[keep]] = df[column].to_numpy(dtype=float)[keep]
+        return values
+
+    def to_frame(self, values, factor_name):
+        """把面板结果还原为 ['SecuCode', 'TradingDay', factor_name] 长表，仅保留有效单元"""
+        values = np.array(np.broadcast_to(np.asarray(values, dtype=float), self.shape), dtype=float)
+        values[~np.isfinite(values)] = np.nan
+        rows, cols = np.nonzero(self.valid_mask)
+        return pd.DataFrame({
+            'SecuCode': self.codes[cols],
+            'TradingDay': self.dates[rows],
+            factor_name: values[rows, cols],
+        })
@@ -0,0 +1,132 @@
+# data_loader/synthetic.py
+import os
+import re
+import numpy as np
+import pandas as pd
+from config import settings
+from utils.logger import logger
+
+# 与 settings 中的字段说明保持完全一致
+STOCK_COLUMNS = re.findall(r"'(\w+)'", settings.STOCK_COLUMNS_DESC)
+INDEX_COLUMNS = re.findall(r"'(\w+)'", settings.INDEX_COLUMNS_DESC)
+
+TRADING_DAYS_PER_YEAR = 252
+# 指数对市场因子的暴露与特异波动 (日)
+_INDEX_PROFILES = {"HS300": (0.9, 0.002), "ZZ500": (1.1, 0.003), "ZZ1000": (1.2, 0.004), "SZ": (1.0, 0.001)}
+_INDEX_BASE = {"HS300": 3000.0, "ZZ500": 5000.0, "ZZ1000": 6000.0, "SZ": 3000.0}
+
+
+def _stock_codes(num_stocks):
+    """沪深两市风格的 6 位代码: 60xxxx / 00xxxx / 30xxxx 交替分配"""
+    prefixes = np.array([600000, 0, 300000])
+    serial = np.arange(num_stocks)
+    return [f"{code:06d}" for code in prefixes[serial % 3] + serial // 3 + 1]
+
+
+def _suspension_mask(rng, num_days, num_stocks, suspension_rate, mean_length):
+    """停牌掩码 (T, N): 每只股票若干段停牌，段长服从几何分布，总体约占 suspension_rate 的交易日"""
+    suspended = np.zeros((num_days, num_stocks), dtype=bool)
+    if suspension_rate <= 0:
+        return suspended
+    spells = rng.poisson(suspension_rate * num_days / mean_length, size=num_stocks)
+    for stock in np.flatnonzero(spells):
+        starts = rng.integers(0, num_days, size=spells[stock])
+        lengths = rng.geometric(1.0 / mean_length, size=spells[stock])
+        for start, length in zip(starts, lengths):
+            suspended[start:start + length, stock] = True
+    return suspended
+
+
+def generate_synthetic_data(num_stocks=1000, num_days=TRADING_DAYS_PER_YEAR, start_date="2010-01-04", seed=0,
+                            listing_fraction=0.2, delisting_fraction=0.05, suspension_rate=0.02,
+                            suspension_length=5):
+    """
+    生成与真实数据同结构的 A 股日频数据 (单因子市场模型 + 涨跌停截断)
+    :param num_stocks: 股票数
+    :param num_days: 交易日数 (工作日序列)
+    :param listing_fraction: 样本期内新上市的股票比例 (上市前无记录)
+    :param delisting_fraction: 样本期内退市的股票比例 (退市后无记录)
+    :param suspension_rate: 停牌交易日占比 (停牌日无记录)
+    :param suspension_length: 平均停牌天数
+    Returns:
+        {"stock": 长表 (STOCK_COLUMNS), "index": 日频指数 (INDEX_COLUMNS)}
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start_date, periods=num_days)
+    # 代码排序后，输出按 (TradingDay, SecuCode) 有序
+    codes = np.sort(_stock_codes(num_stocks))
+    shape = (num_days, num_stocks)
+
+    # 1. 存续区间: 部分股票样本期内上市 / 退市
+    first_day = np.zeros(num_stocks, dtype=int)
+    last_day = np.full(num_stocks, num_days - 1)
+    listed = rng.random(num_stocks) < listing_fraction
+    first_day[listed] = rng.integers(1, max(num_days // 2, 2), size=listed.sum())
+    delisted = rng.random(num_stocks) < delisting_fraction
+    last_day[delisted] = rng.integers(num_days // 2, num_days, size=delisted.sum())
+    last_day = np.maximum(last_day, first_day)
+    day_index = np.arange(num_days)[:, None]
+    alive = (day_index >= first_day) & (day_index <= last_day)
+    valid = alive & ~_suspension_mask(rng, num_days, num_stocks, suspension_rate, suspension_length)
+
+    # 2. 收益: 市场因子 + 个股特异收益，±10% 涨跌停截断；停牌日价格不变
+    market = rng.normal(0.0003, 0.012, size=num_days)
+    beta = rng.normal(1.0, 0.25, size=num_stocks)
+    idio_vol = rng.uniform(0.01, 0.03, size=num_stocks)
+    returns = np.clip(market[:, None] * beta + rng.standard_normal(shape) * idio_vol, -0.1, 0.1)
+    returns[~valid] = 0.0
+    close = rng.uniform(3.0, 80.0, size=num_stocks) * np.cumprod(1.0 + returns, axis=0)
+    prev_close = np.vstack([close[:1] / (1.0 + returns[:1]), close[:-1]])
+
+    # 3. 开高低: 开盘跳空，高低价包住开收盘
+    open_ = np.clip(prev_close * (1.0 + rng.normal(0.0, 0.005, size=shape)), prev_close * 0.9, prev_close * 1.1)
+    spread = np.abs(rng.normal(0.0, 0.01, size=shape))
+    body_high, body_low = np.maximum(open_, close), np.minimum(open_, close)
+    high = np.maximum(np.minimum(body_high * (1.0 + spread), prev_close * 1.1), body_high)
+    low = np.minimum(np.maximum(body_low * (1.0 - spread), prev_close * 0.9), body_low)
+
+    # 4. 成交与市值: 换手率对数正态，随 |收益| 放大
+    float_shares = np.exp(rng.normal(np.log(5e8), 1.0, size=num_stocks))
+    turnover_rate = np.exp(rng.normal(np.log(1.5), 0.6, size=shape)) * (1.0 + 20.0 * np.abs(returns))
+    volume = np.round(float_shares * turnover_rate / 100.0, -2)
+    amount = volume * (open_ + high + low + close) / 4.0
+
+    rows, cols = np.nonzero(valid)
+    df_stock = pd.DataFrame({
+        "TradingDay": days[rows],
+        "SecuCode": codes[cols],
+        "PrevClosePrice": prev_close[rows, cols],
+        "OpenPrice": open_[rows, cols],
+        "HighPrice": high[rows, cols],
+        "LowPrice": low[rows, cols],
+        "ClosePrice": close[rows, cols],
+        "TurnOverVolume": volume[rows, cols],
+        "TurnOverValue": amount[rows, cols],
+        "TurnOverRate": turnover_rate[rows, cols],
+        "FloatMarketValue": (close * float_shares)[rows, cols],
+    })[STOCK_COLUMNS]
+
+    df_index = pd.DataFrame({"TradingDay": days})
+    for name in INDEX_COLUMNS[1:]:
+        exposure, noise = _INDEX_PROFILES.get(name, (1.0, 0.002))
+        index_ret = market * exposure + rng.normal(0.0, noise, size=num_days)
+        df_index[name] = _INDEX_BASE.get(name, 1000.0) * np.cumprod(1.0 + index_ret)
+
+    return {"stock": df_stock, "index": df_index[INDEX_COLUMNS]}
+
+
+def write_synthetic_dataset(output_dir, num_stocks=1000, num_days=TRADING_DAYS_PER_YEAR, seed=0, **kwargs):
+    """
+    生成合成数据并写为 data.parquet / index.parquet (已存在则直接复用)，可直接替换 DATA_PATH_STOCK / DATA_PATH_INDEX
+    Returns:
+        (stock_path, index_path)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stock_path = os.path.join(output_dir, "data.parquet")
+    index_path = os.path.join(output_dir, "index.parquet")
+    if not (os.path.exists(stock_path) and os.path.exists(index_path)):
+        logger.info(f"正在生成合成数据: {num_stocks} 只股票 x {num_days} 个交易日 ...")
+        bundle = generate_synthetic_data(num_stocks, num_days, seed=seed, **kwargs)
+        bundle["stock"].to_parquet(stock_path, index=False)
+        bundle["index"].to_parquet(index_path, index=False)
+    return stock_path, index_path
@@ -0,0 +1,158 @@
+# engine/checkpoint.py
+import glob
+import json
+import os
+import threading
+from utils.logger import logger
+
+
+class _CheckpointedRecorder:
+    """记录因子结果的同时在日志中把该变体标记为已完成"""
+
+    def __init__(self, recorder, journal, key):
+        self._recorder = recorder
+        self._journal = journal
+        self._key = key
+
+    def add_record(self, provider, seed_idea, factor_name, formula, description, status, code_path, profile=None):
+        record = dict(provider=provider, seed_idea=seed_idea, factor_name=factor_name, formula=formula,
+                      description=description, status=status, code_path=code_path, profile=profile)
+        # 先写日志再记录: 两者之间中断时由 restore_records 补记，而不会重复处理该变体
+        self._journal.mark_done(self._key, record)
+        self._recorder.add_record(**record)
+
+    def __getattr__(self, name):
+        return getattr(self._recorder, name)
+
+
+class IdeaCheckpoint:
+    """单个因子变体的断点: 上次分配的文件名、最近一次尝试的代码及其尝试次数"""
+
+    def __init__(self, journal, key):
+        self.journal = journal
+        self.key = key
+        # {'factor_name', 'code_path', 'attempt', 'code'}，未开始过时为 None
+        self.resume = journal.code.get(key)
+
+    def save_code(self, factor_name, code_path, attempt, code=None):
+        self.journal.save_code(self.key, factor_name, code_path, attempt, code)
+
+    def wrap(self, recorder):
+        return _CheckpointedRecorder(recorder, self.journal, self.key)
+
+
+class RunJournal:
+    """
+    挖掘运行的断点日志 (JSON Lines，只追加，每条事件落盘后再继续):
+        ideation  种子的构思结果，续跑时不再重复构思
+        code      变体最近一次尝试的代码 (文件名、路径、尝试次数与源码)，续跑时从该代码继续修复循环
+                  (代码只在执行成功后写入文件，未完成的尝试以日志中的源码为准)
+        done      变体已完成 (附带记录内容)，续跑时跳过
+        finish    所有任务执行完毕
+    种子以其文本标识，变体以 (种子, 构思结果中的序号) 标识。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ideas = {}
+        self.code = {}
+        self.done = {}
+        self.finished = False
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            self._replay()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def run_id_of(path):
+        return os.path.splitext(os.path.basename(path))[0].replace("run_", "", 1)
+
+    @staticmethod
+    def find(journal_dir, run_id="latest"):
+        """按运行 ID 查找日志，'latest' 为最近一次运行；不存在时返回 None"""
+        if run_id != "latest":
+            path = os.path.join(journal_dir, f"run_{run_id}.jsonl")
+            return path if os.path.exists(path) else None
+        paths = sorted(glob.glob(os.path.join(journal_dir, "run_*.jsonl")))
+        return paths[-1] if paths else None
+
+    @staticmethod
+    def idea_key(seed, index):
+        return f"{seed}#{index}"
+
+    def _replay(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时可能留下写了一半的最后一行
+                    logger.warning(f"断点日志第 {line_no} 行不完整，已忽略。")
+                    continue
+                kind = event.get("event")
+                if kind == "ideation":
+                    self.ideas[event["seed"]] = event["ideas"]
+                elif kind == "code":
+                    self.code[event["key"]] = {k: event.get(k) for k in ("factor_name", "code_path", "attempt", "code")}
+                elif kind == "done":
+                    self.done[event["key"]] = event["record"]
+                elif kind == "finish":
+                    self.finished = True
+
+    def _append(self, event):
+        with self._lock:
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # --- 写入 ---
+    def ideation(self, llm_ideation, seed, num):
+        """返回种子的构思结果: 日志中已有则直接复用，否则调用构思模型并写入日志"""
+        if seed in self.ideas:
+            logger.info(f"从断点日志恢复构思结果: {len(self.ideas[seed])} 个变体。")
+            return self.ideas[seed]
+        ideas = llm_ideation.ideation(seed, num)
+        if ideas:
+            self.ideas[seed] = ideas
+            self._append({"event": "ideation", "seed": seed, "ideas": ideas})
+        return ideas
+
+    def save_code(self, key, factor_name, code_path, attempt, code=None):
+        entry = {"factor_name": factor_name, "code_path": code_path, "attempt": attempt, "code": code}
+        self.code[key] = entry
+        self._append({"event": "code", "key": key, **entry})
+
+    def mark_done(self, key, record):
+        self.done[key] = record
+        self._append({"event": "done", "key": key, "record": record})
+
+    def finish(self):
+        self.finished = True
+        self._append({"event": "finish"})
+
+    # --- 续跑 ---
+    def pending(self, seed, ideas):
+        """种子下尚未完成的变体 [(序号, idea), ...]"""
+        pending = [(j, idea) for j, idea in enumerate(ideas) if self.idea_key(seed, j) not in self.done]
+        if len(pending) < len(ideas):
+            logger.info(f"跳过已完成的 {len(ideas) - len(pending)} 个变体。")
+        return pending
+
+    def checkpoint(self, seed, index):
+        return IdeaCheckpoint(self, self.idea_key(seed, index))
+
+    def restore_records(self, recorder):
+        """补记日志中已完成、但在中断前未写入记录数据库的结果"""
+        stored = recorder.query(run_id=recorder.run_id)
+        present = set(zip(stored["seed_idea"], stored["factor_name"]))
+        missing = [r for r in self.done.values() if (r["seed_idea"], r["factor_name"]) not in present]
+        for record in missing:
+            recorder.add_record(**record)
+        if missing:
+            logger.info(f"已从断点日志补记 {len(missing)} 条结果。")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
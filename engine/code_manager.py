@@ -1,93 +1,314 @@
 # engine/code_manager.py
+import ast
+import hashlib
+import inspect
+import linecache
 import os
 import re
 import sys
-import importlib.util
+import threading
+import types
+from collections import OrderedDict
+from config import settings
 from utils.logger import logger
 
+# 持久化的因子代码中记录函数名的模块变量
+FUNCTION_NAME_ATTR = "FACTOR_FUNCTION"
+_VERSION_SUFFIX = re.compile(r"_v\d+$")
+
+# 窗口 / 分组对象的构造方法，决定其后 .apply / .corr 的含义
+_WINDOW_METHODS = {"rolling", "expanding", "ewm"}
+
+
+def _receiver_kind(node):
+    """沿调用链向内查找最近的窗口或分组构造，返回 'window' / 'groupby' / None"""
+    while isinstance(node, (ast.Call, ast.Attribute, ast.Subscript)):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr in _WINDOW_METHODS:
+                return "window"
+            if node.func.attr == "groupby":
+                return "groupby"
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return None
+
+
+class _PerformanceLinter(ast.NodeVisitor):
+    """检查 CODE_GEN_PROMPT_TEMPLATE 中明确禁止的慢速写法"""
+
+    def __init__(self):
+        self.issues = []
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "print":
+            self.issues.append(f"line {node.lineno}: print() is forbidden; remove all debug output.")
+        elif isinstance(func, ast.Attribute):
+            kind = _receiver_kind(func.value)
+            if func.attr == "iterrows":
+                self.issues.append(
+                    f"line {node.lineno}: iterrows() loops row by row in Python; "
+                    f"use vectorized column operations instead."
+                )
+            elif func.attr == "apply" and kind == "window" and self._python_callable(node):
+                self.issues.append(
+                    f"line {node.lineno}: rolling().apply() with a Python function runs once per window; "
+                    f"use built-in aggregations (mean/sum/std) or engine.ts_ops (ts_rank/ts_argmax/decay_linear ...)."
+                )
+            elif func.attr == "apply" and kind == "groupby":
+                self.issues.append(
+                    f"line {node.lineno}: groupby().apply() calls Python once per group; "
+                    f"use groupby().transform() or built-in groupby aggregations."
+                )
+            elif func.attr in ("corr", "cov") and kind == "window":
+                self.issues.append(
+                    f"line {node.lineno}: rolling().{func.attr}() is forbidden (very slow and memory hungry); "
+                    f"use engine.ts_ops.{'correlation' if func.attr == 'corr' else 'covariance'}(x, y, d, by=df['SecuCode'])."
+                )
+        self.generic_visit(node)
+
+    @staticmethod
+    def _python_callable(node):
+        """lambda / 自定义函数一律视为慢速；numpy 函数仅在未设置 raw=True 时视为慢速"""
+        if not node.args:
+            return False
+        target = node.args[0]
+        if isinstance(target, (ast.Lambda, ast.Name)):
+            return True
+        raw = next((kw.value for kw in node.keywords if kw.arg == "raw"), None)
+        return not (isinstance(raw, ast.Constant) and raw.value is True)
+
+
 class CodeManager:
+    """
+    因子代码的命名、编译与加载。
+    代码在内存中编译 (代码对象按清洗后源码的哈希缓存，相同的 LLM 输出只编译一次)，
+    文件名由内存中的名字索引分配，只有执行成功的因子才通过 persist_code 写入 .py 文件。
+    """
+    # 并行处理多个因子时，保证文件名分配、缓存与模块注册的原子性
+    _lock = threading.RLock()
+    # 代码目录 -> (已占用的文件名集合, {基础名: 下一个候选版本号})，首次使用时扫描一次目录
+    _name_index = {}
+    # 源码哈希 -> 代码对象 (LRU)
+    _code_cache = OrderedDict()
+    # 模块名 -> 模块 (按加载顺序)，超出上限时从 sys.modules 移除最早的
+    _modules = OrderedDict()
+
+    @staticmethod
+    def _names(output_dir):
+        key = os.path.abspath(output_dir)
+        if key not in CodeManager._name_index:
+            used = set()
+            if os.path.isdir(output_dir):
+                used = {os.path.splitext(f)[0] for f in os.listdir(output_dir) if f.endswith(".py")}
+            CodeManager._name_index[key] = (used, {})
+        return CodeManager._name_index[key]
+
     @staticmethod
     def _get_unique_factor_name(base_name, output_dir):
         """
-        生成唯一的文件名，防止覆盖已有文件
-        例如: 如果 AlphaTest.py 存在，则返回 AlphaTest_v1
+        生成唯一的文件名，防止覆盖已有文件或本进程已分配的名字
+        例如: 如果 AlphaTest 已被占用，则返回 AlphaTest_v1
         """
-        counter = 0
-        candidate_name = base_name
-        
-        while True:
-            file_path = os.path.join(output_dir, f"{candidate_name}.py")
-            if not os.path.exists(file_path):
-                return candidate_name
-            
-            counter += 1
-            candidate_name = f"{base_name}_v{counter}"
+        with CodeManager._lock:
+            used, versions = CodeManager._names(output_dir)
+            counter = versions.get(base_name, 0)
+            candidate_name = base_name if counter == 0 else f"{base_name}_v{counter}"
+            while candidate_name in used:
+                counter += 1
+                candidate_name = f"{base_name}_v{counter}"
+            used.add(candidate_name)
+            versions[base_name] = counter + 1
+            return candidate_name
 
     @staticmethod
-    def save_and_load_function(code_string, factor_name, output_dir, specific_name=None):
+    def claim_factor_name(name, output_dir):
+        """把沿用的名字 (修复模式、断点续跑) 登记为已占用"""
+        with CodeManager._lock:
+            CodeManager._names(output_dir)[0].add(name)
+
+    @staticmethod
+    def reserve_factor_name(base_name, output_dir):
         """
-        清洗代码，保存文件，并动态加载模块
+        在名字索引中分配唯一文件名 (不创建文件)，并发任务不会拿到同一个名字
+        Returns:
+            (unique_name, file_path)，file_path 为成功后 persist_code 写入的路径
+        """
+        unique_name = CodeManager._get_unique_factor_name(base_name, output_dir)
+        return unique_name, os.path.join(output_dir, f"{unique_name}.py")
+
+    @staticmethod
+    def clean_code(code_string):
+        """去除 LLM 回复中的 Markdown 代码块标记"""
+        code_string = re.sub(r"^```python\n", "", code_string, flags=re.MULTILINE)
+        code_string = re.sub(r"\n```$", "", code_string, flags=re.MULTILINE)
+        return code_string.strip()
+
+    @staticmethod
+    def lint_performance(code_string):
+        """
+        静态检查已知的慢速写法 (不执行代码)
         
-        Args:
-            code_string: AI 生成的代码字符串
-            factor_name: 原始函数名 (def Alpha...)，用于 getattr 获取函数对象
-            output_dir: 保存目录
-            specific_name: 指定文件名 (不含.py)。
-                           - 如果为 None，则自动生成唯一名 (如 Alpha_v1)。
-                           - 如果有值，则强制覆盖该文件 (用于修复模式)。
-                           
         Returns:
-            (func_object, unique_name, file_path)
+            问题描述列表，为空表示通过；代码无法解析时也返回空列表，交由加载阶段报告语法错误
         """
         try:
-            code_string = re.sub(r"^```python\n", "", code_string, flags=re.MULTILINE)
-            code_string = re.sub(r"\n```$", "", code_string, flags=re.MULTILINE)
-            code_string = code_string.strip()
+            tree = ast.parse(CodeManager.clean_code(code_string))
+        except SyntaxError:
+            return []
+        linter = _PerformanceLinter()
+        linter.visit(tree)
+        return linter.issues
 
-            if not code_string:
-                logger.error("AI 返回了空代码。")
-                return None, factor_name, ""
-
-            os.makedirs(output_dir, exist_ok=True)
+    @staticmethod
+    def _compile(code_string):
+        """编译源码，代码对象按源码哈希缓存；源码登记到 linecache，报错堆栈中可以显示代码行"""
+        digest = hashlib.sha1(code_string.encode("utf-8")).hexdigest()
+        with CodeManager._lock:
+            code = CodeManager._code_cache.get(digest)
+            if code is not None:
+                CodeManager._code_cache.move_to_end(digest)
+                return code
 
-            if specific_name:
-                unique_name = specific_name 
-            else:
-                unique_name = CodeManager._get_unique_factor_name(factor_name, output_dir) 
+        filename = f"<factor:{digest[:12]}>"
+        code = compile(code_string, filename, "exec")
+        with CodeManager._lock:
+            CodeManager._code_cache[digest] = code
+            linecache.cache[filename] = (len(code_string), None, code_string.splitlines(True), filename)
+            while len(CodeManager._code_cache) > settings.CODE_CACHE_SIZE:
+                _, evicted = CodeManager._code_cache.popitem(last=False)
+                linecache.cache.pop(evicted.co_filename, None)
+        return code
 
-            filepath = os.path.join(output_dir, f"{unique_name}.py")
+    @staticmethod
+    def _register(module_name, module):
+        with CodeManager._lock:
+            CodeManager._modules.pop(module_name, None)
+            CodeManager._modules[module_name] = module
+            sys.modules[module_name] = module
+            while len(CodeManager._modules) > settings.CODE_MODULE_LIMIT:
+                name, evicted = CodeManager._modules.popitem(last=False)
+                # 已取得的函数对象仍持有模块的全局变量，移除注册不影响其执行
+                if sys.modules.get(name) is evicted:
+                    del sys.modules[name]
 
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(code_string)
+    @staticmethod
+    def load_source(code_string, factor_name, module_name):
+        """
+        在内存中编译并加载因子代码 (不写文件)
+        
+        Args:
+            code_string: 因子代码 (应已清洗)
+            factor_name: 函数名，未找到时自动匹配模块内定义的第一个函数
+            module_name: 注册到 sys.modules 的模块名
             
-            logger.info(f"代码已保存至: {filepath}")
+        Returns:
+            func_object 或 None；语法错误等异常向上抛出
+        """
+        code = CodeManager._compile(code_string)
+        module = types.ModuleType(module_name)
+        module.__file__ = code.co_filename
+        # 子进程 (并行 / 沙箱) 按源码重新加载，见 source_of
+        module.__source__ = code_string
+        CodeManager._register(module_name, module)
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            with CodeManager._lock:
+                if CodeManager._modules.get(module_name) is module:
+                    del CodeManager._modules[module_name]
+                    sys.modules.pop(module_name, None)
+            raise
 
-            module_name = unique_name
-            
-            if module_name in sys.modules:
-                del sys.modules[module_name]
-
-            spec = importlib.util.spec_from_file_location(module_name, filepath)
-            if spec is None or spec.loader is None:
-                logger.error(f"无法创建模块 spec: {filepath}")
-                return None, unique_name, filepath
-                
-            module = importlib.util.module_from_spec(spec)
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+        # 版本化的文件名 (Alpha_v1) 中的函数仍为 Alpha: 依次按传入的名字、持久化时记录的函数名、去掉 _vN 后缀的名字查找
+        for name in (factor_name, module.__dict__.get(FUNCTION_NAME_ATTR), _VERSION_SUFFIX.sub("", factor_name)):
+            if name and callable(module.__dict__.get(name)):
+                return module.__dict__[name]
+        
+        for name, obj in inspect.getmembers(module, inspect.isfunction):
+            if obj.__module__ == module_name:
+                logger.warning(f"未找到 {factor_name}，自动匹配到函数: {name}")
+                return obj
+        
+        logger.error(f"模块中未找到有效函数: {factor_name}")
+        return None
 
-            if hasattr(module, factor_name):
-                return getattr(module, factor_name), unique_name, filepath
-            
-            import inspect
-            for name, obj in inspect.getmembers(module, inspect.isfunction):
-                if obj.__module__ == module_name:
-                    logger.warning(f"未找到 {factor_name}，自动匹配到函数: {name}")
-                    return obj, unique_name, filepath
+    @staticmethod
+    def load_function(filepath, factor_name, module_name=None):
+        """
+        从代码文件加载因子函数 (增量更新、断点续跑等已保存的因子)
+        
+        Args:
+            filepath: 因子代码文件路径
+            factor_name: 函数名，未找到时自动匹配模块内定义的第一个函数
+            module_name: 注册到 sys.modules 的模块名，默认取文件名
             
-            logger.error(f"模块中未找到有效函数: {factor_name}")
-            return None, unique_name, filepath
+        Returns:
+            func_object 或 None
+        """
+        if module_name is None:
+            module_name = os.path.splitext(os.path.basename(filepath))[0]
+        with open(filepath, "r", encoding="utf-8") as f:
+            code_string = f.read()
+        return CodeManager.load_source(code_string, factor_name, module_name)
+
+    @staticmethod
+    def source_of(func):
+        """因子函数的源码: 内存加载的取模块登记的源码，其他函数读取其源文件"""
+        source = func.__globals__.get("__source__")
+        if source is not None:
+            return source
+        with open(func.__code__.co_filename, "r", encoding="utf-8") as f:
+            return f.read()
 
+    @staticmethod
+    def persist_code(code_string, filepath, func_name=None):
+        """
+        把 (执行成功的) 因子代码写入文件，先写临时文件再替换，中断时不会留下半个文件
+        :param func_name: 因子函数名，记录在模块末尾，之后按文件名 (可能带 _vN 后缀) 加载时据此查找
+        """
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        code_string = CodeManager.clean_code(code_string)
+        if func_name and FUNCTION_NAME_ATTR not in code_string:
+            code_string += f"\n\n\n{FUNCTION_NAME_ATTR} = {func_name!r}\n"
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(code_string)
+        os.replace(tmp_path, filepath)
+        CodeManager.claim_factor_name(os.path.splitext(os.path.basename(filepath))[0], os.path.dirname(filepath) or ".")
+        logger.info(f"代码已保存至: {filepath}")
+
+    @staticmethod
+    def save_and_load_function(code_string, factor_name, output_dir, specific_name=None):
+        """
+        清洗代码，分配文件名，并在内存中加载模块 (不写文件，成功后由调用方 persist_code)
+        
+        Args:
+            code_string: AI 生成的代码字符串
+            factor_name: 原始函数名 (def Alpha...)，用于 getattr 获取函数对象
+            output_dir: 代码目录
+            specific_name: 指定文件名 (不含.py)。
+                           - 如果为 None，则自动分配唯一名 (如 Alpha_v1)。
+                           - 如果有值，则沿用该名字 (用于修复模式)。
+                           
+        Returns:
+            (func_object, unique_name, file_path)，file_path 为持久化时的目标路径
+        """
+        code_string = CodeManager.clean_code(code_string)
+        if not code_string:
+            logger.error("AI 返回了空代码。")
+            return None, factor_name, ""
+
+        if specific_name:
+            unique_name = specific_name
+            CodeManager.claim_factor_name(unique_name, output_dir)
+        else:
+            unique_name = CodeManager._get_unique_factor_name(factor_name, output_dir)
+        filepath = os.path.join(output_dir, f"{unique_name}.py")
+
+        try:
+            func = CodeManager.load_source(code_string, factor_name, module_name=unique_name)
         except Exception as e:
-            logger.error(f"代码保存/加载出错: {e}")
-            return None, factor_name, ""
\ No newline at end of file
+            # 语法错误等: 保留分配的名字，修复后的代码沿用同一文件名
+            logger.error(f"代码加载出错: {e}")
+            func = None
+        return func, unique_name, filepath
@@ -0,0 +1,135 @@
+# engine/correlation_filter.py
+import os
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from config import settings
+from engine.evaluation import MIN_CROSS_SECTION
+from engine.factor_store import list_factors, read_factors
+from utils.logger import logger
+
+
+class CorrelationIndex:
+    """
+    已入库因子的相关性索引。
+    每个因子只保存抽样交易日上的横截面标准化排名 (float16)，
+    新因子与整个因子库的平均横截面 Spearman 相关只需两次 einsum，复杂度 O(因子库大小)，
+    不再需要对因子库中所有因子做两两比对。
+    """
+
+    def __init__(self, panel, factor_dir, index_dir, threshold=None, sample_dates=None):
+        """
+        :param panel: data_loader.panel.PanelData，提供日期 / 股票轴
+        :param factor_dir: 因子输出目录，其中已有的因子即为因子库
+        :param index_dir: 索引缓存目录 (每个因子一个 .npz)
+        :param threshold: |平均相关系数| 达到该值即视为冗余，默认取 settings.CORR_FILTER_THRESHOLD
+        :param sample_dates: 参与计算的交易日数 (等间隔抽样)，默认取 settings.CORR_FILTER_SAMPLE_DATES
+        """
+        self.panel = panel
+        self.factor_dir = factor_dir
+        self.index_dir = index_dir
+        self.threshold = threshold or settings.CORR_FILTER_THRESHOLD
+
+        num_dates = panel.shape[0]
+        sample_dates = min(sample_dates or settings.CORR_FILTER_SAMPLE_DATES, num_dates)
+        self.rows = np.unique(np.linspace(0, num_dates - 1, sample_dates).round().astype(int))
+        self.signature = f"{panel.dates[0]}|{panel.dates[-1]}|{len(self.rows)}|{panel.shape[1]}"
+
+        self.names = []
+        self._scores = []
+        self._masks = []
+        self._lock = threading.Lock()
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._load_library()
+
+    def _standardized_ranks(self, df, factor_name):
+        """抽样日期上的横截面排名，逐日标准化为均值 0、方差 1，缺失填 0"""
+        values = self.panel.pivot(df, factor_name)[self.rows]
+        values[~np.isfinite(values)] = np.nan
+        ranks = pd.DataFrame(values).rank(axis=1).to_numpy()
+        mask = np.isfinite(ranks)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = (ranks - np.nanmean(ranks, axis=1, keepdims=True)) / np.nanstd(ranks, axis=1, keepdims=True)
+        mask &= np.isfinite(scores)
+        return np.where(mask, scores, 0.0), mask
+
+    def _load_library(self):
+        """载入 factor_dir 中已有的因子，索引缓存失效 (数据区间变化) 时从因子输出重建"""
+        for name in list_factors(self.factor_dir):
+            cache_path = os.path.join(self.index_dir, f"{name}.npz")
+            entry = None
+            if os.path.exists(cache_path):
+                cached = np.load(cache_path)
+                if str(cached["signature"]) == self.signature:
+                    entry = cached["scores"], cached["mask"]
+            if entry is None:
+                try:
+                    df = read_factors(self.factor_dir, [name])
+                    entry = self._standardized_ranks(df, name)
+                except Exception as e:
+                    logger.warning(f"因子 {name} 无法加入相关性索引: {e}")
+                    continue
+                self._save(name, *entry)
+            self._scores.append(entry[0].astype(np.float16))
+            self._masks.append(entry[1])
+            self.names.append(name)
+        logger.info(f"相关性索引已载入 {len(self.names)} 个因子。")
+
+    def _save(self, name, scores, mask):
+        np.savez(os.path.join(self.index_dir, f"{name}.npz"),
+                 scores=scores.astype(np.float16), mask=mask, signature=self.signature)
+
+    def correlations(self, scores, mask):
+        """
+        新因子与库中每个因子的平均横截面相关
+        Returns:
+            (L,) 数组，顺序与 self.names 一致
+        """
+        scores = scores.astype(np.float32)
+        mask = mask.astype(np.float32)
+        result = np.full(len(self.names), np.nan)
+        # 分块转换为 float32，限制临时内存
+        for start in range(0, len(self.names), settings.CORR_FILTER_CHUNK):
+            stop = start + settings.CORR_FILTER_CHUNK
+            numerator = np.einsum("sn,lsn->ls", scores, np.stack(self._scores[start:stop]).astype(np.float32))
+            overlap = np.einsum("sn,lsn->ls", mask, np.stack(self._masks[start:stop]).astype(np.float32))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                daily = numerator / overlap
+            daily[overlap < MIN_CROSS_SECTION] = np.nan
+            with warnings.catch_warnings():
+                # 与某个因子没有任何重叠日期时整行为 NaN
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                result[start:stop] = np.nanmean(daily, axis=1)
+        return result
+
+    def check_and_add(self, factor_name):
+        """
+        读取 factor_dir 中刚写入的因子与因子库比对，不冗余时加入因子库
+        Returns:
+            (is_redundant, 最相关的因子名, 相关系数)
+        """
+        df = read_factors(self.factor_dir, [factor_name])
+        scores, mask = self._standardized_ranks(df, factor_name)
+
+        # 比对与入库需原子完成，避免两个并发的相似因子同时入库
+        with self._lock:
+            if factor_name in self.names:
+                # 同名因子被重新计算 (如中断后续跑)，以新输出替换旧条目，不与自身比对
+                i = self.names.index(factor_name)
+                del self.names[i], self._scores[i], self._masks[i]
+            corr = self.correlations(scores, mask)
+            if len(corr) and np.isfinite(corr).any():
+                best = int(np.nanargmax(np.abs(corr)))
+                most_similar, value = self.names[best], float(corr[best])
+                if abs(value) >= self.threshold:
+                    return True, most_similar, value
+            else:
+                most_similar, value = None, 0.0
+
+            self._scores.append(scores.astype(np.float16))
+            self._masks.append(mask)
+            self.names.append(factor_name)
+        self._save(factor_name, scores, mask)
+        return False, most_similar, value
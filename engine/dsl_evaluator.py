@@ -0,0 +1,434 @@
+# engine/dsl_evaluator.py
+import re
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from config import settings
+from data_loader.derived import returns_of, vwap_of
+from data_loader.panel import PanelData
+from engine.expr_cache import canonicalize
+from engine import ts_ops
+
+
+class DSLParseError(ValueError):
+    """公式不符合 Alpha101 DSL 规范 (语法错误 / 未知算子 / 未知字段)"""
+    pass
+
+
+# ===========================
+# 1. 词法与语法定义
+# ===========================
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:"
+    r"(?P<num>\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<op>\|\||&&|==|!=|>=|<=|[-+*/^<>?:(),])"
+    r")"
+)
+
+# 时序函数: (x, d) 或 (x, y, d)，窗口 d 必须是数字常量
+TS_FUNCS = {
+    "delay": 1, "delta": 1, "sum": 1, "mean": 1, "product": 1, "stddev": 1,
+    "ts_min": 1, "ts_max": 1, "ts_argmin": 1, "ts_argmax": 1, "ts_rank": 1,
+    "decay_linear": 1, "correlation": 2, "covariance": 2,
+}
+# 逐元素/横截面函数: 名称 -> (最少参数, 最多参数)
+ELEM_FUNCS = {
+    "abs": (1, 1), "log": (1, 1), "sign": (1, 1), "signedpower": (2, 2),
+    "max": (2, 2), "min": (2, 2), "rank": (1, 1), "scale": (1, 2),
+}
+# 由 engine.ts_ops 编译核函数计算的时序算子
+TS_OPS = {
+    name: getattr(ts_ops, name) for name in (
+        "ts_min", "ts_max", "ts_argmin", "ts_argmax", "ts_rank", "decay_linear", "correlation", "covariance",
+    )
+}
+FUNC_ALIASES = {"corr": "correlation", "cov": "covariance", "ts_sum": "sum", "sma": "mean"}
+
+# DSL 字段 -> 原始列名
+FIELD_ALIASES = {
+    "open": "OpenPrice", "high": "HighPrice", "low": "LowPrice", "close": "ClosePrice",
+    "prev_close": "PrevClosePrice", "vol": "TurnOverVolume", "volume": "TurnOverVolume",
+    "amount": "TurnOverValue", "turnover": "TurnOverRate", "cap": "FloatMarketValue",
+}
+# 需要由原始字段派生的字段
+DERIVED_FIELDS = {"ret", "returns", "vwap"}
+_ADV_PATTERN = re.compile(r"^adv(\d+)$")
+
+STOCK_FIELDS = re.findall(r"'(\w+)'", settings.STOCK_COLUMNS_DESC)
+INDEX_FIELDS = [c for c in re.findall(r"'(\w+)'", settings.INDEX_COLUMNS_DESC) if c != "TradingDay"]
+
+
+def _tokenize(formula):
+    tokens = []
+    pos = 0
+    formula = formula.strip()
+    while pos < len(formula):
+        match = _TOKEN_PATTERN.match(formula, pos)
+        if not match or match.end() == pos:
+            raise DSLParseError(f"无法识别的字符: {formula[pos:pos + 10]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _Parser:
+    """
+    递归下降解析器，生成以元组表示的规范化语法树:
+        ('num', v) | ('field', name) | ('neg', x) | ('bin', op, l, r)
+        ('if', cond, a, b) | ('call', func, args_tuple, window)
+    元组可哈希，可直接作为子表达式缓存的键。
+    """
+    _CMP_OPS = ("==", "!=", ">", "<", ">=", "<=")
+
+    def __init__(self, formula):
+        self.tokens = _tokenize(formula)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise DSLParseError("公式为空")
+        node = self._ternary()
+        if self.pos != len(self.tokens):
+            raise DSLParseError(f"多余的符号: {self.tokens[self.pos][1]!r}")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        if self.pos >= len(self.tokens):
+            raise DSLParseError("公式意外结束")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _expect(self, symbol):
+        kind, value = self._next()
+        if value != symbol:
+            raise DSLParseError(f"期望 {symbol!r}，实际为 {value!r}")
+
+    def _ternary(self):
+        cond = self._binary(0)
+        if self._peek() == "?":
+            self._next()
+            a = self._ternary()
+            self._expect(":")
+            b = self._ternary()
+            return ("if", cond, a, b)
+        return cond
+
+    # 优先级从低到高
+    _LEVELS = (("||",), ("&&",), _CMP_OPS, ("+", "-"), ("*", "/"))
+
+    def _binary(self, level):
+        if level == len(self._LEVELS):
+            return self._unary()
+        node = self._binary(level + 1)
+        while self._peek() in self._LEVELS[level]:
+            op = self._next()[1]
+            node = ("bin", op, node, self._binary(level + 1))
+        return node
+
+    def _unary(self):
+        if self._peek() == "-":
+            self._next()
+            operand = self._unary()
+            if operand[0] == "num":
+                return ("num", -operand[1])
+            return ("neg", operand)
+        if self._peek() == "+":
+            self._next()
+            return self._unary()
+        return self._power()
+
+    def _power(self):
+        base = self._primary()
+        if self._peek() == "^":
+            self._next()
+            # 右结合: a^b^c = a^(b^c)
+            return ("bin", "^", base, self._unary())
+        return base
+
+    def _primary(self):
+        kind, value = self._next()
+        if kind == "num":
+            return ("num", float(value))
+        if value == "(":
+            node = self._ternary()
+            self._expect(")")
+            return node
+        if kind == "name":
+            if self._peek() == "(":
+                return self._call(value)
+            return ("field", _resolve_field(value))
+        raise DSLParseError(f"非法符号: {value!r}")
+
+    def _call(self, name):
+        self._expect("(")
+        args = []
+        if self._peek() != ")":
+            args.append(self._ternary())
+            while self._peek() == ",":
+                self._next()
+                args.append(self._ternary())
+        self._expect(")")
+
+        func = FUNC_ALIASES.get(name.lower(), name.lower())
+        if func in TS_FUNCS:
+            n_inputs = TS_FUNCS[func]
+            if len(args) != n_inputs + 1:
+                raise DSLParseError(f"{name} 需要 {n_inputs + 1} 个参数，实际 {len(args)} 个")
+            window = args[-1]
+            if window[0] != "num" or window[1] < 1:
+                raise DSLParseError(f"{name} 的窗口必须是正数常量")
+            return ("call", func, tuple(args[:-1]), int(window[1]))
+        if func in ELEM_FUNCS:
+            low, high = ELEM_FUNCS[func]
+            if not low <= len(args) <= high:
+                raise DSLParseError(f"{name} 参数个数错误: {len(args)}")
+            return ("call", func, tuple(args), None)
+        raise DSLParseError(f"未知算子: {name}")
+
+
+def _resolve_field(name):
+    """把 DSL 字段名规范化，无法识别的字段直接拒绝"""
+    lowered = name.lower()
+    if lowered in FIELD_ALIASES:
+        return FIELD_ALIASES[lowered]
+    if lowered in DERIVED_FIELDS:
+        return "returns" if lowered in ("ret", "returns") else lowered
+    if _ADV_PATTERN.match(lowered):
+        return lowered
+    if name in STOCK_FIELDS or name in INDEX_FIELDS:
+        return name
+    raise DSLParseError(f"未知字段: {name}")
+
+
+def parse_formula(formula):
+    """解析 DSL 公式，失败时抛出 DSLParseError"""
+    if not isinstance(formula, str):
+        raise DSLParseError("公式不是字符串")
+    return _Parser(formula).parse()
+
+
+def formula_lookback(node):
+    """
+    计算公式需要的历史交易日数 (不含当天)，用于增量更新时的预热窗口
+    例如 delta(close, 5) -> 5，ts_rank(mean(close, 10), 5) -> 13
+    """
+    kind = node[0]
+    if kind == "num":
+        return 0
+    if kind == "field":
+        adv = _ADV_PATTERN.match(node[1])
+        return int(adv.group(1)) - 1 if adv else 0
+    if kind == "neg":
+        return formula_lookback(node[1])
+    if kind == "bin":
+        return max(formula_lookback(node[2]), formula_lookback(node[3]))
+    if kind == "if":
+        return max(formula_lookback(child) for child in node[1:])
+
+    _, func, args, d = node
+    inner = max((formula_lookback(arg) for arg in args), default=0)
+    if func in ("delay", "delta"):
+        return inner + d
+    if func in TS_FUNCS:
+        return inner + d - 1
+    return inner
+
+
+# ===========================
+# 2. 面板求值
+# ===========================
+def _shift(x, d):
+    out = np.full(x.shape, np.nan)
+    if d < x.shape[0]:
+        out[d:] = x[:-d]
+    return out
+
+
+def _pad_front(values, d, shape):
+    out = np.full(shape, np.nan)
+    out[d - 1:] = values
+    return out
+
+
+class DSLEvaluator:
+    """
+    在 日期 x 股票 的 NumPy 面板上直接计算 DSL 公式。
+    时序算子沿 axis 0，横截面算子沿 axis 1，不需要任何 groupby。
+    """
+
+    def __init__(self, panel, cache=None):
+        """
+        :param panel: data_loader.panel.PanelData
+        :param cache: 可选的 SubexpressionCache，跨因子复用中间面板
+        """
+        self.panel = panel
+        self.shape = panel.shape
+        self.cache = cache
+        self._derived = {}
+
+    # --- 字段 ---
+    def field(self, name):
+        if name in self._derived:
+            return self._derived[name]
+        if name in INDEX_FIELDS:
+            return self.panel.index_field(name)
+        if name not in ("returns", "vwap") and not _ADV_PATTERN.match(name):
+            return self.panel.field(name)
+
+        if name == "returns":
+            # 使用前收盘价计算 close_to_close 收益，天然跳过停牌缺口
+            values = returns_of(self.field("ClosePrice"), self.field("PrevClosePrice"))
+        elif name == "vwap":
+            values = vwap_of(self.field("TurnOverValue"), self.field("TurnOverVolume"))
+        else:
+            d = int(_ADV_PATTERN.match(name).group(1))
+            values = pd.DataFrame(self.field("TurnOverValue")).rolling(d).mean().to_numpy()
+
+        self._derived[name] = values
+        return values
+
+    def _as_panel(self, x):
+        return np.broadcast_to(np.asarray(x, dtype=float), self.shape)
+
+    # --- 求值 ---
+    def evaluate(self, node):
+        # 规范化后，每个子节点本身就是缓存键
+        node = canonicalize(node)
+        with np.errstate(all="ignore"):
+            return self._eval(node)
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind == "num":
+            return node[1]
+        if kind == "field":
+            return self.field(node[1])
+        if self.cache is None:
+            return self._compute(node)
+
+        value = self.cache.get(node)
+        if value is None:
+            value = self._compute(node)
+            self.cache.put(node, value)
+        return value
+
+    def _compute(self, node):
+        kind = node[0]
+        if kind == "neg":
+            return -self._eval(node[1])
+        if kind == "bin":
+            return self._binary(node[1], self._eval(node[2]), self._eval(node[3]))
+        if kind == "if":
+            cond = np.asarray(self._eval(node[1]), dtype=float)
+            result = np.where(cond != 0, self._eval(node[2]), self._eval(node[3]))
+            return np.where(np.isnan(cond), np.nan, result)
+        if kind == "call":
+            args = [self._eval(arg) for arg in node[2]]
+            return self._call(node[1], args, node[3])
+        raise DSLParseError(f"未知节点: {kind}")
+
+    @staticmethod
+    def _binary(op, a, b):
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            return a / b
+        if op == "^":
+            return np.power(a, b)
+
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        if op in ("||", "&&"):
+            a_true, b_true = a != 0, b != 0
+            result = (a_true | b_true) if op == "||" else (a_true & b_true)
+        else:
+            result = {
+                "==": np.equal, "!=": np.not_equal, ">": np.greater,
+                "<": np.less, ">=": np.greater_equal, "<=": np.less_equal,
+            }[op](a, b)
+        # 比较运算返回 0/1，任一侧缺失则结果缺失
+        return np.where(np.isnan(a) | np.isnan(b), np.nan, result.astype(float))
+
+    def _call(self, func, args, d):
+        if func in ELEM_FUNCS:
+            return self._elementwise(func, args)
+
+        x = self._as_panel(args[0])
+        if func == "delay":
+            return _shift(x, d)
+        if func == "delta":
+            return x - _shift(x, d)
+        if func == "product":
+            if d > x.shape[0]:
+                return np.full(x.shape, np.nan)
+            return _pad_front(sliding_window_view(x, d, axis=0).prod(axis=-1), d, x.shape)
+        if func in TS_OPS:
+            if func in ("correlation", "covariance"):
+                return TS_OPS[func](x, self._as_panel(args[1]), d)
+            return TS_OPS[func](x, d)
+
+        rolling = pd.DataFrame(x).rolling(d)
+        if func == "sum":
+            return rolling.sum().to_numpy()
+        if func == "mean":
+            return rolling.mean().to_numpy()
+        if func == "stddev":
+            return rolling.std().to_numpy()
+        raise DSLParseError(f"未实现的算子: {func}")
+
+    def _elementwise(self, func, args):
+        if func == "abs":
+            return np.abs(args[0])
+        if func == "log":
+            x = np.asarray(args[0], dtype=float)
+            return np.where(x > 0, np.log(np.where(x > 0, x, 1.0)), np.nan)
+        if func == "sign":
+            return np.sign(args[0])
+        if func == "signedpower":
+            return np.sign(args[0]) * np.power(np.abs(args[0]), args[1])
+        if func == "max":
+            return np.fmax(args[0], args[1])
+        if func == "min":
+            return np.fmin(args[0], args[1])
+        if func == "rank":
+            return pd.DataFrame(self._as_panel(args[0])).rank(axis=1, pct=True).to_numpy()
+        if func == "scale":
+            x = self._as_panel(args[0])
+            a = args[1] if len(args) > 1 else 1.0
+            denom = np.nansum(np.abs(x), axis=1, keepdims=True)
+            return x * a / np.where(denom > 0, denom, np.nan)
+        raise DSLParseError(f"未实现的算子: {func}")
+
+    # --- 输出 ---
+    def evaluate_frame(self, formula, factor_name):
+        node = parse_formula(formula) if isinstance(formula, str) else formula
+        with np.errstate(all="ignore"):
+            return self.panel.to_frame(self.evaluate(node), factor_name)
+
+
+def evaluate_formula(formula, factor_name, df_raw, df_index=None):
+    """独立入口: 供持久化的因子代码文件直接调用"""
+    panel = PanelData(df_raw, df_index, columns=[])
+    return DSLEvaluator(panel).evaluate_frame(formula, factor_name)
+
+
+def render_factor_module(formula, factor_name, output_name):
+    """生成可被 CodeManager 保存与加载的因子代码"""
+    return (
+        f"# 由 DSL 原生求值器生成，无需 LLM 编码\n"
+        f"# 公式: {' '.join(formula.split())}\n"
+        f"from engine.dsl_evaluator import evaluate_formula\n\n"
+        f"FACTOR_FORMULA = {formula!r}\n\n\n"
+        f"def {factor_name}(df_raw, df_index):\n"
+        f"    return evaluate_formula(FACTOR_FORMULA, {output_name!r}, df_raw, df_index)\n"
+    )
@@ -0,0 +1,176 @@
+# engine/evaluation.py
+import os
+import numpy as np
+import pandas as pd
+from config import settings
+from engine.factor_store import list_factors, read_factors
+from utils.logger import logger
+
+# 当日有效股票数少于该值时不计算横截面统计
+MIN_CROSS_SECTION = 10
+
+
+def forward_returns(panel, horizon):
+    """
+    未来 horizon 日收益 (T, N): 由 ClosePrice / PrevClosePrice 得到复权日收益再累乘，
+    t 日的值为 t+1 ... t+horizon 的累计收益，停牌日按 0 收益处理
+    """
+    daily = panel.field("ClosePrice") / panel.field("PrevClosePrice") - 1.0
+    log_ret = np.log1p(np.where(np.isfinite(daily), daily, 0.0))
+    cum = np.vstack([np.zeros((1, panel.shape[1])), np.cumsum(log_ret, axis=0)])
+
+    out = np.full(panel.shape, np.nan)
+    if horizon < panel.shape[0]:
+        # cum[t + 1 + h] - cum[t + 1] = sum(log_ret[t + 1 : t + 1 + h])
+        out[:-horizon] = np.expm1(cum[1 + horizon:] - cum[1:-horizon])
+        out[:-horizon][~panel.valid_mask[horizon:]] = np.nan
+    out[~panel.valid_mask] = np.nan
+    return out
+
+
+def cross_sectional_rank(x):
+    """沿最后一维做百分比排名，x 形状 (..., T, N)，NaN 保持为 NaN"""
+    flat = x.reshape(-1, x.shape[-1])
+    ranked = pd.DataFrame(flat).rank(axis=1, pct=True).to_numpy()
+    return ranked.reshape(x.shape)
+
+
+def cross_sectional_corr(x, y):
+    """
+    逐日横截面 Pearson 相关
+    :param x: (F, T, N) 多个因子面板
+    :param y: (T, N) 收益面板，沿因子维广播
+    :return: (F, T)，只使用两者都有效的股票
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    count = valid.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_dm = np.where(valid, x, 0.0)
+        y_dm = np.where(valid, y, 0.0)
+        x_dm = np.where(valid, x_dm - (x_dm.sum(axis=-1) / count)[..., None], 0.0)
+        y_dm = np.where(valid, y_dm - (y_dm.sum(axis=-1) / count)[..., None], 0.0)
+        corr = (x_dm * y_dm).sum(axis=-1) / np.sqrt((x_dm ** 2).sum(axis=-1) * (y_dm ** 2).sum(axis=-1))
+    corr[count < MIN_CROSS_SECTION] = np.nan
+    return corr
+
+
+def _ir(series):
+    """(F, T) 时间序列的均值 / 标准差"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nanmean(series, axis=-1) / np.nanstd(series, axis=-1)
+
+
+class FactorEvaluator:
+    """
+    批量因子评价: 未来收益只计算一次，多个因子堆叠为 (F, T, N) 张量，
+    IC / RankIC / IC 衰减 / 分层收益 / 换手率都以矩阵运算一次得到。
+    """
+
+    def __init__(self, panel, horizons=None, quantiles=None, batch_size=None):
+        """
+        :param panel: data_loader.panel.PanelData (需含 ClosePrice / PrevClosePrice)
+        :param horizons: 预测期列表 (交易日)，第一个用于 IC / 分层收益，其余用于 IC 衰减
+        :param quantiles: 分层数
+        :param batch_size: 每批堆叠的因子数，控制内存
+        """
+        self.panel = panel
+        self.horizons = list(horizons or settings.EVAL_HORIZONS)
+        self.quantiles = quantiles or settings.EVAL_QUANTILES
+        self.batch_size = batch_size or settings.EVAL_BATCH_SIZE
+
+        self.returns = {h: forward_returns(panel, h) for h in self.horizons}
+        self.return_ranks = {h: cross_sectional_rank(r) for h, r in self.returns.items()}
+
+    def load_factors(self, factor_dir, factor_names):
+        """一次读取 factor_dir 中的多个因子，对齐为 (F, T, N)，行情中不存在的单元置为 NaN"""
+        df = read_factors(factor_dir, factor_names)
+        stack = np.full((len(factor_names),) + self.panel.shape, np.nan)
+        for i, name in enumerate(factor_names):
+            stack[i] = self.panel.pivot(df, name)
+        stack[~np.isfinite(stack)] = np.nan
+        stack[:, ~self.panel.valid_mask] = np.nan
+        return stack
+
+    def evaluate_batch(self, values, factor_names):
+        """
+        :param values: (F, T, N) 因子面板
+        Returns:
+            (summary DataFrame, 每日 RankIC DataFrame)
+        """
+        h0 = self.horizons[0]
+        ranks = cross_sectional_rank(values)
+
+        ic = cross_sectional_corr(values, self.returns[h0])
+        # 因子与收益各自横截面排名后求相关 (近似 Spearman，两者缺失位置不同时略有偏差)
+        rank_ic = {h: cross_sectional_corr(ranks, self.return_ranks[h]) for h in self.horizons}
+
+        summary = pd.DataFrame(index=pd.Index(factor_names, name="Factor_Name"))
+        tradable = self.panel.valid_mask.sum()
+        summary["Coverage"] = np.isfinite(values).sum(axis=(1, 2)) / tradable
+        summary["IC"] = np.nanmean(ic, axis=-1)
+        summary["ICIR"] = _ir(ic)
+        summary["RankIC"] = np.nanmean(rank_ic[h0], axis=-1)
+        summary["RankICIR"] = _ir(rank_ic[h0])
+        for h in self.horizons:
+            summary[f"RankIC_{h}D"] = np.nanmean(rank_ic[h], axis=-1)
+
+        # 分层: 按横截面排名等分，统计各层未来 h0 日平均收益
+        buckets = np.ceil(ranks * self.quantiles)
+        fwd = self.returns[h0]
+        layer_means = []
+        for q in range(1, self.quantiles + 1):
+            member = (buckets == q) & np.isfinite(fwd)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                daily = np.where(member, fwd, 0.0).sum(axis=-1) / member.sum(axis=-1)
+            layer_means.append(daily)
+            summary[f"Q{q}"] = np.nanmean(daily, axis=-1)
+        summary["LongShort"] = np.nanmean(layer_means[-1] - layer_means[0], axis=-1)
+
+        # 换手率: 顶层成分股中当天新进入的比例
+        top = buckets == self.quantiles
+        entered = (top[:, 1:] & ~top[:, :-1]).sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            summary["Turnover"] = np.nanmean(entered / top[:, 1:].sum(axis=-1), axis=-1)
+
+        daily_rank_ic = pd.DataFrame(rank_ic[h0].T, index=pd.Index(self.panel.dates, name="TradingDay"),
+                                     columns=factor_names)
+        return summary, daily_rank_ic
+
+    def evaluate(self, factor_dir, factor_names):
+        """分批评价 factor_dir 下的多个因子"""
+        summaries, dailies = [], []
+        for start in range(0, len(factor_names), self.batch_size):
+            names = list(factor_names[start:start + self.batch_size])
+            logger.info(f"正在评价因子 {start + 1}-{start + len(names)} / {len(factor_names)} ...")
+            summary, daily = self.evaluate_batch(self.load_factors(factor_dir, names), names)
+            summaries.append(summary)
+            dailies.append(daily)
+        if not summaries:
+            return pd.DataFrame(), pd.DataFrame()
+        return pd.concat(summaries), pd.concat(dailies, axis=1)
+
+
+def evaluate_records(records_path, factor_dir, panel):
+    """
+    评价一次挖掘运行中所有成功的因子，结果写在记录表旁边:
+    factor_evaluation_*.csv (汇总指标) 与 factor_daily_rankic_*.parquet (每日 RankIC)
+    Returns:
+        汇总 DataFrame
+    """
+    records = pd.read_csv(records_path, encoding="utf-8-sig")
+    names = records.loc[records["Status"] == "Success", "Factor_Name"].drop_duplicates()
+    available = set(list_factors(factor_dir))
+    names = [n for n in names if n in available]
+    if not names:
+        logger.info("没有需要评价的因子。")
+        return pd.DataFrame()
+
+    summary, daily = FactorEvaluator(panel).evaluate(factor_dir, names)
+
+    run_id = os.path.splitext(os.path.basename(records_path))[0].replace("factor_records", "").strip("_")
+    summary_path = os.path.join(os.path.dirname(records_path), f"factor_evaluation_{run_id}.csv")
+    daily_path = os.path.join(os.path.dirname(records_path), f"factor_daily_rankic_{run_id}.parquet")
+    summary.to_csv(summary_path, encoding="utf-8-sig")
+    daily.to_parquet(daily_path)
+    logger.info(f"因子评价结果已保存至: {summary_path}")
+    return summary
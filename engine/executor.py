@@ -1,63 +1,200 @@
 # engine/executor.py
 import os
+import threading
+import numpy as np
 import pandas as pd
 import traceback  
 from config import settings
+from data_loader.compact import restore_keys
+from data_loader.derived import DerivedFields, referenced_fields
+from data_loader.panel import PanelData
+from engine.dsl_evaluator import DSLEvaluator
+from engine.expr_cache import SubexpressionCache
+from engine.factor_store import write_factor
+from engine.factor_writer import get_factor_writer
+from engine.profiler import measure
+from engine.shared_data import SharedFrame, ReadOnlyViolation, READONLY_HINT, freeze_frame, is_readonly_error
 from utils.logger import logger
 
 class Executor:
-    def __init__(self, data_bundle):
-        self.data_bundle = data_bundle
-
-    def run(self, factor_func, factor_name, output_dir):
+    def __init__(self, data_bundle, isolation=None, smoke_test=None, async_write=None):
         """
-        执行因子计算逻辑
-        Returns:
-            tuple: (bool is_success, str message)
-            - 成功: (True, "Success")
-            - 失败: (False, "错误详情或堆栈信息")
+        :param isolation: 输入数据隔离方式，默认取 settings.EXECUTION_ISOLATION
+                          - 'readonly': 全局共享一份只读数据，每次只分发浅拷贝视图
+                          - 'copy': 每次执行都深拷贝输入数据
+        :param smoke_test: 是否先在抽样子面板上试运行，默认取 settings.SMOKE_TEST_ENABLED
+        :param async_write: 是否把结果交给后台写入器 (run 在写盘前返回，用 wait_written 确认)，
+                            默认取 settings.ASYNC_WRITE_ENABLED
         """
+        self.data_bundle = data_bundle
+        self.isolation = isolation or settings.EXECUTION_ISOLATION
+        self._dsl_evaluator = None
+        self.expr_cache = SubexpressionCache(settings.SUBEXPR_CACHE_MAX_MB * 1024 * 1024)
+        # 原生求值共用面板 (字段按需转换) 与子表达式缓存，多个线程同时 run_formula 时逐个求值
+        self._formula_lock = threading.Lock()
+        self._evaluator_lock = threading.Lock()
+
+        if self.isolation not in ("readonly", "copy"):
+            raise ValueError(f"未知的隔离模式: {self.isolation}")
+        self._shared = self._share_frames(data_bundle)
+
+        self.smoke_test = settings.SMOKE_TEST_ENABLED if smoke_test is None else smoke_test
+        async_write = settings.ASYNC_WRITE_ENABLED if async_write is None else async_write
+        self.writer = get_factor_writer() if async_write else None
+        self._sample = None
+        self._sample_shared = None
+
+    def _share_frames(self, frames):
+        """只读模式下为 stock / index 建立共享只读数据；pandas 内部结构不支持冻结时回退到 'copy' 隔离"""
+        if self.isolation != "readonly":
+            return {}
+        keys = [key for key in ('stock', 'index') if frames.get(key) is not None]
+        if not all(freeze_frame(frames[key]) for key in keys):
+            logger.warning(f"当前 pandas ({pd.__version__}) 的内部结构不支持零拷贝只读共享，回退到 'copy' 隔离 (每次执行深拷贝输入)。")
+            self.isolation = "copy"
+            return {}
+        return {key: SharedFrame(frames[key]) for key in keys}
+
+    @staticmethod
+    def _derived_fields(frames):
+        """数据包中的派生字段 (DataLoader 已挂载时直接复用，否则首次使用时创建并挂载)"""
+        if frames.get('derived') is None:
+            frames['derived'] = DerivedFields(frames['stock'], frames.get('index'))
+        return frames['derived']
+
+    def _prepare_inputs(self, frames, shared, derived_names=()):
+        """按隔离模式准备 (df_raw, df_index)，df_raw 附加因子代码用到的派生字段 (含对齐后的指数字段)"""
+        inputs = []
+        for key in ('stock', 'index'):
+            if frames.get(key) is None:
+                inputs.append(None)
+            elif key in shared:
+                inputs.append(shared[key].view())
+            else:
+                inputs.append(frames[key].copy())
+        if derived_names and inputs[0] is not None:
+            self._derived_fields(frames).attach(inputs[0], derived_names, copy='stock' not in shared)
+        return inputs
+
+    def _call_factor(self, factor_func, frames, shared):
+        """调用因子函数；只读模式下把原地修改转换为明确的 ReadOnlyViolation"""
+        derived_names = referenced_fields(factor_func, self._derived_fields(frames))
+        df_raw_input, df_index_input = self._prepare_inputs(frames, shared, derived_names)
         try:
-            logger.info(f"正在执行函数: {factor_name} ...")
-            
-            df_raw_input = self.data_bundle['stock'].copy()
-            df_index_input = self.data_bundle['index'].copy() if self.data_bundle['index'] is not None else None
-            
             df_result = factor_func(
                 df_raw=df_raw_input,
                 df_index=df_index_input
             )
+        except ValueError as e:
+            if shared and is_readonly_error(e):
+                raise ReadOnlyViolation(f"{e}. {READONLY_HINT}") from e
+            raise
 
+        if 'stock' in shared:
+            shared['stock'].verify(df_raw_input, "df_raw")
+        if 'index' in shared:
+            shared['index'].verify(df_index_input, "df_index")
+        return df_result
 
-            if not isinstance(df_result, pd.DataFrame):
-                msg = f"Return type error: Expected pd.DataFrame, got {type(df_result)}"
-                logger.error(msg)
-                return False, msg  
+    def _get_sample(self):
+        """
+        确定性的抽样子面板: 等间隔选取 SMOKE_TEST_STOCKS 只股票 + 最近 SMOKE_TEST_DAYS 个交易日，保持原有行顺序
+        数据本身不大于抽样规模时返回 None (冒烟测试没有意义)
+        """
+        if self._sample is None:
+            df_stock = self.data_bundle['stock']
+            codes = np.asarray(pd.unique(df_stock['SecuCode']))
+            days = pd.unique(df_stock['TradingDay'])
+            if len(codes) <= settings.SMOKE_TEST_STOCKS and len(days) <= settings.SMOKE_TEST_DAYS:
+                self._sample = {}
+                return None
 
-            expected_base_cols = settings.REQUIRED_OUTPUT_COLS
-            missing_cols = [col for col in expected_base_cols if col not in df_result.columns]
-            if missing_cols:
-                msg = f"Missing required columns: {missing_cols}. Ensure you reset_index."
-                logger.error(msg)
-                return False, msg  
+            codes = np.sort(codes)
+            picks = np.linspace(0, len(codes) - 1, min(settings.SMOKE_TEST_STOCKS, len(codes))).round().astype(int)
+            sample_codes = codes[np.unique(picks)]
+            sample_days = np.sort(days)[-settings.SMOKE_TEST_DAYS:]
 
-            if factor_name not in df_result.columns:
-                msg = f"Result missing factor column: '{factor_name}'. Check your column renaming logic."
-                logger.error(msg)
-                return False, msg 
+            mask = df_stock['SecuCode'].isin(sample_codes) & df_stock['TradingDay'].isin(sample_days)
+            self._sample = {"stock": df_stock[mask].reset_index(drop=True)}
+            df_index = self.data_bundle.get('index')
+            if df_index is not None:
+                self._sample["index"] = df_index[df_index['TradingDay'].isin(sample_days)].reset_index(drop=True)
+            self._sample_shared = self._share_frames(self._sample)
+        return self._sample or None
 
-            final_cols = expected_base_cols + [factor_name]
-            
-            df_final = df_result[final_cols].copy()
-            
-            if 'SecuCode' in df_final.columns:
-                df_final['SecuCode'] = df_final['SecuCode'].astype(str).str.zfill(6).str.slice(0, 6)
+    def _smoke_test(self, factor_func, factor_name):
+        """
+        在抽样子面板上试运行，秒级暴露 KeyError、索引错位、返回列缺失等问题
+        Returns:
+            (bool is_success, str message)
+        """
+        sample = self._get_sample()
+        if sample is None:
+            return True, "Skipped"
 
-            output_filepath = os.path.join(output_dir, f"{factor_name}.parquet")
-            df_final.to_parquet(output_filepath, index=False)
-            
-            logger.info(f"保存成功: {output_filepath}")
-            return True, "Success"
+        prefix = (f"SmokeTest failed on a {len(sample['stock'])}-row sample "
+                  f"({settings.SMOKE_TEST_STOCKS} stocks x {settings.SMOKE_TEST_DAYS} days)")
+        try:
+            df_result = self._call_factor(factor_func, sample, self._sample_shared)
+        except Exception:
+            logger.error(f"{factor_name} 冒烟测试失败。")
+            return False, f"{prefix}:\n{traceback.format_exc()}"
+
+        msg = self._check_result(df_result, factor_name)
+        if msg is None:
+            msg = self._check_sample_result(df_result, factor_name, len(sample['stock']))
+        if msg is not None:
+            logger.error(f"{factor_name} 冒烟测试失败: {msg}")
+            return False, f"{prefix}: {msg}"
+        return True, "Success"
+
+    @staticmethod
+    def _check_sample_result(df_result, factor_name, sample_rows):
+        """抽样结果的额外检查: 行数膨胀、键重复、因子列类型"""
+        if df_result.empty:
+            return "Result is empty."
+        if len(df_result) > sample_rows:
+            return (f"Result has {len(df_result)} rows but the input has only {sample_rows}; "
+                    f"a merge is probably multiplying rows.")
+        if df_result.duplicated(subset=settings.REQUIRED_OUTPUT_COLS).any():
+            return f"Result has duplicated {settings.REQUIRED_OUTPUT_COLS} keys."
+        if not pd.api.types.is_numeric_dtype(df_result[factor_name]):
+            return f"Factor column '{factor_name}' has non-numeric dtype {df_result[factor_name].dtype}."
+        return None
+
+    @property
+    def dsl_evaluator(self):
+        """DSL 原生求值器，优先复用 DataLoader.load_panel 的面板，否则首次使用时才转换 (全局一次)"""
+        if self._dsl_evaluator is None:
+            with self._evaluator_lock:
+                if self._dsl_evaluator is None:
+                    panel = self.data_bundle.get('panel')
+                    if panel is None:
+                        panel = PanelData(self.data_bundle['stock'], self.data_bundle['index'], columns=[])
+                        self.data_bundle['panel'] = panel
+                    self._dsl_evaluator = DSLEvaluator(panel, cache=self.expr_cache)
+        return self._dsl_evaluator
+
+    def run(self, factor_func, factor_name, output_dir, profile=None):
+        """
+        执行因子计算逻辑
+        :param profile: 字典，传入时写入本次执行的资源消耗 (见 engine.profiler.measure)
+        Returns:
+            tuple: (bool is_success, str message)
+            - 成功: (True, "Success")
+            - 失败: (False, "错误详情或堆栈信息")
+        """
+        try:
+            with measure(profile):
+                if self.smoke_test:
+                    passed, message = self._smoke_test(factor_func, factor_name)
+                    if not passed:
+                        return False, message
+
+                logger.info(f"正在执行函数: {factor_name} ...")
+                df_result = self._call_factor(factor_func, self.data_bundle, self._shared)
+
+                return self._validate_and_save(df_result, factor_name, output_dir)
 
         except Exception as e:
             
@@ -66,4 +203,93 @@ class Executor:
             
             logger.error(f"执行时发生运行时错误: {error_msg}")
             
-            return False, full_traceback
\ No newline at end of file
+            return False, full_traceback
+
+    def run_formula(self, factor_formula, factor_name, output_dir, profile=None):
+        """
+        直接在面板上求值 DSL 公式，跳过 LLM 编码
+        Returns:
+            tuple: (bool is_success, str message)，与 run 一致
+        """
+        try:
+            with measure(profile):
+                logger.info(f"正在原生求值公式: {factor_name} ...")
+                with self._formula_lock:
+                    df_result = self.dsl_evaluator.evaluate_frame(factor_formula, factor_name)
+                return self._validate_and_save(df_result, factor_name, output_dir)
+
+        except Exception as e:
+            logger.error(f"原生求值时发生错误: {e}")
+            return False, traceback.format_exc()
+
+    @staticmethod
+    def _check_result(df_result, factor_name):
+        """校验返回结果的类型与列，通过时返回 None，否则返回错误信息"""
+        if not isinstance(df_result, pd.DataFrame):
+            return f"Return type error: Expected pd.DataFrame, got {type(df_result)}"
+
+        missing_cols = [col for col in settings.REQUIRED_OUTPUT_COLS if col not in df_result.columns]
+        if missing_cols:
+            return f"Missing required columns: {missing_cols}. Ensure you reset_index."
+
+        if factor_name not in df_result.columns:
+            return f"Result missing factor column: '{factor_name}'. Check your column renaming logic."
+        return None
+
+    def _finalize(self, df_result, factor_name, restore=True):
+        """
+        校验返回结果并整理为标准输出格式
+        :param restore: 是否还原键；交给后台写入器时为 False，由写线程还原
+        Returns:
+            (DataFrame 或 None, str message)
+        """
+        msg = self._check_result(df_result, factor_name)
+        if msg is not None:
+            logger.error(msg)
+            return None, msg
+
+        final_cols = settings.REQUIRED_OUTPUT_COLS + [factor_name]
+        
+        # 输出边界: 键还原为 6 位字符串代码与日期 (紧凑档位下输入为分类编码与 int32 日期键)，因子值统一为 float64
+        df_final = restore_keys(df_result[final_cols]) if restore else df_result[final_cols].copy(deep=False)
+        df_final[factor_name] = df_final[factor_name].astype(np.float64)
+        return df_final, "Success"
+
+    def compute(self, factor_func, factor_name):
+        """
+        在全部输入数据上计算因子但不保存 (不做冒烟测试，用于已通过验证的代码，如增量更新)
+        Returns:
+            (DataFrame 或 None, str message)
+        """
+        try:
+            df_result = self._call_factor(factor_func, self.data_bundle, self._shared)
+            return self._finalize(df_result, factor_name)
+        except Exception as e:
+            logger.error(f"执行时发生运行时错误: {e}")
+            return None, traceback.format_exc()
+
+    def _validate_and_save(self, df_result, factor_name, output_dir):
+        """校验返回结果并写入因子库 (或单独的 parquet)；启用后台写入时只提交，写入结果由 wait_written 确认"""
+        df_final, msg = self._finalize(df_result, factor_name, restore=self.writer is None)
+        if df_final is None:
+            return False, msg
+
+        if self.writer is not None:
+            self.writer.submit(output_dir, df_final, factor_name)
+            logger.info(f"已提交后台写入: {os.path.join(output_dir, factor_name)}")
+            return True, "Success"
+
+        write_factor(output_dir, df_final, factor_name)
+        
+        logger.info(f"保存成功: {os.path.join(output_dir, factor_name)}")
+        return True, "Success"
+
+    def wait_written(self, factor_name, output_dir):
+        """
+        等待该因子的后台写入完成 (同步写入时直接返回成功)
+        Returns:
+            (bool is_success, str message)
+        """
+        if self.writer is None:
+            return True, "Success"
+        return self.writer.wait(output_dir, factor_name)
@@ -0,0 +1,100 @@
+# engine/expr_cache.py
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# 满足交换律的运算，规范化时对操作数排序，使 a*b 与 b*a 命中同一缓存
+COMMUTATIVE_BIN_OPS = {"+", "*", "==", "!=", "||", "&&"}
+COMMUTATIVE_FUNCS = {"max", "min", "correlation", "covariance"}
+
+
+def canonicalize(node):
+    """
+    把语法树规范化为缓存键: (算子, 输入, 窗口)
+    只调整交换律运算的操作数顺序，不改变计算语义。
+    """
+    kind = node[0]
+    if kind in ("num", "field"):
+        return node
+    if kind == "neg":
+        return ("neg", canonicalize(node[1]))
+    if kind == "if":
+        return ("if",) + tuple(canonicalize(child) for child in node[1:])
+    if kind == "bin":
+        op, left, right = node[1], canonicalize(node[2]), canonicalize(node[3])
+        if op in COMMUTATIVE_BIN_OPS and repr(right) < repr(left):
+            left, right = right, left
+        return ("bin", op, left, right)
+    if kind == "call":
+        func, args, window = node[1], tuple(canonicalize(arg) for arg in node[2]), node[3]
+        if func in COMMUTATIVE_FUNCS:
+            args = tuple(sorted(args, key=repr))
+        return ("call", func, args, window)
+    return node
+
+
+class SubexpressionCache:
+    """
+    子表达式面板的 LRU 缓存，按占用字节数限制容量。
+    与 Executor 同生命周期，同一次挖掘任务中的多个因子共享中间结果；读写均加锁，可在多个线程间共享。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._store)
+
+    def get(self, key):
+        """命中时返回面板；未命中在 put 中统计 (标量等不会进入缓存的结果不计入，避免拉低命中率)"""
+        with self._lock:
+            value = self._store.get(key)
+            if value is None:
+                return None
+            self._store.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not isinstance(value, np.ndarray):
+            return
+        with self._lock:
+            if key in self._store:
+                return
+            self.misses += 1
+            if value.nbytes > self.max_bytes:
+                return
+
+            # 缓存中的面板会被多个因子共享，禁止原地修改
+            value.flags.writeable = False
+            self._store[key] = value
+            self.current_bytes += value.nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._store.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._store),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
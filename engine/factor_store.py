@@ -0,0 +1,387 @@
+# engine/factor_store.py
+import json
+import os
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import settings
+from data_loader.compact import restore_keys
+from data_loader.panel import KEY_COLUMNS
+from utils.logger import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows 使用 msvcrt 的文件锁
+    fcntl = None
+    import msvcrt
+
+
+def _as_datetime(values):
+    """TradingDay 可能是 datetime / 'YYYY-MM-DD' / 20200102 形式，统一转换为 Timestamp"""
+    series = pd.Series(values)
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_datetime(series.astype(str), format="%Y%m%d")
+    return pd.to_datetime(series)
+
+
+def _normalize_keys(df):
+    # 紧凑档位的行情数据 (分类编码 / int32 日期键) 与 Executor 输出使用相同的键
+    return restore_keys(df[KEY_COLUMNS])
+
+
+def _atomic_write(df, path):
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False, compression=settings.FACTOR_WRITE_COMPRESSION,
+                  row_group_size=settings.FACTOR_WRITE_ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _file_lock(path):
+    """跨进程的排他文件锁 (并行工作进程、后台写线程可能同时写同一分区)"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重试约 10 秒后放弃，继续等待
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FactorStore:
+    """
+    按年 (或月) 分区的宽表因子库:
+        root/2020/factors.parquet   (TradingDay, SecuCode) 键 + 每个因子一列，按日期、代码排序
+    键只存一份；读取多个因子时每个分区只打开一个文件，按列投影，日期范围通过行组统计下推过滤。
+    写入因子时重写所在分区的文件 (分区锁保证多个进程 / 线程同时写入时不丢列)。
+    每个因子已计算的行数记录在文件元数据中: 新交易日追加到分区键的末尾，超出部分视为尚未计算 (值为 NaN)。
+    """
+    DATA_FILE = "factors.parquet"
+    LOCK_FILE = ".lock"
+    # 旧版布局: 分区键文件 + 每个因子一个单列文件，打开因子库时自动合并为宽表
+    LEGACY_KEYS_FILE = "_keys.parquet"
+    ROWS_METADATA = b"factor_rows"
+
+    def __init__(self, root, partition=None):
+        """
+        :param partition: 'year' 或 'month'，默认取 settings.FACTOR_STORE_PARTITION
+        """
+        self.root = root
+        self.partition = partition or settings.FACTOR_STORE_PARTITION
+        self._keys_cache = {}
+        os.makedirs(root, exist_ok=True)
+        self._migrate_legacy()
+
+    def _period_of(self, dates):
+        # 只格式化唯一日期 (逐行 strftime 在百万行上需要数秒)
+        fmt = "%Y" if self.partition == "year" else "%Y-%m"
+        codes, uniques = pd.factorize(np.asarray(dates))
+        return _as_datetime(uniques).dt.strftime(fmt).to_numpy()[codes]
+
+    def _dir(self, period):
+        return os.path.join(self.root, period)
+
+    def _path(self, period):
+        return os.path.join(self._dir(period), self.DATA_FILE)
+
+    def _locked(self, period):
+        os.makedirs(self._dir(period), exist_ok=True)
+        return _file_lock(os.path.join(self._dir(period), self.LOCK_FILE))
+
+    def partitions(self, start=None, end=None):
+        periods = sorted(p for p in os.listdir(self.root) if os.path.exists(self._path(p)))
+        if start is not None:
+            first = self._period_of([start])[0]
+            periods = [p for p in periods if p >= first]
+        if end is not None:
+            last = self._period_of([end])[0]
+            periods = [p for p in periods if p <= last]
+        return periods
+
+    def _factor_rows(self, schema):
+        metadata = schema.metadata or {}
+        return json.loads(metadata.get(self.ROWS_METADATA, b"{}"))
+
+    def _keys(self, period):
+        """分区键 (DataFrame, MultiIndex) 与 {因子名: 已计算行数}，只读取键列，按文件修改时间缓存"""
+        path = self._path(period)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._keys_cache.get(period)
+        if cached is None or cached[0] != signature:
+            table = pq.read_table(path, columns=KEY_COLUMNS)
+            keys = table.to_pandas()
+            rows = self._factor_rows(pq.read_schema(path))
+            cached = (signature, keys, pd.MultiIndex.from_frame(keys), rows)
+            self._keys_cache[period] = cached
+        return cached[1], cached[2], cached[3]
+
+    def _load(self, period):
+        """读取整个分区: (键 DataFrame, {因子名: float64 数组}, {因子名: 已计算行数})"""
+        path = self._path(period)
+        table = pq.read_table(path)
+        keys = table.select(KEY_COLUMNS).to_pandas()
+        columns = {name: table.column(name).to_numpy().astype(np.float64)
+                   for name in table.column_names if name not in KEY_COLUMNS}
+        return keys, columns, self._factor_rows(table.schema)
+
+    def _save(self, period, keys, columns, rows):
+        """写入整个分区 (调用方需持有分区锁)"""
+        table = pa.Table.from_pandas(keys[KEY_COLUMNS], preserve_index=False)
+        for name, values in columns.items():
+            table = table.append_column(name, pa.array(values, type=pa.float64()))
+        metadata = dict(table.schema.metadata or {})
+        metadata[self.ROWS_METADATA] = json.dumps(rows).encode()
+        table = table.replace_schema_metadata(metadata)
+        path = self._path(period)
+        tmp_path = f"{path}.tmp"
+        # 因子值几乎不重复: 只对键列做字典编码，只为日期列写统计信息 (供读取时按日期过滤行组)
+        pq.write_table(table, tmp_path, compression=settings.FACTOR_WRITE_COMPRESSION,
+                       row_group_size=settings.FACTOR_WRITE_ROW_GROUP_SIZE,
+                       use_dictionary=KEY_COLUMNS, write_statistics=['TradingDay'])
+        os.replace(tmp_path, path)
+
+    def _migrate_legacy(self):
+        """把旧版布局 (_keys.parquet + 每因子一个列文件) 的分区合并为宽表文件"""
+        for period in sorted(os.listdir(self.root)):
+            keys_path = os.path.join(self._dir(period), self.LEGACY_KEYS_FILE)
+            if not os.path.exists(keys_path):
+                continue
+            with self._locked(period):
+                if not os.path.exists(keys_path):
+                    continue
+                keys = pd.read_parquet(keys_path)
+                files = [f for f in os.listdir(self._dir(period))
+                         if f.endswith(".parquet") and f not in (self.LEGACY_KEYS_FILE, self.DATA_FILE)]
+                columns, rows = {}, {}
+                for f in files:
+                    name = os.path.splitext(f)[0]
+                    stored = pd.read_parquet(os.path.join(self._dir(period), f))[name].to_numpy(dtype=float)
+                    stored = stored[:len(keys)]
+                    values = np.full(len(keys), np.nan)
+                    values[:len(stored)] = stored
+                    columns[name], rows[name] = values, len(stored)
+                self._save(period, keys, columns, rows)
+                for f in files + [self.LEGACY_KEYS_FILE]:
+                    os.remove(os.path.join(self._dir(period), f))
+            logger.info(f"因子库分区 {period} 已从单列文件布局合并为宽表 ({len(columns)} 个因子)。")
+
+    # --- 写入 ---
+    def sync_keys(self, df_stock):
+        """
+        用行情数据建立 / 扩展各分区的键 (写入因子前调用一次)
+        新交易日追加在分区末尾 (已有因子在新行上为 NaN)；历史键发生变化时重新对齐该分区的所有列
+        """
+        keys = _normalize_keys(df_stock).drop_duplicates()
+        keys = keys.sort_values(KEY_COLUMNS).reset_index(drop=True)
+        for period, part in keys.groupby(self._period_of(keys['TradingDay']), sort=True):
+            part = part.reset_index(drop=True)
+            with self._locked(period):
+                if not os.path.exists(self._path(period)):
+                    self._save(period, part, {}, {})
+                    continue
+                old, old_index, _ = self._keys(period)
+                if len(old) == len(part) and part.equals(old):
+                    continue
+                _, columns, rows = self._load(period)
+                if len(old) <= len(part) and part.iloc[:len(old)].equals(old):
+                    for name, stored in columns.items():
+                        values = np.full(len(part), np.nan)
+                        values[:len(stored)] = stored
+                        columns[name] = values
+                else:
+                    columns, rows = self._realign(period, old_index, pd.MultiIndex.from_frame(part), columns, rows)
+                self._save(period, part, columns, rows)
+
+    def _realign(self, period, old_index, new_index, columns, rows):
+        logger.warning(f"因子库分区 {period} 的历史键发生变化，正在重新对齐所有因子列...")
+        positions = new_index.get_indexer(old_index)
+        aligned_columns, aligned_rows = {}, {}
+        for name, stored in columns.items():
+            stored = stored[:rows.get(name, len(stored))]
+            mapped = positions[:len(stored)]
+            found = mapped >= 0
+            aligned = np.full(len(new_index), np.nan)
+            aligned[mapped[found]] = stored[found]
+            aligned_columns[name] = aligned
+            # 已计算行数只到原列已计算部分对应的最后一行，新增的键仍视为未计算
+            aligned_rows[name] = int(mapped[found].max()) + 1 if found.any() else 0
+        return aligned_columns, aligned_rows
+
+    def write(self, df, factor_name, append=False):
+        """
+        写入因子列
+        :param df: ['SecuCode', 'TradingDay', factor_name] 长表
+        :param append: True 时只更新 df 覆盖的行 (增量更新)，否则整列替换
+        """
+        keys_in = _normalize_keys(df)
+        groups = keys_in.groupby(self._period_of(keys_in['TradingDay']), sort=True).indices
+        if not append:
+            # 整列替换: 不在 df 中的分区删除该列
+            for period in self.partitions():
+                if period not in groups:
+                    self._drop(period, factor_name)
+        for period, rows in groups.items():
+            if not os.path.exists(self._path(period)):
+                raise KeyError(f"因子库分区 {period} 尚未建立键，请先调用 sync_keys")
+            with self._locked(period):
+                keys, columns, computed = self._load(period)
+                index = self._keys(period)[1]
+                positions = index.get_indexer(pd.MultiIndex.from_frame(keys_in.iloc[rows]))
+                found = positions >= 0
+                if not found.all():
+                    logger.warning(f"{factor_name}: {int((~found).sum())} 行不在因子库分区 {period} 的键中，已忽略。")
+
+                values = columns.get(factor_name) if append else None
+                values = np.full(len(keys), np.nan) if values is None else values
+                values[positions[found]] = df[factor_name].to_numpy(dtype=float)[rows][found]
+                columns[factor_name] = values
+                computed[factor_name] = len(keys)
+                self._save(period, keys, columns, computed)
+
+    def _drop(self, period, factor_name):
+        if factor_name not in pq.read_schema(self._path(period)).names:
+            return
+        with self._locked(period):
+            keys, columns, rows = self._load(period)
+            if columns.pop(factor_name, None) is not None:
+                rows.pop(factor_name, None)
+                self._save(period, keys, columns, rows)
+
+    def delete(self, factor_name):
+        for period in self.partitions():
+            self._drop(period, factor_name)
+
+    # --- 读取 ---
+    def _factors_in(self, period):
+        return [name for name in pq.read_schema(self._path(period)).names if name not in KEY_COLUMNS]
+
+    def factors(self):
+        names = set()
+        for period in self.partitions():
+            names.update(self._factors_in(period))
+        return sorted(names)
+
+    def __contains__(self, factor_name):
+        return any(factor_name in self._factors_in(p) for p in self.partitions())
+
+    def last_date(self, factor_name):
+        """因子已计算到的最后一个交易日"""
+        for period in reversed(self.partitions()):
+            keys, _, rows = self._keys(period)
+            length = rows.get(factor_name, 0)
+            if length:
+                return keys['TradingDay'].iloc[length - 1]
+        return None
+
+    def read(self, factors=None, start=None, end=None):
+        """
+        读取多个因子为一张宽表 ['SecuCode', 'TradingDay', *factors]
+        每个分区一次列投影扫描，日期范围下推到行组过滤
+        """
+        factors = list(factors) if factors is not None else self.factors()
+        filters = []
+        if start is not None:
+            filters.append(('TradingDay', '>=', _as_datetime([start])[0]))
+        if end is not None:
+            filters.append(('TradingDay', '<=', _as_datetime([end])[0]))
+        frames = []
+        for period in self.partitions(start, end):
+            schema = pq.read_schema(self._path(period))
+            present = set(schema.names) - set(KEY_COLUMNS)
+            columns = KEY_COLUMNS + [name for name in factors if name in present]
+            # 日期以非时间戳类型存储时无法下推，读出后再过滤
+            pushdown = pa.types.is_timestamp(schema.field('TradingDay').type)
+            part = pq.read_table(self._path(period), columns=columns,
+                                 filters=(filters or None) if pushdown else None).to_pandas()
+            if filters and not pushdown:
+                dates = _as_datetime(part['TradingDay'])
+                keep = np.ones(len(part), dtype=bool)
+                for _, op, bound in filters:
+                    keep &= (dates >= bound if op == '>=' else dates <= bound).to_numpy()
+                part = part[keep].reset_index(drop=True)
+            for name in factors:
+                if name not in present:
+                    part[name] = np.nan
+            frames.append(part)
+        if not frames:
+            return pd.DataFrame(columns=['SecuCode', 'TradingDay'] + factors)
+        return pd.concat(frames, ignore_index=True)[['SecuCode', 'TradingDay'] + factors]
+
+
+# ===========================
+# 因子输出读写入口 (按 settings.FACTOR_STORE_ENABLED 选择 分区因子库 或 每因子一个 parquet)
+# ===========================
+_STORES = {}
+
+
+def get_factor_store(factor_dir):
+    """同一目录共享一个 FactorStore (复用分区键缓存)"""
+    root = os.path.abspath(factor_dir)
+    if root not in _STORES:
+        _STORES[root] = FactorStore(root)
+    return _STORES[root]
+
+
+def _legacy_path(factor_dir, factor_name):
+    return os.path.join(factor_dir, f"{factor_name}.parquet")
+
+
+def write_factor(factor_dir, df, factor_name, append=False):
+    if settings.FACTOR_STORE_ENABLED:
+        get_factor_store(factor_dir).write(df, factor_name, append=append)
+        return
+    path = _legacy_path(factor_dir, factor_name)
+    if append and os.path.exists(path):
+        # parquet 不支持原地追加: 合并后写入临时文件再原子替换
+        df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+    _atomic_write(df, path)
+
+
+def list_factors(factor_dir):
+    if settings.FACTOR_STORE_ENABLED:
+        return get_factor_store(factor_dir).factors()
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(factor_dir) if f.endswith(".parquet"))
+
+
+def read_factors(factor_dir, factor_names):
+    """读取多个因子为 ['SecuCode', 'TradingDay', *factor_names] 宽表"""
+    if settings.FACTOR_STORE_ENABLED:
+        return get_factor_store(factor_dir).read(factor_names)
+    merged = None
+    for name in factor_names:
+        df = pd.read_parquet(_legacy_path(factor_dir, name))
+        merged = df if merged is None else merged.merge(df, on=['SecuCode', 'TradingDay'], how='outer')
+    return merged
+
+
+def remove_factor(factor_dir, factor_name):
+    if settings.FACTOR_STORE_ENABLED:
+        get_factor_store(factor_dir).delete(factor_name)
+    elif os.path.exists(_legacy_path(factor_dir, factor_name)):
+        os.remove(_legacy_path(factor_dir, factor_name))
+
+
+def factor_last_date(factor_dir, factor_name):
+    """因子输出覆盖到的最后一个交易日，不存在时返回 None"""
+    if settings.FACTOR_STORE_ENABLED:
+        return get_factor_store(factor_dir).last_date(factor_name)
+    path = _legacy_path(factor_dir, factor_name)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, columns=['TradingDay'])['TradingDay'].max()
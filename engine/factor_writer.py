@@ -0,0 +1,122 @@
+# engine/factor_writer.py
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from data_loader.compact import restore_keys
+from engine.factor_store import write_factor
+from utils.logger import logger
+
+
+class AsyncFactorWriter:
+    """
+    后台因子写入: 执行成功的结果交给单个写线程 (按提交顺序写入)，键还原与 parquet 写盘不占用执行阶段。
+    排队中的结果总内存超过上限时 submit 阻塞 (背压)，内存始终有界；
+    写入结果通过 wait / flush 取回，失败的写入照常进入挖掘记录。
+    """
+
+    def __init__(self, max_pending_mb=None):
+        """
+        :param max_pending_mb: 排队结果的内存上限，默认取 settings.ASYNC_WRITE_MAX_PENDING_MB
+        """
+        max_pending_mb = settings.ASYNC_WRITE_MAX_PENDING_MB if max_pending_mb is None else max_pending_mb
+        self.max_pending_bytes = max_pending_mb * 1024 * 1024
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="factor_writer")
+        self._cond = threading.Condition()
+        self._pending_bytes = 0
+        # (目录, 因子名) -> 最近一次写入的 Future
+        self._futures = {}
+
+    @staticmethod
+    def _key(factor_dir, factor_name):
+        return os.path.abspath(factor_dir), factor_name
+
+    def submit(self, factor_dir, df, factor_name, append=False):
+        """
+        提交写入 (df 的键可以是紧凑类型，在写线程中还原)
+        :return: Future，结果为 None，写入失败时抛出原异常
+        """
+        nbytes = int(df.memory_usage(index=False).sum())
+        with self._cond:
+            # 单个结果超过上限时只等到队列清空，不会永久阻塞
+            while self._pending_bytes and self._pending_bytes + nbytes > self.max_pending_bytes:
+                self._cond.wait()
+            self._pending_bytes += nbytes
+            future = self._pool.submit(self._write, factor_dir, df, factor_name, append, nbytes)
+            self._futures[self._key(factor_dir, factor_name)] = future
+        return future
+
+    def _write(self, factor_dir, df, factor_name, append, nbytes):
+        try:
+            write_factor(factor_dir, restore_keys(df), factor_name, append=append)
+        finally:
+            with self._cond:
+                self._pending_bytes -= nbytes
+                self._cond.notify_all()
+
+    def wait(self, factor_dir, factor_name):
+        """
+        等待该因子最近一次提交的写入完成
+        Returns:
+            (bool is_success, str message)，没有提交过写入时视为成功
+        """
+        with self._cond:
+            future = self._futures.get(self._key(factor_dir, factor_name))
+        if future is None:
+            return True, "Success"
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"因子 {factor_name} 写入失败: {e}")
+            return False, "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        finally:
+            with self._cond:
+                if self._futures.get(self._key(factor_dir, factor_name)) is future:
+                    del self._futures[self._key(factor_dir, factor_name)]
+        return True, "Success"
+
+    def flush(self):
+        """
+        等待所有已提交的写入完成
+        Returns:
+            {因子名: 错误信息}，只包含写入失败的因子
+        """
+        with self._cond:
+            keys = list(self._futures)
+        failures = {}
+        for factor_dir, factor_name in keys:
+            success, message = self.wait(factor_dir, factor_name)
+            if not success:
+                failures[factor_name] = message
+        return failures
+
+    @property
+    def pending_mb(self):
+        with self._cond:
+            return self._pending_bytes / 1024 / 1024
+
+    def close(self):
+        failures = self.flush()
+        self._pool.shutdown(wait=True)
+        return failures
+
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_factor_writer():
+    """进程内共享一个后台写入器 (共用同一内存上限)"""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = AsyncFactorWriter()
+        return _WRITER
+
+
+def flush_factor_writes():
+    """等待进程内所有后台写入完成 (未创建写入器时直接返回)，返回 {因子名: 错误信息}"""
+    with _WRITER_LOCK:
+        writer = _WRITER
+    return writer.flush() if writer is not None else {}
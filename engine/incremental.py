@@ -0,0 +1,224 @@
+# engine/incremental.py
+import ast
+import os
+import numpy as np
+import pandas as pd
+from config import settings
+from data_loader.compact import decode_dates
+from data_loader.derived import field_lookback
+from engine.code_manager import CodeManager
+from engine.dsl_evaluator import DSLParseError, formula_lookback, parse_formula
+from engine.executor import Executor
+from engine.factor_store import factor_last_date, get_factor_store, list_factors, write_factor
+from utils.logger import logger
+
+# 窗口类方法 -> 窗口参数的关键字名
+_WINDOW_KWARGS = {
+    "rolling": "window", "shift": "periods", "diff": "periods", "pct_change": "periods",
+}
+# ewm 权重无限衰减，按 EWM_WARMUP 倍 span 预热 (剩余权重 < 0.1%)
+_EWM_KWARGS = ("span", "com", "halflife")
+EWM_WARMUP = 4
+# engine.ts_ops 算子 -> 窗口参数 d 的位置
+_TS_OPS_WINDOW_ARG = {
+    "ts_min": 1, "ts_max": 1, "ts_argmin": 1, "ts_argmax": 1, "ts_rank": 1, "decay_linear": 1,
+    "correlation": 2, "covariance": 2,
+}
+
+
+def _int_constants(tree):
+    """收集形如 `d = 20` 的整数常量赋值 (同名多次赋值取最大值)"""
+    constants = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and type(node.value.value) is int:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    constants[target.id] = max(constants.get(target.id, 0), node.value.value)
+    return constants
+
+
+def _window_value(node, constants):
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return abs(node.value)
+    if isinstance(node, ast.Name) and node.id in constants:
+        return abs(constants[node.id])
+    return None
+
+
+def _ts_op_name(func):
+    """ts_rank(...) / ts_ops.ts_rank(...) 形式的算子库调用，返回算子名"""
+    if isinstance(func, ast.Name):
+        name = func.id
+    elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "ts_ops":
+        name = func.attr
+    else:
+        return None
+    return name if name in _TS_OPS_WINDOW_ARG else None
+
+
+def infer_code_lookback(code_string):
+    """
+    从因子代码推断需要的历史交易日数
+    优先级: 模块级 LOOKBACK 声明 > DSL 公式 (FACTOR_FORMULA) 精确计算 > 累加代码中所有窗口参数与派生字段的回看 (保守上界)
+    Returns:
+        int，无法确定时 (expanding / 变量窗口) 返回 None，表示需要全部历史
+    """
+    tree = ast.parse(code_string)
+    constants = _int_constants(tree)
+    module_values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    module_values[target.id] = node.value.value
+
+    if isinstance(module_values.get("LOOKBACK"), int):
+        return module_values["LOOKBACK"]
+    if isinstance(module_values.get("FACTOR_FORMULA"), str):
+        try:
+            return formula_lookback(parse_formula(module_values["FACTOR_FORMULA"]))
+        except DSLParseError:
+            pass
+
+    total = 0
+    for node in ast.walk(tree):
+        # 预计算的派生字段自带回看: df_raw['adv20'] 为 19 天，df_raw['idx_HS300_ret'] 为 1 天
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            total += field_lookback(node.value)
+            continue
+        if not isinstance(node, ast.Call):
+            continue
+        keywords = {kw.arg: kw.value for kw in node.keywords}
+        op_name = _ts_op_name(node.func)
+        if op_name is not None:
+            position = _TS_OPS_WINDOW_ARG[op_name]
+            arg = node.args[position] if len(node.args) > position else keywords.get("d")
+            value = _window_value(arg, constants) if arg is not None else None
+            if value is None:
+                return None
+            total += value
+            continue
+        if not isinstance(node.func, ast.Attribute):
+            continue
+        method = node.func.attr
+        if method == "expanding":
+            return None
+        if method in _WINDOW_KWARGS:
+            arg = node.args[0] if node.args else keywords.get(_WINDOW_KWARGS[method])
+            if arg is None:
+                # shift() / diff() / pct_change() 默认 1 期
+                total += 0 if method == "rolling" else 1
+                continue
+            value = _window_value(arg, constants)
+            if value is None:
+                return None
+            total += value
+        elif method == "ewm":
+            arg = next((keywords[k] for k in _EWM_KWARGS if k in keywords), None)
+            value = _window_value(arg, constants) if arg is not None else None
+            if value is None:
+                return None
+            total += EWM_WARMUP * value
+    return total
+
+
+class IncrementalUpdater:
+    """
+    增量更新已保存的因子: 对 codes/ 中每个因子，只在 [最大回看窗口 + 新交易日] 的数据切片上重新计算，
+    再把新交易日的行追加到 factors/ 中的因子输出。
+    """
+
+    def __init__(self, data_bundle, code_dir, factor_dir, margin=None, overrides=None):
+        """
+        :param margin: 回看窗口之外额外预热的交易日数 (覆盖停牌造成的缺口)，默认取 settings.INCREMENTAL_LOOKBACK_MARGIN
+        :param overrides: {因子名: 回看交易日数}，优先于自动推断，默认取 settings.INCREMENTAL_LOOKBACK_OVERRIDES
+        """
+        self.data_bundle = data_bundle
+        self.code_dir = code_dir
+        self.factor_dir = factor_dir
+        self.margin = settings.INCREMENTAL_LOOKBACK_MARGIN if margin is None else margin
+        self.overrides = settings.INCREMENTAL_LOOKBACK_OVERRIDES if overrides is None else overrides
+
+        # 行情数据中的日期键 (紧凑档位为 int32) 用于切片；还原后的日期与因子库 / 因子输出比较
+        self._day_keys = np.sort(np.asarray(pd.unique(data_bundle['stock']['TradingDay'])))
+        self.trading_days = pd.Index(decode_dates(self._day_keys))
+        if settings.FACTOR_STORE_ENABLED:
+            # 新交易日的键追加到分区末尾，已有因子列无需改动
+            get_factor_store(factor_dir).sync_keys(data_bundle['stock'])
+        # 相同起点的切片共用一个 Executor (及其只读数据)
+        self._executors = {}
+
+    def _executor_from(self, start_day):
+        if start_day not in self._executors:
+            bundle = {}
+            for key in ('stock', 'index'):
+                df = self.data_bundle.get(key)
+                if df is not None and start_day is not None:
+                    df = df[df['TradingDay'] >= start_day].reset_index(drop=True)
+                bundle[key] = df
+            self._executors[start_day] = Executor(bundle, smoke_test=False, async_write=False)
+        return self._executors[start_day]
+
+    def lookback(self, factor_name, code_string):
+        if factor_name in self.overrides:
+            return self.overrides[factor_name]
+        return infer_code_lookback(code_string)
+
+    def update_factor(self, factor_name):
+        """
+        Returns:
+            (status, message)，status 为 'Updated' / 'UpToDate' / 'Fail'
+        """
+        code_path = os.path.join(self.code_dir, f"{factor_name}.py")
+        last_day = factor_last_date(self.factor_dir, factor_name)
+        if last_day is None:
+            return "Fail", "因子输出为空"
+        new_days = self.trading_days[self.trading_days > last_day]
+        if len(new_days) == 0:
+            return "UpToDate", f"已是最新 ({last_day})"
+
+        with open(code_path, "r", encoding="utf-8") as f:
+            code_string = f.read()
+        lookback = self.lookback(factor_name, code_string)
+        if lookback is None:
+            logger.warning(f"{factor_name} 无法推断回看窗口，使用全部历史数据。")
+            start_day = None
+        else:
+            start = max(0, self.trading_days.get_loc(new_days[0]) - lookback - self.margin)
+            start_day = self._day_keys[start]
+
+        # factor_name 为文件名 (可能带 _vN 后缀)，函数名由 CodeManager 按记录的 FACTOR_FUNCTION 查找
+        func = CodeManager.load_function(code_path, factor_name)
+        if func is None:
+            return "Fail", f"无法加载 {code_path}"
+
+        df_new, message = self._executor_from(start_day).compute(func, factor_name)
+        if df_new is None:
+            return "Fail", message
+        df_new = df_new[df_new['TradingDay'].isin(new_days)]
+        write_factor(self.factor_dir, df_new, factor_name, append=True)
+        return "Updated", f"追加 {len(new_days)} 个交易日 / {len(df_new)} 行 (回看 {lookback} 日)"
+
+    def update_all(self):
+        """
+        更新 code_dir 中所有已有输出的因子
+        Returns:
+            {status: [factor_name, ...]}
+        """
+        stored = set(list_factors(self.factor_dir))
+        factor_names = sorted(
+            os.path.splitext(name)[0] for name in os.listdir(self.code_dir)
+            if name.endswith(".py") and os.path.splitext(name)[0] in stored
+        )
+        logger.info(f"即将增量更新 {len(factor_names)} 个因子，最新交易日: {self.trading_days[-1]}")
+
+        summary = {}
+        for i, factor_name in enumerate(factor_names):
+            try:
+                status, message = self.update_factor(factor_name)
+            except Exception as e:
+                status, message = "Fail", str(e)
+            summary.setdefault(status, []).append(factor_name)
+            log = logger.error if status == "Fail" else logger.info
+            log(f"[{i + 1}/{len(factor_names)}] {factor_name}: {status} - {message}")
+        return summary
@@ -1,70 +1,166 @@
 # engine/metadata_recorder.py
-import csv
 import os
+import sqlite3
+import threading
+import time
 import pandas as pd
 from datetime import datetime
+from config import settings
+from engine.profiler import PROFILE_FIELDS
 from utils.logger import logger
-from datetime import datetime
+
+# 记录字段 -> (CSV 列名, SQLite 类型)
+COLUMNS = {
+    "timestamp": ("Timestamp", "TEXT"),
+    "provider": ("Provider", "TEXT"),
+    "seed_idea": ("Seed_Idea", "TEXT"),
+    "factor_name": ("Factor_Name", "TEXT"),
+    "status": ("Status", "TEXT"),
+    "code_path": ("Code_Path", "TEXT"),
+    "formula": ("Formula", "TEXT"),
+    "description": ("Description", "TEXT"),
+    # 资源画像 (见 engine/profiler.py)
+    "ideation_sec": ("Ideation_Sec", "REAL"),
+    "codegen_sec": ("CodeGen_Sec", "REAL"),
+    "refinement_sec": ("Refinement_Sec", "REAL"),
+    "exec_wall_sec": ("Exec_Wall_Sec", "REAL"),
+    "exec_cpu_sec": ("Exec_CPU_Sec", "REAL"),
+    "peak_rss_mb": ("Peak_RSS_MB", "REAL"),
+    "rss_delta_mb": ("RSS_Delta_MB", "REAL"),
+    "alloc_peak_mb": ("Alloc_Peak_MB", "REAL"),
+}
+INDEXED_COLUMNS = ["run_id", "provider", "seed_idea", "status", "factor_name"]
+
 
 class MetadataRecorder:
-    def __init__(self, filepath=None):
+    """
+    基于 SQLite (WAL) 的挖掘记录表。
+    所有运行共用一个数据库，记录先进入内存缓冲区，按批次在单个事务中写入；
+    多个线程 / 多个进程可同时写入，按 provider / seed / status / factor_name 的历史查询走索引。
+    运行结束时导出本次运行的 CSV，兼容原有的 factor_records_*.csv。
+    """
+
+    def __init__(self, filepath=None, db_path=None, batch_size=None, flush_interval=None):
         """
         初始化记录器
-        :param filepath: CSV 文件的保存路径。如果为 None，则使用默认路径。
+        :param filepath: 本次运行导出的 CSV 路径。如果为 None，则使用默认路径。
+        :param db_path: SQLite 数据库路径，默认与 CSV 同目录的 factor_records.sqlite
+        :param batch_size: 缓冲区达到该条数时写入，默认取 settings.RECORDER_BATCH_SIZE
+        :param flush_interval: 距上次写入超过该秒数时写入，默认取 settings.RECORDER_FLUSH_SEC
         """
         if filepath:
             self.filepath = filepath
         else:
             # 默认回退路径（防止 main.py 没传参时报错）
             self.filepath = "output/factor_records.csv"
-            
+
         # 自动创建父目录
-        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-        
-        # 初始化 CSV 文件头（如果文件不存在）
-        self._init_csv()
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+
+        self.db_path = db_path or os.path.join(os.path.dirname(self.filepath), "factor_records.sqlite")
+        self.run_id = os.path.splitext(os.path.basename(self.filepath))[0]
+        self.batch_size = batch_size or settings.RECORDER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.RECORDER_FLUSH_SEC
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._init_db()
 
-    def _init_csv(self):
-        """如果不文件存在，写入表头"""
-        if not os.path.exists(self.filepath):
+    def _init_db(self):
+        """建表、补齐新增字段、建立索引"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL)"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+            for name, (_, sql_type) in COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE records ADD COLUMN {name} {sql_type}")
+            for name in INDEXED_COLUMNS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_records_{name} ON records ({name})")
+            self._conn.commit()
+
+    def add_record(self, provider, seed_idea, factor_name, formula, description, status, code_path, profile=None):
+        """
+        追加一条记录 (进入缓冲区，按批次写入)
+        :param profile: FactorProfile.as_record() 的资源字段，缺失的字段记为空
+        """
+        record = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "provider": provider,
+            "seed_idea": seed_idea,
+            "factor_name": factor_name,
+            "status": status,
+            "code_path": code_path,
+            "formula": formula,
+            "description": description,
+        }
+        record.update({name: (profile or {}).get(name) for name in PROFILE_FIELDS})
+        with self._lock:
+            self._buffer.append(record)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        logger.info(f"已记录因子状态: {status}")
+        if due:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的记录在一个事务中写入数据库"""
+        with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            names = ["run_id"] + list(COLUMNS)
             try:
-                columns = [
-                    "Timestamp", 
-                    "Provider", 
-                    "Seed_Idea", 
-                    "Factor_Name", 
-                    "Status", 
-                    "Code_Path", 
-                    "Formula", 
-                    "Description"
-                ]
-                df = pd.DataFrame(columns=columns)
-                df.to_csv(self.filepath, index=False, encoding="utf-8-sig")
+                with self._conn:
+                    self._conn.executemany(
+                        f"INSERT INTO records ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                        [[self.run_id] + [row[name] for name in COLUMNS] for row in rows]
+                    )
             except Exception as e:
-                logger.error(f"初始化 CSV 记录表失败: {e}")
+                # 写入失败时放回缓冲区，下次再试
+                self._buffer = rows + self._buffer
+                logger.error(f"写入记录数据库失败: {e}")
 
-    def add_record(self, provider, seed_idea, factor_name, formula, description, status, code_path):
+    def query(self, run_id=None, **filters):
         """
-        追加一条记录
+        查询历史记录，例如 query(seed_idea="动量", status="Success")
+        :param filters: 字段名 -> 取值，字段名见 COLUMNS
         """
+        self.flush()
+        conditions, params = [], []
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        for name, value in filters.items():
+            if name not in COLUMNS:
+                raise ValueError(f"未知字段: {name}")
+            conditions.append(f"{name} = ?")
+            params.append(value)
+        sql = "SELECT * FROM records"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY id", self._conn, params=params)
+
+    def export_csv(self, path=None, run_id=None):
+        """导出某次运行 (默认本次) 的记录为原有格式的 CSV"""
+        records = self.query(run_id=run_id or self.run_id)
+        df = records[list(COLUMNS)].rename(columns={name: csv for name, (csv, _) in COLUMNS.items()})
+        df.to_csv(path or self.filepath, index=False, encoding="utf-8-sig")
+        return path or self.filepath
+
+    def close(self):
+        """写入剩余记录并导出本次运行的 CSV"""
+        self.flush()
         try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            new_row = {
-                "Timestamp": timestamp,
-                "Provider": provider,
-                "Seed_Idea": seed_idea,
-                "Factor_Name": factor_name,
-                "Status": status,
-                "Code_Path": code_path,
-                "Formula": formula,
-                "Description": description
-            }
-            
-            # 使用 pandas 追加模式 (mode='a')
-            df = pd.DataFrame([new_row])
-            df.to_csv(self.filepath, mode='a', header=False, index=False, encoding="utf-8-sig")
-            logger.info(f"已记录因子状态: {status}")
-            
+            self.export_csv()
         except Exception as e:
-            logger.error(f"写入 CSV 记录失败: {e}")
\ No newline at end of file
+            logger.error(f"导出 CSV 记录失败: {e}")
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,180 @@
+# engine/parallel_executor.py
+import multiprocessing
+import sys
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from engine.code_manager import CodeManager
+from engine.executor import Executor
+from utils.logger import logger
+
+# 可直接放入共享内存的 NumPy 类型 (数值 / 布尔 / 日期)
+_SHAREABLE_KINDS = "biufcmM"
+
+
+def _attach_segment(name):
+    """子进程挂载共享内存段，由主进程负责释放"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # spawn 出的子进程与主进程共用同一个 resource_tracker，重复注册不会导致提前释放
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedDataBundle:
+    """
+    把 data_bundle 中的 stock / index 表按列放入共享内存，
+    所有工作进程零拷贝挂载同一份数据。
+    字符串列 (如 SecuCode) 以整数编码 + 取值表的形式共享，在子进程中还原；分类列直接共享其编码。
+    """
+
+    def __init__(self, data_bundle):
+        self._segments = []
+        self.nbytes = 0
+        self.spec = {}
+        for key in ('stock', 'index'):
+            df = data_bundle.get(key)
+            self.spec[key] = self._share_frame(df) if df is not None else None
+
+    def _new_segment(self, array):
+        segment = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1), name=f"qfa_{uuid.uuid4().hex[:16]}"
+        )
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+        self._segments.append(segment)
+        self.nbytes += segment.size
+        return segment.name
+
+    def _share_frame(self, df):
+        columns = []
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in _SHAREABLE_KINDS:
+                array = series.to_numpy()
+                columns.append((col, "array", self._new_segment(array), array.dtype.str, len(array)))
+            elif isinstance(series.dtype, pd.CategoricalDtype):
+                # 分类列 (紧凑档位的 SecuCode) 直接共享编码数组
+                codes = series.cat.codes.to_numpy()
+                columns.append((col, "category", self._new_segment(codes), (series.cat.categories, codes.dtype.str),
+                                len(codes)))
+            else:
+                codes, uniques = pd.factorize(series)
+                codes = codes.astype(np.int32)
+                columns.append((col, "codes", self._new_segment(codes), (uniques, str(series.dtype)), len(codes)))
+        return columns
+
+    def close(self):
+        for segment in self._segments:
+            try:
+                segment.close()
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments = []
+
+
+def attach_frame(columns):
+    """
+    在子进程中依据 spec 重建 DataFrame
+    Returns:
+        (DataFrame, 需要保持引用的共享内存段列表)
+    """
+    if columns is None:
+        return None, []
+    data = {}
+    segments = []
+    for col, kind, name, meta, length in columns:
+        segment = _attach_segment(name)
+        segments.append(segment)
+        if kind == "array":
+            data[col] = np.ndarray((length,), dtype=np.dtype(meta), buffer=segment.buf)
+        elif kind == "category":
+            categories, dtype = meta
+            codes = np.ndarray((length,), dtype=np.dtype(dtype), buffer=segment.buf)
+            data[col] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            uniques, dtype = meta
+            codes = np.ndarray((length,), dtype=np.int32, buffer=segment.buf)
+            data[col] = pd.Series(pd.Categorical.from_codes(codes, categories=uniques)).astype(dtype)
+    return pd.DataFrame(data, copy=False), segments
+
+
+# ===========================
+# 工作进程
+# ===========================
+_WORKER_STATE = {}
+
+
+def _init_worker(spec):
+    df_stock, stock_segments = attach_frame(spec['stock'])
+    df_index, index_segments = attach_frame(spec['index'])
+    _WORKER_STATE['segments'] = stock_segments + index_segments
+    # 工作进程本身与主进程并行，结果在进程内同步写入后再回报
+    _WORKER_STATE['executor'] = Executor({"stock": df_stock, "index": df_index}, isolation="readonly", async_write=False)
+
+
+def _run_factor_source(code_string, func_name, factor_name, output_dir):
+    """Returns: (success, message, 资源消耗字典)"""
+    func = CodeManager.load_source(code_string, func_name, factor_name)
+    if func is None:
+        return False, f"Worker could not load function '{func_name}' for {factor_name}", {}
+    profile = {}
+    success, message = _WORKER_STATE['executor'].run(func, factor_name, output_dir, profile=profile)
+    return success, message, profile
+
+
+def _run_formula(factor_formula, factor_name, output_dir):
+    profile = {}
+    success, message = _WORKER_STATE['executor'].run_formula(factor_formula, factor_name, output_dir, profile=profile)
+    return success, message, profile
+
+
+class ParallelExecutor:
+    """
+    多进程执行后端，与 Executor 接口一致 (run / run_formula)。
+    数据只加载一次到共享内存，多个因子函数在工作进程中同时计算；
+    调用方在各自线程中阻塞等待结果，原有的重试/修复逻辑无需改动。
+    """
+
+    def __init__(self, data_bundle, num_workers):
+        self.num_workers = num_workers
+        logger.info(f"正在把数据放入共享内存，启动 {num_workers} 个工作进程...")
+        self.shared = SharedDataBundle(data_bundle)
+        self.pool = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.shared.spec,)
+        )
+
+    def _submit(self, fn, *args, profile=None):
+        try:
+            success, message, measured = self.pool.submit(fn, *args).result()
+        except Exception as e:
+            logger.error(f"工作进程执行异常: {e}")
+            return False, traceback.format_exc()
+        if profile is not None:
+            profile.update(measured)
+        return success, message
+
+    def run(self, factor_func, factor_name, output_dir, profile=None):
+        """
+        在工作进程中执行因子函数
+        函数由 CodeManager 在内存中加载，子进程按源码重新编译，避免序列化函数对象
+        """
+        logger.info(f"正在提交函数到工作进程: {factor_name} ...")
+        code_string = CodeManager.source_of(factor_func)
+        return self._submit(_run_factor_source, code_string, factor_func.__name__, factor_name, output_dir,
+                            profile=profile)
+
+    def run_formula(self, factor_formula, factor_name, output_dir, profile=None):
+        logger.info(f"正在提交公式到工作进程: {factor_name} ...")
+        return self._submit(_run_formula, factor_formula, factor_name, output_dir, profile=profile)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+        self.shared.close()
@@ -0,0 +1,154 @@
+# engine/pipeline.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from engine.profiler import FactorProfile
+from utils.logger import logger
+
+_STOP = object()
+
+
+class _GatedExecutor:
+    """限制同时执行的因子数量；执行阶段与 LLM 网络阶段互不阻塞"""
+
+    def __init__(self, executor, concurrency):
+        self._executor = executor
+        self._gate = threading.BoundedSemaphore(concurrency)
+
+    def run(self, *args, **kwargs):
+        with self._gate:
+            return self._executor.run(*args, **kwargs)
+
+    def run_formula(self, *args, **kwargs):
+        with self._gate:
+            return self._executor.run_formula(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._executor, name)
+
+
+class _QueuedRecorder:
+    """把工作线程中的 add_record 调用转交给事件循环中的记录阶段 (有界队列提供背压)"""
+
+    def __init__(self, recorder, queue, loop):
+        self._recorder = recorder
+        self._queue = queue
+        self._loop = loop
+
+    def add_record(self, *args, **kwargs):
+        asyncio.run_coroutine_threadsafe(self._queue.put((args, kwargs)), self._loop).result()
+
+    def __getattr__(self, name):
+        return getattr(self._recorder, name)
+
+
+class AsyncMiningPipeline:
+    """
+    异步流水线: 构思 -> 编码/执行 -> 记录，各阶段之间用有界队列衔接。
+    因子 A 执行时，因子 B 的代码生成与种子 C 的构思同时进行，
+    吞吐量取决于最慢的阶段，而不是各阶段耗时之和。
+    """
+
+    def __init__(self, llm_ideation, process_idea, executor, recorder,
+                 ideation_concurrency=1, coding_concurrency=4, execution_concurrency=1, queue_size=16, journal=None):
+        """
+        :param llm_ideation: 构思模型实例
+        :param process_idea: 处理单个因子的函数，签名为 (idea_dict, seed_idea, executor, recorder, checkpoint, profile)，在工作线程中调用
+        :param executor: Executor / ParallelExecutor
+        :param recorder: MetadataRecorder
+        :param journal: RunJournal，复用已有构思结果并跳过已完成的变体，为 None 时不记录断点
+        """
+        self.llm_ideation = llm_ideation
+        self.process_idea = process_idea
+        self.executor = executor
+        self.recorder = recorder
+        self.journal = journal
+        self.ideation_concurrency = ideation_concurrency
+        self.coding_concurrency = coding_concurrency
+        self.execution_concurrency = execution_concurrency
+        self.queue_size = queue_size
+
+    async def _ideation_worker(self, seed_queue, idea_queue):
+        while True:
+            task = await seed_queue.get()
+            if task is _STOP:
+                return
+            index, total, base_idea, num = task
+            logger.info(f"\n====== [任务 {index}/{total}] 种子: {base_idea} ======")
+            started = time.perf_counter()
+            try:
+                if self.journal is not None:
+                    ideas = await asyncio.to_thread(self.journal.ideation, self.llm_ideation, base_idea, num)
+                else:
+                    ideas = await asyncio.to_thread(self.llm_ideation.ideation, base_idea, num)
+            except Exception as e:
+                logger.error(f"构思阶段发生异常: {e}")
+                ideas = None
+
+            if not ideas:
+                logger.error("构思阶段未返回有效结果。")
+                continue
+            logger.info(f"构思完成: 生成 {len(ideas)} 个因子变体。")
+            # 构思耗时按变体数均摊
+            ideation_sec = (time.perf_counter() - started) / len(ideas)
+            pending = self.journal.pending(base_idea, ideas) if self.journal is not None else enumerate(ideas)
+            for j, idea in pending:
+                await idea_queue.put((base_idea, j, idea, ideation_sec))
+
+    async def _factor_worker(self, idea_queue, executor, recorder):
+        while True:
+            item = await idea_queue.get()
+            if item is _STOP:
+                return
+            base_idea, j, idea, ideation_sec = item
+            checkpoint = self.journal.checkpoint(base_idea, j) if self.journal is not None else None
+            try:
+                await asyncio.to_thread(self.process_idea, idea, base_idea, executor, recorder, checkpoint,
+                                        FactorProfile(ideation_sec))
+            except Exception as e:
+                logger.error(f"处理因子时发生异常: {e}")
+
+    async def _record_worker(self, record_queue):
+        while True:
+            item = await record_queue.get()
+            if item is _STOP:
+                return
+            args, kwargs = item
+            try:
+                await asyncio.to_thread(self.recorder.add_record, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"记录阶段发生异常: {e}")
+
+    async def run(self, tasks, default_num_variations):
+        loop = asyncio.get_running_loop()
+        # 阻塞式的 LLM 调用与记录都在线程中进行，线程数需覆盖所有并发阶段
+        loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=self.ideation_concurrency + self.coding_concurrency + 1
+        ))
+        seed_queue = asyncio.Queue()
+        idea_queue = asyncio.Queue(maxsize=self.queue_size)
+        record_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        executor = _GatedExecutor(self.executor, self.execution_concurrency)
+        recorder = _QueuedRecorder(self.recorder, record_queue, loop)
+
+        valid_tasks = [t for t in tasks if t.get('idea')]
+        for i, task in enumerate(valid_tasks):
+            seed_queue.put_nowait((i + 1, len(valid_tasks), task['idea'],
+                                   task.get('num_variations', default_num_variations)))
+        for _ in range(self.ideation_concurrency):
+            seed_queue.put_nowait(_STOP)
+
+        record_task = asyncio.create_task(self._record_worker(record_queue))
+        factor_tasks = [asyncio.create_task(self._factor_worker(idea_queue, executor, recorder))
+                        for _ in range(self.coding_concurrency)]
+        ideation_tasks = [asyncio.create_task(self._ideation_worker(seed_queue, idea_queue))
+                          for _ in range(self.ideation_concurrency)]
+
+        await asyncio.gather(*ideation_tasks)
+        for _ in factor_tasks:
+            await idea_queue.put(_STOP)
+        await asyncio.gather(*factor_tasks)
+        await record_queue.put(_STOP)
+        await record_task
@@ -0,0 +1,190 @@
+# engine/profiler.py
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import pandas as pd
+from contextlib import contextmanager
+from config import settings
+from utils.logger import logger
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# 记录表中的资源字段 (秒 / MB)
+PROFILE_FIELDS = [
+    "ideation_sec", "codegen_sec", "refinement_sec",
+    "exec_wall_sec", "exec_cpu_sec", "peak_rss_mb", "rss_delta_mb", "alloc_peak_mb",
+]
+LLM_STAGES = ("ideation", "codegen", "refinement")
+
+
+def peak_rss_mb():
+    """当前进程生命周期内的峰值常驻内存 (MB)，无法获取时返回 None；只在每个因子独占的进程 (沙箱子进程) 中代表单个因子"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / MB if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / MB
+    return None
+
+
+def current_rss_mb():
+    """当前进程的常驻内存 (MB)，无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / MB
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / MB
+    return None
+
+
+class _RssSampler(threading.Thread):
+    """在后台线程中按固定间隔采样当前常驻内存，记录最大值"""
+
+    def __init__(self, interval):
+        super().__init__(name="rss_sampler", daemon=True)
+        self.interval = interval
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak_mb:
+            self.peak_mb = rss
+
+    def stop(self):
+        """停止采样，返回执行期间常驻内存峰值相对开始时的增量 (MB)"""
+        self._stop_event.set()
+        self.join()
+        self._sample()
+        return self.peak_mb - self.start_mb
+
+
+@contextmanager
+def measure(profile):
+    """
+    测量一段执行的资源消耗，写入 profile 字典:
+        wall_sec       墙钟时间
+        cpu_sec        执行线程的 CPU 时间
+        rss_delta_mb   执行期间采样到的常驻内存峰值减去开始时的常驻内存
+                       (同一进程中并发执行的因子会互相计入)
+        alloc_peak_mb  执行期间 Python / numpy 分配内存的峰值
+                       (仅 PROFILE_TRACE_ALLOCATIONS 开启时；tracemalloc 为进程全局，同样包含其他线程的分配)
+    进程生命周期的峰值 peak_rss_mb 不在这里记录，只有沙箱子进程 (每个因子独占一个进程) 会回传
+    profile 为 None 时不做任何测量
+    """
+    if profile is None:
+        yield
+        return
+    # tracemalloc 为进程全局状态，同一进程中并发的测量只有先开始的一个统计分配量
+    trace = settings.PROFILE_TRACE_ALLOCATIONS and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    sampler = None
+    if current_rss_mb() is not None:
+        sampler = _RssSampler(settings.PROFILE_RSS_SAMPLE_SEC)
+        sampler.start()
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile["wall_sec"] = time.perf_counter() - wall_start
+        profile["cpu_sec"] = time.thread_time() - cpu_start
+        profile["rss_delta_mb"] = sampler.stop() if sampler is not None else None
+        profile["alloc_peak_mb"] = None
+        if trace:
+            profile["alloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / MB
+            tracemalloc.stop()
+
+
+class FactorProfile:
+    """
+    单个因子变体的资源画像: LLM 各阶段耗时 (构思耗时按变体数均摊) 与最后一次执行的资源消耗
+    """
+
+    def __init__(self, ideation_sec=0.0):
+        self.llm = dict.fromkeys(LLM_STAGES, 0.0)
+        self.llm["ideation"] = ideation_sec
+        self.last_execution = {}
+
+    @contextmanager
+    def stage(self, name):
+        """累计一次 LLM 调用的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.llm[name] += time.perf_counter() - start
+
+    def new_execution(self):
+        """返回供执行器填写的新字典 (传给 run / run_formula 的 profile 参数)"""
+        self.last_execution = {}
+        return self.last_execution
+
+    def as_record(self):
+        execution = self.last_execution
+        return {
+            "ideation_sec": self.llm["ideation"],
+            "codegen_sec": self.llm["codegen"],
+            "refinement_sec": self.llm["refinement"],
+            "exec_wall_sec": execution.get("wall_sec"),
+            "exec_cpu_sec": execution.get("cpu_sec"),
+            "peak_rss_mb": execution.get("peak_rss_mb"),
+            "rss_delta_mb": execution.get("rss_delta_mb"),
+            "alloc_peak_mb": execution.get("alloc_peak_mb"),
+        }
+
+
+def summarize_profiles(records, top=None):
+    """
+    汇总一次运行的资源消耗并在日志中列出最慢的因子
+    :param records: MetadataRecorder.query 返回的记录
+    :param top: 列出的因子数，默认取 settings.PROFILE_TOP_N
+    Returns:
+        执行耗时最长的 top 个因子 (DataFrame)
+    """
+    top = top or settings.PROFILE_TOP_N
+    if records.empty:
+        return records
+    records = records.astype({name: float for name in PROFILE_FIELDS})
+    totals = records[PROFILE_FIELDS[:5]].sum()
+    logger.info(
+        f"资源汇总 ({len(records)} 条记录): 构思 {totals['ideation_sec']:.0f}s / 编码 {totals['codegen_sec']:.0f}s / "
+        f"修复 {totals['refinement_sec']:.0f}s / 执行 {totals['exec_wall_sec']:.0f}s (CPU {totals['exec_cpu_sec']:.0f}s)"
+    )
+    slowest = records.dropna(subset=["exec_wall_sec"]).nlargest(top, "exec_wall_sec")
+    if not slowest.empty:
+        logger.info(f"执行最慢的 {len(slowest)} 个因子:")
+        for _, row in slowest.iterrows():
+            # 沙箱中执行的因子有独占进程的峰值 RSS，其余只有执行期间的 RSS 增量
+            if pd.notna(row['peak_rss_mb']):
+                rss = f"峰值 RSS {row['peak_rss_mb']:.0f} MB"
+            else:
+                rss = f"RSS 增量 {row['rss_delta_mb']:.0f} MB" if pd.notna(row['rss_delta_mb']) else "RSS N/A"
+            alloc = f"{row['alloc_peak_mb']:.0f} MB" if pd.notna(row['alloc_peak_mb']) else "N/A"
+            logger.info(
+                f"  {row['factor_name']} [{row['status']}]: 墙钟 {row['exec_wall_sec']:.1f}s / "
+                f"CPU {row['exec_cpu_sec']:.1f}s / {rss} / 峰值分配 {alloc}"
+            )
+    return slowest
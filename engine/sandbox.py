@@ -0,0 +1,179 @@
+# engine/sandbox.py
+import multiprocessing
+import signal
+import time
+import traceback
+from config import settings
+from engine.code_manager import CodeManager
+from engine.executor import Executor
+from engine.parallel_executor import SharedDataBundle, attach_frame
+from engine.profiler import peak_rss_mb
+from utils.logger import logger
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只依赖主进程侧的监控
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TIMEOUT_HINT = (
+    "Avoid rolling().apply / groupby().apply with Python lambdas and row-wise loops; "
+    "use vectorized pandas/numpy operations."
+)
+MEMORY_HINT = (
+    "Avoid merges or joins that multiply rows (e.g. joining on TradingDay only), "
+    "rolling().corr() and large intermediate copies."
+)
+
+
+def _apply_limits(cpu_seconds, address_space_bytes):
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    if address_space_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (address_space_bytes, address_space_bytes))
+
+
+def _sandbox_main(spec, code_string, func_name, factor_name, output_dir, cpu_seconds, address_space_bytes, conn):
+    """子进程入口: 施加资源限制 -> 挂载共享数据 -> 执行因子 -> 回传 (success, message, 资源消耗字典)"""
+    profile = {}
+    try:
+        _apply_limits(cpu_seconds, address_space_bytes)
+        df_stock, _stock_segments = attach_frame(spec['stock'])
+        df_index, _index_segments = attach_frame(spec['index'])
+        executor = Executor({"stock": df_stock, "index": df_index}, isolation="readonly", async_write=False)
+
+        func = CodeManager.load_source(code_string, func_name, factor_name)
+        if func is None:
+            result = (False, f"Sandbox could not load function '{func_name}' for {factor_name}")
+        else:
+            result = executor.run(func, factor_name, output_dir, profile=profile)
+            # 子进程只执行这一个因子，进程生命周期的峰值即该因子的峰值
+            profile["peak_rss_mb"] = peak_rss_mb()
+    except MemoryError:
+        result = (False, "MemoryError")
+    except Exception:
+        # 资源限制、挂载共享数据等环节的异常同样回传，供 code_refinement 参考
+        result = (False, traceback.format_exc())
+    conn.send(result + (profile,))
+    conn.close()
+
+
+class SandboxExecutor:
+    """
+    在独立子进程中执行 LLM 生成的因子函数，并限制 CPU 时间、墙钟时间与常驻内存。
+    超限时返回结构化的 "Timeout" / "MemoryExceeded" 失败信息，像普通错误一样进入 code_refinement。
+    DSL 公式由框架自身实现，仍在主进程中求值 (复用面板与子表达式缓存)。
+    """
+
+    def __init__(self, data_bundle, wall_time=None, cpu_time=None, max_rss_mb=None):
+        self.wall_time = wall_time or settings.SANDBOX_WALL_TIME_SEC
+        self.cpu_time = cpu_time or settings.SANDBOX_CPU_TIME_SEC
+        self.max_rss_mb = max_rss_mb or settings.SANDBOX_MAX_RSS_MB
+
+        self._local = Executor(data_bundle)
+        self.expr_cache = self._local.expr_cache
+        self.shared = SharedDataBundle(data_bundle)
+        self._context = multiprocessing.get_context("spawn")
+
+        # RLIMIT_AS 限制的是地址空间，需要为已映射的共享数据与解释器本身留出余量
+        self._address_space = None
+        if self.max_rss_mb:
+            self._address_space = self.shared.nbytes + (self.max_rss_mb + 1024) * 1024 * 1024
+
+        if psutil is None:
+            logger.warning("未安装 psutil，沙箱仅依靠 resource 限制内存 (Windows 下不限制内存)。")
+
+    def run_formula(self, factor_formula, factor_name, output_dir, profile=None):
+        # 多个流水线线程共用主进程中的同一个 Executor，由其内部的锁串行求值
+        return self._local.run_formula(factor_formula, factor_name, output_dir, profile=profile)
+
+    def wait_written(self, factor_name, output_dir):
+        """沙箱子进程同步写入；主进程求值的 DSL 公式可能在后台写入"""
+        return self._local.wait_written(factor_name, output_dir)
+
+    def run(self, factor_func, factor_name, output_dir, profile=None):
+        logger.info(f"正在沙箱中执行函数: {factor_name} ...")
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_sandbox_main,
+            args=(self.shared.spec, CodeManager.source_of(factor_func), factor_func.__name__,
+                  factor_name, output_dir, self.cpu_time, self._address_space, sender),
+            daemon=True
+        )
+        process.start()
+        sender.close()
+
+        started = time.perf_counter()
+        measured = {}
+        try:
+            return self._wait(process, receiver, measured)
+        finally:
+            if profile is not None:
+                # 子进程被终止时没有回传，至少记录墙钟时间与监控到的内存 (私有常驻内存的峰值)
+                measured.setdefault("wall_sec", time.perf_counter() - started)
+                profile.update(measured)
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+
+    def _wait(self, process, receiver, measured):
+        deadline = time.monotonic() + self.wall_time
+        monitor = psutil.Process(process.pid) if psutil is not None else None
+
+        while True:
+            if receiver.poll(0.5):
+                try:
+                    success, message, child_profile = receiver.recv()
+                except EOFError:
+                    break
+                measured.update(child_profile)
+                if not success and "MemoryError" in message:
+                    return False, self._memory_exceeded()
+                return success, message
+
+            if not process.is_alive():
+                break
+
+            if time.monotonic() > deadline:
+                logger.error(f"因子执行超过墙钟时间限制 ({self.wall_time}s)，已终止。")
+                return False, f"Timeout: factor execution exceeded the wall-time limit of {self.wall_time}s. {TIMEOUT_HINT}"
+
+            if monitor is None:
+                continue
+            rss_mb = self._private_rss_mb(monitor)
+            measured["peak_rss_mb"] = max(measured.get("peak_rss_mb", 0), rss_mb)
+            if self.max_rss_mb and rss_mb > self.max_rss_mb:
+                logger.error(f"因子执行超过内存限制 ({self.max_rss_mb} MB)，已终止。")
+                return False, self._memory_exceeded()
+
+        # 子进程未回传结果就退出，根据退出码判断原因
+        process.join()
+        exitcode = process.exitcode
+        if hasattr(signal, "SIGXCPU") and exitcode == -signal.SIGXCPU:
+            return False, f"Timeout: factor execution exceeded the CPU-time limit of {self.cpu_time}s. {TIMEOUT_HINT}"
+        if hasattr(signal, "SIGKILL") and exitcode == -signal.SIGKILL:
+            # 通常是系统 OOM killer
+            return False, self._memory_exceeded()
+        return False, f"Crash: sandbox worker exited unexpectedly with code {exitcode}."
+
+    def _memory_exceeded(self):
+        return f"MemoryExceeded: factor execution exceeded the memory limit of {self.max_rss_mb} MB. {MEMORY_HINT}"
+
+    @staticmethod
+    def _private_rss_mb(monitor):
+        """常驻内存减去共享页 (共享内存中的行情数据不计入)"""
+        try:
+            info = monitor.memory_info()
+        except Exception:
+            return 0
+        return (info.rss - getattr(info, "shared", 0)) / (1024 * 1024)
+
+    def shutdown(self):
+        self.shared.close()
@@ -0,0 +1,106 @@
+# engine/shared_data.py
+import numpy as np
+import pandas as pd
+
+
+class ReadOnlyViolation(RuntimeError):
+    """生成的代码试图原地修改共享的只读输入数据"""
+    pass
+
+
+READONLY_HINT = (
+    "Inputs df_raw/df_index are shared read-only data and must not be modified in place. "
+    "Create a new frame first, e.g. df_raw = df_raw.sort_values(['SecuCode', 'TradingDay']).reset_index(drop=True) "
+    "or df_raw = df_raw.copy(), and never use inplace=True on the inputs."
+)
+
+
+def is_readonly_error(exc):
+    """NumPy 对只读缓冲区写入时抛出的 ValueError"""
+    return isinstance(exc, ValueError) and "read-only" in str(exc)
+
+
+def _block_arrays(df):
+    """
+    DataFrame 底层的 NumPy 块 (分类列取编码数组)
+    依赖 pandas 内部结构 (df._mgr.blocks / Categorical._ndarray)，结构不符合预期时返回 None
+    """
+    blocks = getattr(getattr(df, "_mgr", None), "blocks", None)
+    if blocks is None:
+        return None
+    arrays = []
+    for block in blocks:
+        if not hasattr(block, "values"):
+            return None
+        values = block.values
+        if isinstance(values, pd.Categorical):
+            values = getattr(values, "_ndarray", None)
+            if not isinstance(values, np.ndarray):
+                return None
+        # 字符串等扩展类型的块无法冻结，由 SharedFrame.verify 的逐值比较兜底
+        if isinstance(values, np.ndarray):
+            arrays.append(values)
+    return arrays
+
+
+def freeze_frame(df):
+    """
+    把 DataFrame 底层 NumPy 块原地标记为只读 (零拷贝)
+    Returns:
+        是否成功；当前 pandas 版本的内部结构不支持时返回 False (不修改 df)，调用方应回退到 'copy' 隔离
+    """
+    try:
+        arrays = _block_arrays(df)
+    except Exception:
+        return False
+    if arrays is None:
+        return False
+    for values in arrays:
+        values.flags.writeable = False
+    return True
+
+
+def _buffer_of(series):
+    """数值 / 日期列的底层数组，分类列取其编码数组；其他类型 (或取不到编码数组) 返回 None"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return getattr(series.array, "_ndarray", None)
+    if series.dtype.kind in "biufcmM":
+        return series.to_numpy()
+    return None
+
+
+class SharedFrame:
+    """
+    全局唯一、只读的输入数据。
+    每次执行只分发浅拷贝视图，执行后校验视图中原有列是否被原地改写。
+    创建前应先用 freeze_frame 冻结 (不支持时不应使用本类)。
+    """
+
+    def __init__(self, df):
+        self.frame = df
+        self._columns = list(df.columns)
+        # 记录数值/日期/分类列的缓冲区，校验时先做 O(1) 的内存重叠判断
+        self._buffers = {}
+        for col in self._columns:
+            buffer = _buffer_of(df[col])
+            if buffer is not None:
+                self._buffers[col] = buffer
+
+    def view(self):
+        return self.frame.copy(deep=False)
+
+    def verify(self, view, arg_name):
+        """视图中原有列被删除、改写或重排时抛出 ReadOnlyViolation"""
+        if not isinstance(view, pd.DataFrame):
+            return
+        for col in self._columns:
+            if col not in view.columns:
+                raise ReadOnlyViolation(f"Column '{col}' was dropped from {arg_name} in place. {READONLY_HINT}")
+
+            buffer = self._buffers.get(col)
+            current = _buffer_of(view[col]) if buffer is not None else None
+            if current is not None and np.may_share_memory(current, buffer):
+                continue
+            # 缓冲区已分离 (写时复制或块合并)，回退到逐值比较
+            if not view[col].equals(self.frame[col]):
+                raise ReadOnlyViolation(f"Column '{col}' of {arg_name} was modified in place. {READONLY_HINT}")
@@ -0,0 +1,315 @@
+# engine/ts_ops.py
+"""
+Alpha101 时序算子库: ts_min / ts_max / ts_argmin / ts_argmax / ts_rank / decay_linear / correlation / covariance
+
+生成的因子代码与 DSL 求值器共用这些算子，语义与 DSL 规范完全一致:
+    * 窗口内任一值缺失 (或不足 d 个值) 时结果为 NaN
+    * ts_argmax / ts_argmin 为窗口内最值距今的天数 (0 表示今天，并列时取较早的一天)
+    * ts_rank 为当天值在过去 d 天中的百分位排名 (并列取平均名次)，与 rolling(d).rank(pct=True) 相同
+    * decay_linear 权重为 d, d-1, ..., 1 (最新一天权重最大)，归一化后加权求和
+    * correlation / covariance 与 rolling(d).corr / cov 相同 (样本协方差，窗口内为常数时相关系数为 NaN)
+
+安装 numba 时使用编译的核函数 (最值用单调队列 O(n)，排名 / 加权 / 协方差逐窗口精确计算)，否则退回 numpy / pandas 向量化实现。
+
+输入形式:
+    * 长表 Series: 传入 by=df['SecuCode']，每只股票内部须按 TradingDay 升序 (先 sort_values)，返回同索引的 Series
+    * 日期 x 股票 二维数组: 沿 axis 0 计算，返回同形状数组
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _jit(func):
+    return njit(cache=True, nogil=True)(func) if njit is not None else None
+
+
+# ===========================
+# 1. 编译核函数
+# ===========================
+# 所有核函数作用于一维数组 values，bounds 为各段 (股票) 的起止位置，窗口不跨段
+def _extreme_loop(values, bounds, d, is_max, return_arg):
+    out = np.full(values.shape[0], np.nan)
+    # 单调队列 (存下标)，队首为窗口内最值，并列时保留较早的一天
+    queue = np.empty(np.max(np.diff(bounds)) if bounds.shape[0] > 1 else 0, dtype=np.int64)
+    for s in range(bounds.shape[0] - 1):
+        start, end = bounds[s], bounds[s + 1]
+        head, tail = 0, 0
+        last_nan = start - 1
+        for i in range(start, end):
+            v = values[i]
+            if np.isnan(v):
+                last_nan = i
+                head = tail
+                continue
+            # 每步只进入一个值，最多有一个下标过期
+            if tail > head and queue[head] <= i - d:
+                head += 1
+            if is_max:
+                while tail > head and values[queue[tail - 1]] < v:
+                    tail -= 1
+            else:
+                while tail > head and values[queue[tail - 1]] > v:
+                    tail -= 1
+            queue[tail] = i
+            tail += 1
+            if i - start >= d - 1 and last_nan <= i - d:
+                j = queue[head]
+                out[i] = (i - j) if return_arg else values[j]
+    return out
+
+
+def _rank_loop(values, bounds, d):
+    out = np.full(values.shape[0], np.nan)
+    for s in range(bounds.shape[0] - 1):
+        start, end = bounds[s], bounds[s + 1]
+        last_nan = start - 1
+        for i in range(start, end):
+            v = values[i]
+            if np.isnan(v):
+                last_nan = i
+                continue
+            if i - start < d - 1 or last_nan > i - d:
+                continue
+            less = 0
+            equal = 0
+            for k in range(i - d + 1, i + 1):
+                w = values[k]
+                less += w < v
+                equal += w == v
+            out[i] = (less + (equal + 1) / 2.0) / d
+    return out
+
+
+def _decay_loop(values, bounds, weights):
+    out = np.full(values.shape[0], np.nan)
+    d = weights.shape[0]
+    for s in range(bounds.shape[0] - 1):
+        start, end = bounds[s], bounds[s + 1]
+        for i in range(start + d - 1, end):
+            total = 0.0
+            for lag in range(d):
+                total += weights[lag] * values[i - lag]
+            out[i] = total
+    return out
+
+
+def _cov_loop(x, y, bounds, d, is_corr):
+    # 逐窗口两遍计算 (先均值再离差): 滑动和 / 增量更新在收益率这类相邻值接近的短窗口上误差可达 1e-6
+    out = np.full(x.shape[0], np.nan)
+    for s in range(bounds.shape[0] - 1):
+        start, end = bounds[s], bounds[s + 1]
+        last_nan = start - 1
+        # 连续相同值的个数: 窗口内为常数时方差精确为 0
+        run_x = run_y = 0
+        for i in range(start, end):
+            a, b = x[i], y[i]
+            if np.isnan(a) or np.isnan(b):
+                last_nan = i
+                run_x = run_y = 0
+                continue
+            run_x = run_x + 1 if (run_x > 0 and x[i - 1] == a) else 1
+            run_y = run_y + 1 if (run_y > 0 and y[i - 1] == b) else 1
+            if i - start < d - 1 or last_nan > i - d:
+                continue
+
+            constant = run_x >= d or run_y >= d
+            if constant:
+                if not is_corr:
+                    out[i] = 0.0
+                continue
+            mean_x = mean_y = 0.0
+            for k in range(i - d + 1, i + 1):
+                mean_x += x[k]
+                mean_y += y[k]
+            mean_x /= d
+            mean_y /= d
+            m2_x = m2_y = co_xy = 0.0
+            for k in range(i - d + 1, i + 1):
+                dx, dy = x[k] - mean_x, y[k] - mean_y
+                m2_x += dx * dx
+                m2_y += dy * dy
+                co_xy += dx * dy
+            if not is_corr:
+                out[i] = co_xy / (d - 1)
+            elif m2_x > 0 and m2_y > 0:
+                out[i] = co_xy / np.sqrt(m2_x * m2_y)
+    return out
+
+
+_extreme_jit = _jit(_extreme_loop)
+_rank_jit = _jit(_rank_loop)
+_decay_jit = _jit(_decay_loop)
+_cov_jit = _jit(_cov_loop)
+
+
+# ===========================
+# 2. 向量化实现 (未安装 numba 时)
+# ===========================
+def _window_complete(bounds, n, d, *arrays):
+    """窗口完整的位置: 不跨段且窗口内没有缺失值"""
+    seg_start = np.repeat(bounds[:-1], np.diff(bounds))
+    complete = np.arange(n) - seg_start >= d - 1
+    missing = np.zeros(n, dtype=bool)
+    for a in arrays:
+        missing |= np.isnan(a)
+    counts = np.concatenate([[0], np.cumsum(missing)])
+    complete[d - 1:] &= counts[d:] - counts[:-d] == 0
+    return complete
+
+
+def _extreme_numpy(values, bounds, d, is_max, return_arg):
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if d > n:
+        return out
+    if return_arg:
+        windows = sliding_window_view(values, d)
+        pos = windows.argmax(axis=-1) if is_max else windows.argmin(axis=-1)
+        out[d - 1:] = d - 1 - pos
+    else:
+        rolling = pd.Series(values).rolling(d)
+        out = (rolling.max() if is_max else rolling.min()).to_numpy(copy=True)
+    out[~_window_complete(bounds, n, d, values)] = np.nan
+    return out
+
+
+def _rank_numpy(values, bounds, d):
+    out = pd.Series(values).rolling(d).rank(pct=True).to_numpy(copy=True)
+    out[~_window_complete(bounds, len(values), d, values)] = np.nan
+    return out
+
+
+def _decay_numpy(values, bounds, weights):
+    total = weights[0] * values
+    for lag in range(1, len(weights)):
+        shifted = np.full(values.shape, np.nan)
+        shifted[lag:] = values[:-lag]
+        total = total + weights[lag] * shifted
+    total[~_window_complete(bounds, len(values), len(weights))] = np.nan
+    return total
+
+
+def _cov_numpy(x, y, bounds, d, is_corr):
+    rolling = pd.Series(x).rolling(d)
+    out = (rolling.corr(pd.Series(y)) if is_corr else rolling.cov(pd.Series(y))).to_numpy(copy=True)
+    out[~_window_complete(bounds, len(x), d, x, y)] = np.nan
+    if is_corr:
+        out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _extreme(values, bounds, d, is_max, return_arg):
+    if _extreme_jit is not None:
+        return _extreme_jit(values, bounds, d, is_max, return_arg)
+    return _extreme_numpy(values, bounds, d, is_max, return_arg)
+
+
+def _rank(values, bounds, d):
+    if _rank_jit is not None:
+        return _rank_jit(values, bounds, d)
+    return _rank_numpy(values, bounds, d)
+
+
+def _decay(values, bounds, d):
+    weights = np.arange(d, 0, -1, dtype=float)
+    weights /= weights.sum()
+    if _decay_jit is not None:
+        return _decay_jit(values, bounds, weights)
+    return _decay_numpy(values, bounds, weights)
+
+
+def _cov(x, y, bounds, d, is_corr):
+    if _cov_jit is not None:
+        return _cov_jit(x, y, bounds, d, is_corr)
+    return _cov_numpy(x, y, bounds, d, is_corr)
+
+
+# ===========================
+# 3. 输入整理
+# ===========================
+def _apply(kernel, inputs, d, by, *args):
+    """
+    把长表 Series / 一维数组 (按 by 分段) 或 日期 x 股票 数组 (按列分段) 整理为核函数的一维输入
+    """
+    d = int(d)
+    if d < 1:
+        raise ValueError(f"窗口长度必须为正整数: {d}")
+    first = inputs[0]
+
+    if isinstance(first, np.ndarray) and first.ndim == 2:
+        num_days, num_stocks = first.shape
+        flat = [np.ascontiguousarray(np.broadcast_to(a, first.shape).T, dtype=np.float64).ravel() for a in inputs]
+        bounds = np.arange(0, num_days * num_stocks + 1, max(num_days, 1), dtype=np.int64)
+        return kernel(*flat, bounds, d, *args).reshape(num_stocks, num_days).T
+
+    flat = [np.asarray(a, dtype=np.float64).ravel() for a in inputs]
+    n = flat[0].shape[0]
+    order = None
+    if by is None:
+        bounds = np.array([0, n], dtype=np.int64)
+    else:
+        codes = pd.factorize(np.asarray(by))[0]
+        if len(codes) and np.any(codes[1:] < codes[:-1]):
+            # 股票不连续: 稳定排序后计算 (保持股票内部的时间顺序)，再还原顺序
+            order = np.argsort(codes, kind="stable")
+            codes = codes[order]
+            flat = [a[order] for a in flat]
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [n]]).astype(np.int64)
+
+    out = kernel(*flat, bounds, d, *args)
+    if order is not None:
+        restored = np.empty_like(out)
+        restored[order] = out
+        out = restored
+    if isinstance(first, pd.Series):
+        return pd.Series(out, index=first.index)
+    return out
+
+
+# ===========================
+# 4. 公开算子
+# ===========================
+def ts_min(x, d, by=None):
+    """过去 d 天最小值"""
+    return _apply(_extreme, [x], d, by, False, False)
+
+
+def ts_max(x, d, by=None):
+    """过去 d 天最大值"""
+    return _apply(_extreme, [x], d, by, True, False)
+
+
+def ts_argmin(x, d, by=None):
+    """过去 d 天最小值距今的天数"""
+    return _apply(_extreme, [x], d, by, False, True)
+
+
+def ts_argmax(x, d, by=None):
+    """过去 d 天最大值距今的天数"""
+    return _apply(_extreme, [x], d, by, True, True)
+
+
+def ts_rank(x, d, by=None):
+    """当天值在过去 d 天中的百分位排名"""
+    return _apply(_rank, [x], d, by)
+
+
+def decay_linear(x, d, by=None):
+    """过去 d 天线性衰减加权平均"""
+    return _apply(_decay, [x], d, by)
+
+
+def correlation(x, y, d, by=None):
+    """过去 d 天 x 与 y 的相关系数"""
+    return _apply(_cov, [x, y], d, by, True)
+
+
+def covariance(x, y, d, by=None):
+    """过去 d 天 x 与 y 的样本协方差"""
+    return _apply(_cov, [x, y], d, by, False)
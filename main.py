@@ -1,8 +1,11 @@
 # main.py
+import argparse
+import asyncio
 import os
 import sys
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -23,8 +26,20 @@ from core.llm_zhipu import ZhipuLLM
 
 # 引擎模块
 from engine.code_manager import CodeManager
+from engine.correlation_filter import CorrelationIndex
+from engine.evaluation import evaluate_records
 from engine.executor import Executor
+from engine.factor_store import get_factor_store, remove_factor
+from engine.factor_writer import flush_factor_writes
+from engine.incremental import IncrementalUpdater
+from engine.parallel_executor import ParallelExecutor
+from engine.sandbox import SandboxExecutor
+from engine.pipeline import AsyncMiningPipeline
+from engine.profiler import FactorProfile, summarize_profiles
+from core.llm_cache import get_completion_cache
+from engine.dsl_evaluator import DSLParseError, parse_formula, render_factor_module
 
+from engine.checkpoint import RunJournal
 from engine.metadata_recorder import MetadataRecorder 
 
 warnings.filterwarnings("ignore") 
@@ -52,11 +67,85 @@ def get_llm_instance(provider_name):
     else:
         raise ValueError(f"未知的模型类型: {provider_name}")
 
-def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir, factor_output_dir, recorder, seed_idea, provider_name):
+def try_native_evaluation(executor, factor_name, factor_formula, code_output_dir, factor_output_dir, checkpoint=None, reserved_name=None, profile=None):
     """
-    处理单个因子：生成 -> 保存 -> 执行 -> (自动修复循环) -> 记录
+    优先使用 DSL 原生求值器计算因子，跳过 LLM 编码
+    :param checkpoint: IdeaCheckpoint，分配文件名后写入断点日志
+    :param reserved_name: 续跑时沿用上次分配的文件名
+    :param profile: FactorProfile，记录求值的资源消耗
+    Returns:
+        (unique_name, code_path, code_string)；等价的因子代码只在通过后续检查后才由调用方写入 code_path
+        求值失败时 code_string 为 None，由 LLM 编码兜底并沿用已分配 (已写入断点日志) 的文件名；
+        公式无法解析时返回 None (尚未分配文件名)
+    """
+    try:
+        parse_formula(factor_formula)
+    except DSLParseError as e:
+        logger.info(f"公式无法被 DSL 解析器识别，回退到 LLM 编码: {e}")
+        return None
+
+    if reserved_name:
+        unique_name = reserved_name
+        code_path = os.path.join(code_output_dir, f"{unique_name}.py")
+        CodeManager.claim_factor_name(unique_name, code_output_dir)
+    else:
+        unique_name, code_path = CodeManager.reserve_factor_name(factor_name, code_output_dir)
+    if checkpoint is not None:
+        checkpoint.save_code(unique_name, code_path, 0)
+    execution = profile.new_execution() if profile is not None else None
+    success, message = executor.run_formula(factor_formula, unique_name, factor_output_dir, profile=execution)
+    if not success:
+        logger.warning(f"原生求值失败，回退到 LLM 编码: {message}")
+        return unique_name, code_path, None
+
+    # 等价的因子代码，便于复现与后续增量更新
+    code_string = render_factor_module(factor_formula, factor_name, unique_name)
+    return unique_name, code_path, code_string
+
+def confirm_write(executor, factor_name, factor_output_dir):
+    """
+    等待因子输出的后台写入完成 (执行阶段此时已可处理下一个因子)
+    Returns:
+        "Success" 或 "Write_Fail"
+    """
+    if not hasattr(executor, 'wait_written'):
+        return "Success"
+    success, message = executor.wait_written(factor_name, factor_output_dir)
+    if not success:
+        logger.error(f"因子 {factor_name} 输出写入失败:\n{message}")
+        return "Write_Fail"
+    return "Success"
+
+def check_redundancy(library, factor_name, factor_output_dir, code_path):
+    """
+    与因子库做相关性比对，冗余因子删除其输出与代码
+    Returns:
+        "Success" 或 "Redundant"
+    """
+    if library is None:
+        return "Success"
+    try:
+        redundant, most_similar, corr = library.check_and_add(factor_name)
+    except Exception as e:
+        logger.warning(f"相关性检查失败，按通过处理: {e}")
+        return "Success"
+
+    if not redundant:
+        return "Success"
+    logger.warning(f"因子 {factor_name} 与已有因子 {most_similar} 相关系数 {corr:.3f}，判定为冗余。")
+    remove_factor(factor_output_dir, factor_name)
+    if code_path and os.path.exists(code_path):
+        os.remove(code_path)
+    return "Redundant"
+
+def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir, factor_output_dir, recorder, seed_idea, provider_name, library=None, checkpoint=None, profile=None):
+    """
+    处理单个因子：生成 -> 保存 -> 执行 -> (自动修复循环) -> 相关性过滤 -> 记录
     :param llm_coding: 专门用于写代码的 LLM 实例 (如 Zhipu)
     :param provider_name: 记录日志用的模型名称
+    :param library: CorrelationIndex，为 None 时不做相关性过滤
+    :param checkpoint: IdeaCheckpoint，记录进度以便中断后续跑，为 None 时不记录
+    :param profile: FactorProfile (已含构思耗时)，LLM 调用与执行的资源消耗随记录保存
     """
     # 1. 提取元数据
     original_factor_name = idea_dict.get("factor_name")
@@ -68,7 +157,7 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
         return
 
     logger.info(f"--- 开始处理因子: {original_factor_name} (由 {provider_name} 编写) ---")
-    
+
     # === 配置参数 ===
     MAX_RETRIES = 2 
     status = "Fail"
@@ -77,41 +166,91 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
     current_code = None
     final_unique_name = None 
     final_code_path = "" 
+    start_attempt = 0
+    profile = profile or FactorProfile()
 
-    # === 阶段 1: 初次代码生成 ===
-    try:
-        input_prompt = f"Formula: {factor_formula}\nDescription: {factor_desc}"
-        # 使用传入的 Coding LLM 生成代码
-        current_code = llm_coding.code_generation(input_prompt, original_factor_name)
-        
-        if not current_code:
-            logger.error(f"{original_factor_name} 代码生成返回为空。")
-            recorder.add_record(provider_name, seed_idea, original_factor_name, factor_formula, factor_desc, "GenCode_Fail")
-            return
+    # === 断点续跑: 沿用上次分配的文件名，日志中有代码时直接从该代码继续修复循环 ===
+    if checkpoint is not None:
+        recorder = checkpoint.wrap(recorder)
+        if checkpoint.resume:
+            final_unique_name = checkpoint.resume["factor_name"]
+            final_code_path = checkpoint.resume["code_path"]
+            if checkpoint.resume.get("code"):
+                current_code = checkpoint.resume["code"]
+            elif os.path.exists(final_code_path) and os.path.getsize(final_code_path) > 0:
+                # 旧版本的日志不含源码，代码在文件中
+                with open(final_code_path, "r", encoding="utf-8") as f:
+                    current_code = f.read()
+            if current_code is not None:
+                start_attempt = min(checkpoint.resume["attempt"], MAX_RETRIES)
+                logger.info(f"从断点继续: {final_unique_name} (第 {start_attempt} 次尝试的代码)")
 
-    except Exception as e:
-        logger.error(f"代码生成阶段发生异常: {e}")
+    # === 阶段 0: DSL 原生求值 (无需 LLM) ===
+    native_result = None
+    if current_code is None:
+        native_result = try_native_evaluation(executor, original_factor_name, factor_formula, code_output_dir,
+                                              factor_output_dir, checkpoint, final_unique_name, profile)
+    if native_result and native_result[2] is None:
+        # 求值失败: LLM 编码沿用原生求值时分配的文件名，与断点日志一致
+        final_unique_name, final_code_path = native_result[:2]
+        native_result = None
+    if native_result:
+        unique_name, code_path, code_string = native_result
+        logger.info(f"--- 因子 {unique_name} 原生求值成功 ---")
+        status = confirm_write(executor, unique_name, factor_output_dir)
+        if status == "Success":
+            status = check_redundancy(library, unique_name, factor_output_dir, code_path)
+        if status == "Success":
+            CodeManager.persist_code(code_string, code_path, original_factor_name)
+        recorder.add_record(
+            provider=provider_name,
+            seed_idea=seed_idea,
+            factor_name=unique_name,
+            formula=factor_formula,
+            description=factor_desc,
+            status=status,
+            code_path=code_path if status == "Success" else "Deleted",
+            profile=profile.as_record()
+        )
         return
 
+    # === 阶段 1: 初次代码生成 (续跑且代码已保存时跳过) ===
+    if current_code is None:
+        try:
+            input_prompt = f"Formula: {factor_formula}\nDescription: {factor_desc}"
+            # 使用传入的 Coding LLM 生成代码
+            with profile.stage("codegen"):
+                current_code = llm_coding.code_generation(input_prompt, original_factor_name)
+            
+            if not current_code:
+                logger.error(f"{original_factor_name} 代码生成返回为空。")
+                recorder.add_record(provider_name, seed_idea, original_factor_name, factor_formula, factor_desc, "GenCode_Fail", "N/A",
+                                    profile=profile.as_record())
+                return
+
+        except Exception as e:
+            logger.error(f"代码生成阶段发生异常: {e}")
+            return
+
     # === 阶段 2: 执行与修复循环 ===
-    for attempt in range(MAX_RETRIES + 1):
+    for attempt in range(start_attempt, MAX_RETRIES + 1):
         if attempt > 0:
             logger.info(f">>> [第 {attempt} 次修复] 正在尝试修复 {original_factor_name} ...")
         
-        # A. 保存代码 (自动重命名逻辑)
-        target_filename = final_unique_name if attempt > 0 else None
-        
+        # A. 加载代码 (首次分配文件名，之后沿用同一文件名；成功后才写入文件)
         func, unique_name, code_path = CodeManager.save_and_load_function(
             code_string=current_code,
             factor_name=original_factor_name,   
             output_dir=code_output_dir,
-            specific_name=target_filename       
+            specific_name=final_unique_name       
         )
         
         # 锁定文件名
-        if attempt == 0:
+        if final_unique_name is None:
             final_unique_name = unique_name
             final_code_path = code_path
+        if checkpoint is not None and code_path:
+            checkpoint.save_code(final_unique_name, final_code_path, attempt, CodeManager.clean_code(current_code))
         
         # B. 语法检查
         if not func:
@@ -120,7 +259,8 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
             
             if attempt < MAX_RETRIES:
                 # 使用 Coding LLM 进行修复
-                new_code = llm_coding.code_refinement(current_code, err_msg, original_factor_name, factor_formula)
+                with profile.stage("refinement"):
+                    new_code = llm_coding.code_refinement(current_code, err_msg, original_factor_name, factor_formula)
                 if new_code:
                     current_code = new_code
                     continue
@@ -129,8 +269,23 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
             else:
                 break
 
-        # C. 执行
-        success, message = executor.run(func, final_unique_name, factor_output_dir)
+        # C. 静态性能检查 (不触碰数据，秒级发现慢速写法)
+        lint_issues = CodeManager.lint_performance(current_code)
+        if lint_issues:
+            err_msg = "PerformanceLint: the code uses patterns that are too slow for the full panel:\n" + "\n".join(lint_issues)
+            logger.warning(f"{final_unique_name} 未通过性能检查:\n" + "\n".join(lint_issues))
+
+            if attempt < MAX_RETRIES:
+                with profile.stage("refinement"):
+                    new_code = llm_coding.code_refinement(current_code, err_msg, original_factor_name, factor_formula)
+                if new_code:
+                    current_code = new_code
+                    continue
+            # 最后一次机会 (或 AI 放弃修复) 时仍尝试执行，由执行结果决定成败
+            logger.info("性能检查未通过，仍尝试执行当前代码。")
+
+        # D. 执行
+        success, message = executor.run(func, final_unique_name, factor_output_dir, profile=profile.new_execution())
         
         if success:
             status = "Success"
@@ -142,12 +297,13 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
             if attempt < MAX_RETRIES:
                 logger.info("请求 AI 进行自我修正...")
                 # 传入公式防止逻辑漂移
-                refined_code = llm_coding.code_refinement(
-                    old_code=current_code, 
-                    error_msg=message, 
-                    factor_name=original_factor_name,
-                    formula=factor_formula 
-                )
+                with profile.stage("refinement"):
+                    refined_code = llm_coding.code_refinement(
+                        old_code=current_code, 
+                        error_msg=message, 
+                        factor_name=original_factor_name,
+                        formula=factor_formula 
+                    )
                 
                 if refined_code:
                     current_code = refined_code
@@ -157,9 +313,15 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
             else:
                 logger.error(f"已达到最大重试次数 ({MAX_RETRIES})。")
 
-    # === 阶段 3: 清理与记录 ===
+    # === 阶段 3: 相关性过滤、清理与记录 ===
+    if status == "Success":
+        status = confirm_write(executor, final_unique_name, factor_output_dir)
+    if status == "Success":
+        status = check_redundancy(library, final_unique_name, factor_output_dir, final_code_path)
+    if status == "Success":
+        CodeManager.persist_code(current_code, final_code_path, func.__name__)
     
-    # 清理垃圾文件
+    # 清理旧版本留下的未成功代码文件
     if status != "Success" and final_code_path and os.path.exists(final_code_path):
         try:
             os.remove(final_code_path)
@@ -178,11 +340,15 @@ def process_single_factor_idea(llm_coding, executor, idea_dict, code_output_dir,
         formula=factor_formula,
         description=factor_desc,
         status=status,
-        code_path=csv_code_path
+        code_path=csv_code_path,
+        profile=profile.as_record()
     )
 
 
-def main():
+def main(resume=None):
+    """
+    :param resume: 续跑的运行 ID ('latest' 为最近一次)，为 None 时开始新的运行
+    """
     ideation_provider = settings.ACTIVE_IDEATION_PROVIDER
     coding_provider = settings.ACTIVE_CODING_PROVIDER
     
@@ -195,10 +361,28 @@ def main():
     
     os.makedirs(code_dir, exist_ok=True)
     os.makedirs(factor_dir, exist_ok=True)
-    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    journal_dir = os.path.join(base_dir, "journals")
+
+    # 断点日志: 续跑时沿用原运行的 ID，记录继续写入同一个 factor_records_*.csv
+    if resume:
+        journal_path = RunJournal.find(journal_dir, resume)
+        if journal_path is None:
+            logger.critical(f"未找到可续跑的运行: {resume}")
+            return
+        timestamp_str = RunJournal.run_id_of(journal_path)
+    else:
+        timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        journal_path = os.path.join(journal_dir, f"run_{timestamp_str}.jsonl")
+    journal = RunJournal(journal_path)
+    if journal.finished:
+        logger.info(f"运行 {timestamp_str} 已全部完成，无需续跑。")
+        return
 
     # 初始化记录器 (使用 MetadataRecorder)
     recorder = MetadataRecorder(os.path.join(base_dir, f"factor_records_{timestamp_str}.csv"))
+    if resume:
+        logger.info(f"=== 续跑运行 {timestamp_str}: 已完成 {len(journal.done)} 个变体 ===")
+        journal.restore_records(recorder)
 
     logger.info("=== 启动双模型量化挖掘框架 ===")
     logger.info(f"构思大脑 (Brain): {ideation_provider}")
@@ -209,6 +393,12 @@ def main():
 
         loader = DataLoader(settings.DATA_PATH_STOCK, settings.DATA_PATH_INDEX)    
         data_bundle = loader.load() 
+        # 宽面板供 DSL 原生求值器使用，避免每个因子重复 groupby (多进程模式下由工作进程各自构建)
+        if settings.SANDBOX_EXECUTION or settings.NUM_WORKERS <= 1:
+            loader.load_panel()
+        # 因子库分区键需在任何因子写入前建立 (工作进程只写因子列)
+        if settings.FACTOR_STORE_ENABLED:
+            get_factor_store(factor_dir).sync_keys(data_bundle['stock'])
           
     except Exception as e:
         logger.critical(f"数据加载失败: {e}")
@@ -223,7 +413,18 @@ def main():
         logger.critical(str(e))
         return
         
-    executor = Executor(data_bundle)
+    num_workers = settings.NUM_WORKERS
+    if settings.SANDBOX_EXECUTION:
+        executor = SandboxExecutor(data_bundle)
+    elif num_workers > 1:
+        executor = ParallelExecutor(data_bundle, num_workers)
+    else:
+        executor = Executor(data_bundle)
+
+    # 因子库相关性索引 (只需要面板的日期 / 股票轴)
+    library = None
+    if settings.CORR_FILTER_ENABLED:
+        library = CorrelationIndex(loader.load_panel(columns=[]), factor_dir, os.path.join(base_dir, "corr_index"))
 
     # 4. 获取任务
     tasks = settings.FACTOR_MINING_TASKS
@@ -233,45 +434,140 @@ def main():
 
     logger.info(f"即将开始执行 {len(tasks)} 个挖掘任务...")
 
-    for i, task in enumerate(tasks):
-        base_idea = task.get('idea')
-        num = task.get('num_variations', settings.DEFAULT_NUM_VARIATIONS)
+    if settings.ASYNC_PIPELINE:
+        # 构思 / 编码 / 执行 / 记录 四个阶段重叠进行
+        def process_idea(idea, seed_idea, stage_executor, stage_recorder, checkpoint, profile):
+            process_single_factor_idea(
+                llm_coding=llm_coding,
+                executor=stage_executor,
+                idea_dict=idea,
+                code_output_dir=code_dir,
+                factor_output_dir=factor_dir,
+                recorder=stage_recorder,
+                seed_idea=seed_idea,
+                provider_name=ideation_provider,
+                library=library,
+                checkpoint=checkpoint,
+                profile=profile
+            )
+
+        pipeline = AsyncMiningPipeline(
+            llm_ideation=llm_ideation,
+            process_idea=process_idea,
+            executor=executor,
+            recorder=recorder,
+            ideation_concurrency=settings.PIPELINE_IDEATION_CONCURRENCY,
+            coding_concurrency=settings.PIPELINE_CODING_CONCURRENCY,
+            execution_concurrency=max(num_workers, 1),
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+            journal=journal
+        )
+        asyncio.run(pipeline.run(tasks, settings.DEFAULT_NUM_VARIATIONS))
+    else:
+        for i, task in enumerate(tasks):
+            base_idea = task.get('idea')
+            num = task.get('num_variations', settings.DEFAULT_NUM_VARIATIONS)
         
-        if not base_idea: continue
+            if not base_idea: continue
 
-        logger.info(f"\n====== [任务 {i+1}/{len(tasks)}] 种子: {base_idea} ======")
+            logger.info(f"\n====== [任务 {i+1}/{len(tasks)}] 种子: {base_idea} ======")
         
-        # === 阶段 1: 构思 (使用 llm_ideation) ===
-        # 注意：这里调用的是“构思模型”
-        ideas = llm_ideation.ideation(base_idea, num)
+            # === 阶段 1: 构思 (使用 llm_ideation) ===
+            # 注意：这里调用的是“构思模型”
+            ideation_started = time.perf_counter()
+            ideas = journal.ideation(llm_ideation, base_idea, num)
         
-        if not ideas:
-            logger.error("构思阶段未返回有效结果。")
-            continue
+            if not ideas:
+                logger.error("构思阶段未返回有效结果。")
+                continue
+            # 构思耗时按变体数均摊到每条记录
+            ideation_sec = (time.perf_counter() - ideation_started) / len(ideas)
             
-        logger.info(f"构思完成: 生成 {len(ideas)} 个因子变体。")
+            logger.info(f"构思完成: 生成 {len(ideas)} 个因子变体。")
+            pending = journal.pending(base_idea, ideas)
 
-        # === 阶段 2: 编码与执行 (使用 llm_coding) ===
-        for j, idea in enumerate(ideas):
-            logger.info(f"\n>>> 正在处理变体 {j+1}/{len(ideas)} ...")
-            
-            # 注意：这里传入的是“代码模型”
-            process_single_factor_idea(
-                llm_coding=llm_coding,     
-                executor=executor,
-                idea_dict=idea,
-                code_output_dir=code_dir,
-                factor_output_dir=factor_dir,
-                recorder=recorder,
-                seed_idea=base_idea,
-                provider_name=ideation_provider 
-            )
+            # === 阶段 2: 编码与执行 (使用 llm_coding) ===
+            def handle_idea(j, idea):
+                logger.info(f"\n>>> 正在处理变体 {j+1}/{len(ideas)} ...")
             
-            # 稍作休整，防止 API 限流
-            time.sleep(1)
+                # 注意：这里传入的是“代码模型”
+                process_single_factor_idea(
+                    llm_coding=llm_coding,     
+                    executor=executor,
+                    idea_dict=idea,
+                    code_output_dir=code_dir,
+                    factor_output_dir=factor_dir,
+                    recorder=recorder,
+                    seed_idea=base_idea,
+                    provider_name=ideation_provider,
+                    library=library,
+                    checkpoint=journal.checkpoint(base_idea, j),
+                    profile=FactorProfile(ideation_sec)
+                )
+
+            if num_workers > 1:
+                # 多个变体同时进入 编码 -> 执行 -> 修复 循环，执行阶段由进程池并行计算
+                with ThreadPoolExecutor(max_workers=num_workers) as idea_pool:
+                    list(idea_pool.map(lambda item: handle_idea(*item), pending))
+            else:
+                for j, idea in pending:
+                    handle_idea(j, idea)
 
     logger.info("\n====== 所有任务执行完毕 ======")
-    logger.info(f"因子汇总表已保存至: {recorder.filepath}")
+    # 每个因子记录前已确认写入，这里只兜底等待残留的后台写入
+    flush_factor_writes()
+    journal.finish()
+    journal.close()
+    if hasattr(executor, 'shutdown'):
+        executor.shutdown()
+    if hasattr(executor, 'expr_cache'):
+        cache_stats = executor.expr_cache.stats()
+        logger.info(
+            f"子表达式缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+            f"(命中率 {cache_stats['hit_rate']:.1%}，淘汰 {cache_stats['evictions']})"
+        )
+    llm_cache = get_completion_cache()
+    if llm_cache is not None:
+        llm_stats = llm_cache.stats()
+        logger.info(f"LLM 缓存: 命中 {llm_stats['hits']} / 未命中 {llm_stats['misses']}")
+    summarize_profiles(recorder.query(run_id=recorder.run_id))
+    recorder.close()
+    logger.info(f"因子汇总表已保存至: {recorder.filepath} (历史记录: {recorder.db_path})")
+
+    if settings.EVALUATE_AFTER_RUN:
+        logger.info("\n====== 批量评价本次挖掘的因子 ======")
+        try:
+            evaluate_records(recorder.filepath, factor_dir, loader.load_panel(columns=[]))
+        except Exception as e:
+            logger.error(f"因子评价失败: {e}")
+
+def update_main():
+    """增量更新模式: 用已保存的因子代码把 factors/ 中的输出补齐到最新交易日"""
+    base_dir = os.path.join(settings.BASE_OUTPUT_DIR, settings.ACTIVE_IDEATION_PROVIDER)
+    code_dir = os.path.join(base_dir, "codes")
+    factor_dir = os.path.join(base_dir, "factors")
+
+    logger.info("=== 启动因子增量更新 ===")
+    try:
+        data_bundle = DataLoader(settings.DATA_PATH_STOCK, settings.DATA_PATH_INDEX).load()
+    except Exception as e:
+        logger.critical(f"数据加载失败: {e}")
+        return
+
+    summary = IncrementalUpdater(data_bundle, code_dir, factor_dir).update_all()
+    logger.info("\n====== 增量更新完毕 ======")
+    for status, names in summary.items():
+        logger.info(f"{status}: {len(names)} 个因子")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AI 量化因子挖掘框架")
+    parser.add_argument("--update", action="store_true", help="增量更新已保存的因子到最新交易日，不进行挖掘")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="RUN_ID",
+                        help="续跑中断的挖掘运行 (默认最近一次)，跳过已完成的种子与变体")
+    args = parser.parse_args()
+
+    if args.update:
+        update_main()
+    else:
+        main(resume=args.resume)
\ No newline at end of file
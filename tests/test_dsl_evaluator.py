@@ -0,0 +1,303 @@
+# tests/test_dsl_evaluator.py
+"""
+DSL 原生求值器 (engine.dsl_evaluator) 与子表达式缓存键 (engine.expr_cache.canonicalize):
+语法树结构、非法公式拒绝、算子语义与 pandas 参考实现一致、增量预热窗口、交换律规范化。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from data_loader.panel import PanelData
+from engine.dsl_evaluator import DSLEvaluator, DSLParseError, formula_lookback, parse_formula
+from engine.expr_cache import SubexpressionCache, canonicalize
+
+NUM_DAYS = 40
+CODES = ["000001", "000002", "300750", "600000", "600519"]
+
+
+def _stock_frame(with_nan=True, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2024-01-02", periods=NUM_DAYS)
+    df = pd.DataFrame({
+        "TradingDay": np.repeat(days, len(CODES)),
+        "SecuCode": np.tile(CODES, NUM_DAYS),
+    })
+    close = 10.0 * np.exp(np.cumsum(rng.normal(0, 0.02, (NUM_DAYS, len(CODES))), axis=0))
+    prev_close = np.vstack([close[:1] * 0.99, close[:-1]])
+    df["ClosePrice"] = close.ravel()
+    df["PrevClosePrice"] = prev_close.ravel()
+    df["OpenPrice"] = (prev_close * (1 + rng.normal(0, 0.01, close.shape))).ravel()
+    df["HighPrice"] = np.maximum(df["ClosePrice"], df["OpenPrice"]) * 1.01
+    df["LowPrice"] = np.minimum(df["ClosePrice"], df["OpenPrice"]) * 0.99
+    df["TurnOverVolume"] = rng.integers(0, 10_000, len(df)).astype(float)
+    df["TurnOverValue"] = df["TurnOverVolume"] * df["ClosePrice"]
+    if with_nan:
+        # 停牌: 个别股票某几天缺失行情
+        df.loc[[7, 23, 24, 101], ["ClosePrice", "OpenPrice", "TurnOverVolume"]] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module")
+def stock():
+    return _stock_frame()
+
+
+@pytest.fixture(scope="module")
+def evaluator(stock):
+    return DSLEvaluator(PanelData(stock))
+
+
+def _wide(df, column):
+    """pandas 参考面板: 日期 x 股票，与 PanelData 轴顺序一致"""
+    return df.pivot(index="TradingDay", columns="SecuCode", values=column)
+
+
+def _evaluate(evaluator, formula):
+    return np.broadcast_to(evaluator.evaluate(parse_formula(formula)), evaluator.shape)
+
+
+# ===========================
+# 解析
+# ===========================
+CLOSE, OPEN, VOL = ("field", "ClosePrice"), ("field", "OpenPrice"), ("field", "TurnOverVolume")
+
+
+@pytest.mark.parametrize("formula, expected", [
+    ("1 + 2 * close", ("bin", "+", ("num", 1.0), ("bin", "*", ("num", 2.0), CLOSE))),
+    ("(1 + 2) * close", ("bin", "*", ("bin", "+", ("num", 1.0), ("num", 2.0)), CLOSE)),
+    ("close - open - vol", ("bin", "-", ("bin", "-", CLOSE, OPEN), VOL)),
+    ("close ^ 2 ^ 3", ("bin", "^", CLOSE, ("bin", "^", ("num", 2.0), ("num", 3.0)))),
+    ("-close ^ 2", ("neg", ("bin", "^", CLOSE, ("num", 2.0)))),
+    ("-5", ("num", -5.0)),
+    ("+close", CLOSE),
+    ("1.5e2 + .5", ("bin", "+", ("num", 150.0), ("num", 0.5))),
+    ("close > open && vol > 0 || close == open",
+     ("bin", "||",
+      ("bin", "&&", ("bin", ">", CLOSE, OPEN), ("bin", ">", VOL, ("num", 0.0))),
+      ("bin", "==", CLOSE, OPEN))),
+    ("close > open ? 1 : vol < 0 ? -1 : 0",
+     ("if", ("bin", ">", CLOSE, OPEN), ("num", 1.0),
+      ("if", ("bin", "<", VOL, ("num", 0.0)), ("num", -1.0), ("num", 0.0)))),
+    ("delta(close, 5)", ("call", "delta", (CLOSE,), 5)),
+    ("Corr(close, volume, 10)", ("call", "correlation", (CLOSE, VOL), 10)),
+    ("ts_sum(close, 3) + sma(open, 2)",
+     ("bin", "+", ("call", "sum", (CLOSE,), 3), ("call", "mean", (OPEN,), 2))),
+    ("scale(close)", ("call", "scale", (CLOSE,), None)),
+    ("scale(close, 2)", ("call", "scale", (CLOSE, ("num", 2.0)), None)),
+    ("ret + returns", ("bin", "+", ("field", "returns"), ("field", "returns"))),
+    ("adv20 / vwap", ("bin", "/", ("field", "adv20"), ("field", "vwap"))),
+    ("HS300 + ClosePrice", ("bin", "+", ("field", "HS300"), CLOSE)),
+])
+def test_parse_tree(formula, expected):
+    assert parse_formula(formula) == expected
+
+
+@pytest.mark.parametrize("formula", [
+    "",
+    "   ",
+    "close +",
+    "(close",
+    "close)",
+    "close open",
+    "close $ open",
+    "close > open ? 1",
+    "foo(close)",
+    "unknown_field + 1",
+    "delta(close)",
+    "delta(close, open)",
+    "delta(close, 0)",
+    "correlation(close, 5)",
+    "abs(close, 1)",
+    "rank()",
+])
+def test_parse_rejects(formula):
+    with pytest.raises(DSLParseError):
+        parse_formula(formula)
+
+
+def test_parse_rejects_non_string():
+    with pytest.raises(DSLParseError):
+        parse_formula(None)
+
+
+# ===========================
+# 算子语义 (与 pandas 参考实现对比)
+# ===========================
+def _rolling(df, column, method, d):
+    return getattr(_wide(df, column).rolling(d), method)()
+
+
+@pytest.mark.parametrize("formula, reference", [
+    ("close", lambda df: _wide(df, "ClosePrice")),
+    ("-close + open * 2 - vol / 3",
+     lambda df: -_wide(df, "ClosePrice") + _wide(df, "OpenPrice") * 2 - _wide(df, "TurnOverVolume") / 3),
+    ("close ^ 2", lambda df: _wide(df, "ClosePrice") ** 2),
+    ("delay(close, 3)", lambda df: _wide(df, "ClosePrice").shift(3)),
+    ("delta(close, 2)", lambda df: _wide(df, "ClosePrice").diff(2)),
+    ("sum(close, 5)", lambda df: _rolling(df, "ClosePrice", "sum", 5)),
+    ("mean(open, 4)", lambda df: _rolling(df, "OpenPrice", "mean", 4)),
+    ("stddev(close, 6)", lambda df: _rolling(df, "ClosePrice", "std", 6)),
+    ("product(close, 3)", lambda df: _wide(df, "ClosePrice").rolling(3).apply(np.prod, raw=True)),
+    ("ts_min(close, 5)", lambda df: _rolling(df, "ClosePrice", "min", 5)),
+    ("ts_max(close, 5)", lambda df: _rolling(df, "ClosePrice", "max", 5)),
+    ("rank(close)", lambda df: _wide(df, "ClosePrice").rank(axis=1, pct=True)),
+    ("scale(close, 3)",
+     lambda df: _wide(df, "ClosePrice").mul(3).div(_wide(df, "ClosePrice").abs().sum(axis=1), axis=0)),
+    ("abs(delta(close, 1))", lambda df: _wide(df, "ClosePrice").diff().abs()),
+    ("sign(delta(close, 1))", lambda df: np.sign(_wide(df, "ClosePrice").diff())),
+    ("signedpower(delta(close, 1), 2)",
+     lambda df: np.sign(_wide(df, "ClosePrice").diff()) * _wide(df, "ClosePrice").diff().abs() ** 2),
+    ("log(close)", lambda df: np.log(_wide(df, "ClosePrice"))),
+    ("returns", lambda df: _wide(df, "ClosePrice") / _wide(df, "PrevClosePrice") - 1),
+    ("vwap", lambda df: _wide(df, "TurnOverValue") / _wide(df, "TurnOverVolume").where(lambda v: v > 0)),
+    ("adv5", lambda df: _rolling(df, "TurnOverValue", "mean", 5)),
+])
+def test_operator_matches_pandas(evaluator, stock, formula, reference):
+    expected = reference(stock).to_numpy(dtype=float)
+    np.testing.assert_allclose(_evaluate(evaluator, formula), expected, rtol=1e-9, equal_nan=True)
+
+
+def test_log_of_non_positive_is_nan(evaluator):
+    result = _evaluate(evaluator, "log(delta(close, 1))")
+    delta = _evaluate(evaluator, "delta(close, 1)")
+    assert np.isnan(result[delta <= 0]).all()
+    assert np.isfinite(result[delta > 0]).all()
+
+
+def test_max_min_ignore_single_nan(evaluator, stock):
+    close, shifted = _wide(stock, "ClosePrice"), _wide(stock, "ClosePrice").shift(1)
+    np.testing.assert_allclose(_evaluate(evaluator, "max(close, delay(close, 1))"),
+                               np.fmax(close, shifted), equal_nan=True)
+    np.testing.assert_allclose(_evaluate(evaluator, "min(close, delay(close, 1))"),
+                               np.fmin(close, shifted), equal_nan=True)
+
+
+def test_comparison_propagates_nan(evaluator, stock):
+    close, shifted = _wide(stock, "ClosePrice"), _wide(stock, "ClosePrice").shift(1)
+    result = _evaluate(evaluator, "close > delay(close, 1)")
+    missing = (close.isna() | shifted.isna()).to_numpy()
+    assert np.isnan(result[missing]).all()
+    np.testing.assert_array_equal(result[~missing], (close > shifted).to_numpy()[~missing].astype(float))
+
+
+def test_logical_ops(evaluator, stock):
+    up = (_wide(stock, "ClosePrice") > _wide(stock, "OpenPrice")).to_numpy()
+    active = (_wide(stock, "TurnOverVolume") > 5000).to_numpy()
+    valid = ~np.isnan(_evaluate(evaluator, "close + open + vol"))
+    np.testing.assert_array_equal(_evaluate(evaluator, "close > open && vol > 5000")[valid], (up & active)[valid])
+    np.testing.assert_array_equal(_evaluate(evaluator, "close > open || vol > 5000")[valid], (up | active)[valid])
+
+
+def test_conditional(evaluator, stock):
+    close, open_ = _wide(stock, "ClosePrice").to_numpy(), _wide(stock, "OpenPrice").to_numpy()
+    result = _evaluate(evaluator, "close > open ? close : -open")
+    valid = ~(np.isnan(close) | np.isnan(open_))
+    np.testing.assert_allclose(result[valid], np.where(close > open_, close, -open_)[valid])
+    # 条件缺失时结果缺失，不落入任一分支
+    assert np.isnan(result[~valid]).all()
+
+
+def test_window_longer_than_history(evaluator):
+    for formula in (f"delay(close, {NUM_DAYS})", f"product(close, {NUM_DAYS + 1})", f"sum(close, {NUM_DAYS + 1})"):
+        assert np.isnan(_evaluate(evaluator, formula)).all()
+
+
+def test_evaluate_frame_layout(stock):
+    df = DSLEvaluator(PanelData(stock)).evaluate_frame("delta(close, 1)", "Mom")
+    assert {"SecuCode", "TradingDay", "Mom"} <= set(df.columns)
+    merged = stock.merge(df, on=["SecuCode", "TradingDay"]).sort_values(["SecuCode", "TradingDay"])
+    assert len(merged) == len(stock)
+    np.testing.assert_allclose(merged["Mom"], merged.groupby("SecuCode")["ClosePrice"].diff(), equal_nan=True)
+
+
+# ===========================
+# 预热窗口
+# ===========================
+@pytest.mark.parametrize("formula, lookback", [
+    ("close", 0),
+    ("close / open - 1", 0),
+    ("delay(close, 3)", 3),
+    ("delta(close, 5)", 5),
+    ("sum(close, 4)", 3),
+    ("ts_rank(mean(close, 10), 5)", 13),
+    ("correlation(delay(close, 3), vol, 10)", 12),
+    ("rank(delta(close, 2)) + sum(open, 4)", 3),
+    ("-stddev(close, 6)", 5),
+    ("close > open ? delta(close, 7) : 0", 7),
+    ("adv20", 19),
+    ("mean(adv5, 3)", 6),
+    ("decay_linear(delta(vwap, 1), 4)", 4),
+])
+def test_formula_lookback(formula, lookback):
+    assert formula_lookback(parse_formula(formula)) == lookback
+
+
+@pytest.mark.parametrize("formula", [
+    "delta(close, 5)",
+    "ts_rank(mean(close, 10), 5)",
+    "correlation(delay(close, 3), vol, 10)",
+    "rank(stddev(returns, 6)) * adv5",
+    "decay_linear(product(close / open, 3), 4)",
+])
+def test_lookback_is_sufficient(formula):
+    """只用最后 lookback + 1 天的数据计算，最后一天的结果与全量计算一致 (增量更新的前提)"""
+    stock = _stock_frame(with_nan=False)
+    node = parse_formula(formula)
+    days = formula_lookback(node) + 1
+    tail = stock[stock["TradingDay"] >= stock["TradingDay"].unique()[-days]]
+    full = np.broadcast_to(DSLEvaluator(PanelData(stock)).evaluate(node), (NUM_DAYS, len(CODES)))
+    partial = np.broadcast_to(DSLEvaluator(PanelData(tail)).evaluate(node), (days, len(CODES)))
+    assert not np.isnan(partial[-1]).any()
+    np.testing.assert_allclose(partial[-1], full[-1], rtol=1e-9)
+
+
+# ===========================
+# 规范化与子表达式缓存
+# ===========================
+@pytest.mark.parametrize("a, b", [
+    ("close * vol", "vol * close"),
+    ("close + open + vol", "vol + (open + close)"),
+    ("close == open", "open == close"),
+    ("max(close, open)", "max(open, close)"),
+    ("correlation(close, vol, 5)", "correlation(vol, close, 5)"),
+    ("rank(close * vol) > 0 ? -(open + 1) : 0", "rank(vol * close) > 0 ? -(1 + open) : 0"),
+])
+def test_canonicalize_commutative(a, b):
+    assert canonicalize(parse_formula(a)) == canonicalize(parse_formula(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("close - open", "open - close"),
+    ("close / vol", "vol / close"),
+    ("close > open", "open > close"),
+    ("close ^ 2", "2 ^ close"),
+    ("delta(close, 5)", "delta(close, 6)"),
+    ("sum(close, 5)", "mean(close, 5)"),
+])
+def test_canonicalize_keeps_order_sensitive(a, b):
+    assert canonicalize(parse_formula(a)) != canonicalize(parse_formula(b))
+
+
+def test_canonicalize_idempotent_and_hashable():
+    node = canonicalize(parse_formula("correlation(rank(vol * close), open + high, 5) - max(low, 1)"))
+    assert canonicalize(node) == node
+    assert {node: 1}[canonicalize(parse_formula("correlation(open + high, rank(close * vol), 5) - max(low, 1)"))] == 1
+
+
+def test_cache_shared_across_commuted_formulas(stock):
+    cache = SubexpressionCache(max_bytes=64 * 1024 * 1024)
+    evaluator = DSLEvaluator(PanelData(stock), cache=cache)
+    first = evaluator.evaluate(parse_formula("rank(close * vol) + delta(open, 2)"))
+    hits = cache.stats()["hits"]
+    second = evaluator.evaluate(parse_formula("delta(open, 2) + rank(vol * close)"))
+    assert cache.stats()["hits"] > hits
+    np.testing.assert_array_equal(first, second)
+    # 缓存的面板只读，防止被后续因子原地修改
+    assert not first.flags.writeable
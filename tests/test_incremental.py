@@ -0,0 +1,134 @@
+# tests/test_incremental.py
+"""
+增量更新的预热窗口推断 (engine.incremental.infer_code_lookback):
+LOOKBACK 声明优先、DSL 公式精确计算、代码中窗口参数的累加上界，以及无法确定时返回 None (全量重算)。
+"""
+import os
+import sys
+import textwrap
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from engine.dsl_evaluator import render_factor_module
+from engine.incremental import EWM_WARMUP, infer_code_lookback
+
+
+def _lookback(code):
+    return infer_code_lookback(textwrap.dedent(code))
+
+
+# ===========================
+# 优先级
+# ===========================
+def test_lookback_declaration_wins():
+    assert _lookback("""
+        LOOKBACK = 3
+        FACTOR_FORMULA = 'delta(close, 20)'
+
+        def F(df_raw, df_index):
+            return df_raw['ClosePrice'].expanding().mean()
+    """) == 3
+
+
+def test_non_int_lookback_is_ignored():
+    assert _lookback("""
+        LOOKBACK = 'long'
+
+        def F(df_raw, df_index):
+            return df_raw.groupby('SecuCode')['ClosePrice'].shift(2)
+    """) == 2
+
+
+def test_formula_beats_code_windows():
+    # 公式精确计算，忽略代码中的其它窗口
+    assert _lookback("""
+        FACTOR_FORMULA = 'ts_rank(mean(close, 10), 5)'
+
+        def F(df_raw, df_index):
+            return df_raw['ClosePrice'].rolling(60).mean()
+    """) == 13
+
+
+@pytest.mark.parametrize("formula, expected", [
+    ("close / open - 1", 0),
+    ("delta(close, 5)", 5),
+    ("correlation(delay(close, 3), vol, 10)", 12),
+    ("rank(adv20)", 19),
+])
+def test_rendered_formula_module(formula, expected):
+    """DSL 原生求值器生成的代码文件"""
+    assert infer_code_lookback(render_factor_module(formula, "F", "F_v1")) == expected
+
+
+def test_invalid_formula_falls_back_to_code():
+    assert _lookback("""
+        FACTOR_FORMULA = 'delta(close'
+
+        def F(df_raw, df_index):
+            return df_raw.groupby('SecuCode')['ClosePrice'].diff(4)
+    """) == 4
+
+
+# ===========================
+# 代码中的窗口累加
+# ===========================
+@pytest.mark.parametrize("body, expected", [
+    ("return df_raw['ClosePrice'] / df_raw['OpenPrice']", 0),
+    ("return g['ClosePrice'].rolling(20).mean()", 20),
+    ("return g['ClosePrice'].rolling(window=10).std()", 10),
+    ("return g['ClosePrice'].shift(5)", 5),
+    ("return g['ClosePrice'].shift()", 1),
+    ("return g['ClosePrice'].diff(periods=3)", 3),
+    ("return g['ClosePrice'].pct_change()", 1),
+    # 嵌套窗口累加: 保守上界
+    ("return g['ClosePrice'].pct_change(5).rolling(20).std().shift(1)", 26),
+    ("return g['ClosePrice'].ewm(span=10).mean()", EWM_WARMUP * 10),
+    ("return g['ClosePrice'].ewm(halflife=3).mean().diff()", EWM_WARMUP * 3 + 1),
+    ("return ts_rank(df_raw['ClosePrice'], 10, by=df_raw['SecuCode'])", 10),
+    ("return ts_ops.correlation(df_raw['ClosePrice'], df_raw['TurnOverVolume'], 15)", 15),
+    ("return ts_ops.decay_linear(df_raw['ClosePrice'], d=8)", 8),
+    # 预计算的派生字段自带回看
+    ("return df_raw['adv20'] / df_raw['adv5']", 23),
+    ("return df_raw['ClosePrice'].rolling(3).mean() * df_raw['adv10']", 12),
+])
+def test_code_windows_accumulate(body, expected):
+    code = f"def F(df_raw, df_index):\n    g = df_raw.groupby('SecuCode')\n    {body}\n"
+    assert infer_code_lookback(code) == expected
+
+
+def test_named_window_constants():
+    # 同名常量多次赋值取最大值
+    assert _lookback("""
+        WINDOW = 10
+
+        def F(df_raw, df_index):
+            d = 5
+            d = 7
+            x = df_raw['ClosePrice'].rolling(WINDOW).mean()
+            return x.shift(d)
+    """) == 17
+
+
+# ===========================
+# 无法确定: 需要全部历史
+# ===========================
+@pytest.mark.parametrize("body", [
+    "return g['ClosePrice'].expanding().mean()",
+    "return g['ClosePrice'].cummax().expanding().max()",
+    "return g['ClosePrice'].rolling(n).mean()",
+    "return g['ClosePrice'].rolling(window=len(df_raw) // 10).mean()",
+    "return g['ClosePrice'].shift(n)",
+    # 负数字面量是一元运算，不当作常量窗口处理
+    "return g['ClosePrice'].shift(-5)",
+    "return g['ClosePrice'].ewm(alpha=0.1).mean()",
+    "return g['ClosePrice'].ewm(span=n).mean()",
+    "return ts_ops.ts_max(df_raw['ClosePrice'], n)",
+    "return ts_rank(df_raw['ClosePrice'], by=df_raw['SecuCode'])",
+])
+def test_unbounded_returns_none(body):
+    code = f"def F(df_raw, df_index, n=None):\n    g = df_raw.groupby('SecuCode')\n    {body}\n"
+    assert infer_code_lookback(code) is None
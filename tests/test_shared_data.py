@@ -0,0 +1,89 @@
+# tests/test_shared_data.py
+"""
+只读共享输入 (engine.shared_data) 依赖 pandas 内部结构冻结底层数组；
+升级 pandas 后先跑这里，确认冻结仍然生效、对共享视图的写入仍然报 ReadOnlyViolation。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from data_loader.compact import compact_frame
+from engine.executor import Executor
+from engine.shared_data import ReadOnlyViolation, SharedFrame, freeze_frame
+
+
+def _stock_frame(compact):
+    codes = np.repeat(["000001", "000002", "600000"], 4)
+    days = np.tile(pd.date_range("2024-01-02", periods=4), 3)
+    df = pd.DataFrame({
+        "SecuCode": codes,
+        "TradingDay": days,
+        "ClosePrice": np.linspace(10.0, 21.0, 12),
+        "TurnOverVolume": np.arange(12, dtype=np.int64) * 100,
+    })
+    return compact_frame(df) if compact else df
+
+
+@pytest.fixture(params=["full", "compact"])
+def stock(request):
+    return _stock_frame(request.param == "compact")
+
+
+def test_freeze_supported(stock):
+    """pandas 内部结构变化时 freeze_frame 返回 False，Executor 会静默回退到 'copy' 隔离"""
+    assert freeze_frame(stock)
+    assert Executor({"stock": stock, "index": None}, isolation="readonly", smoke_test=False,
+                    async_write=False).isolation == "readonly"
+
+
+def test_frozen_buffers_reject_writes(stock):
+    freeze_frame(stock)
+    view = SharedFrame(stock).view()
+    with pytest.raises(ValueError, match="read-only"):
+        view["ClosePrice"].to_numpy()[0] = 0.0
+    # pandas 的写时复制只把返回的视图标记为只读；底层块本身被冻结时，视图无法重新设为可写
+    with pytest.raises(ValueError):
+        view["ClosePrice"].to_numpy().flags.writeable = True
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda df: df.__setitem__("ClosePrice", 0.0),
+    lambda df: df.sort_values("ClosePrice", ascending=False, inplace=True),
+    lambda df: df.drop(columns=["TurnOverVolume"], inplace=True),
+])
+def test_in_place_modification_raises(stock, mutate):
+    freeze_frame(stock)
+    shared = SharedFrame(stock)
+    view = shared.view()
+    mutate(view)
+    with pytest.raises(ReadOnlyViolation):
+        shared.verify(view, "df_raw")
+    # 共享数据本身不受影响
+    assert stock["ClosePrice"].iloc[0] == pytest.approx(10.0)
+
+
+def test_executor_reports_violation(stock):
+    def Mutating(df_raw, df_index):
+        df_raw["ClosePrice"] = df_raw["ClosePrice"] * 2
+        df = df_raw[["SecuCode", "TradingDay"]].copy()
+        df["Mutating"] = 1.0
+        return df
+
+    executor = Executor({"stock": stock, "index": None}, isolation="readonly", smoke_test=False, async_write=False)
+    df_result, message = executor.compute(Mutating, "Mutating")
+    assert df_result is None
+    assert "ReadOnlyViolation" in message or "modified in place" in message
+
+
+def test_unsupported_internals_fall_back_to_copy(stock, monkeypatch):
+    import engine.shared_data as shared_data
+    monkeypatch.setattr(shared_data, "_block_arrays", lambda df: None)
+    executor = Executor({"stock": stock, "index": None}, isolation="readonly", smoke_test=False, async_write=False)
+    assert executor.isolation == "copy"
@@ -0,0 +1,175 @@
+# tests/test_ts_ops.py
+"""
+时序算子 (engine.ts_ops) 与 pandas rolling 参考实现逐值对比:
+numba 编译核函数与 numpy / pandas 向量化回退两条路径都覆盖，包含缺失值、预热窗口、并列值与常数窗口。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from engine import ts_ops
+
+NUM_DAYS = 60
+NUM_STOCKS = 6
+WINDOWS = [1, 2, 5, 10]
+JIT_KERNELS = ("_extreme_jit", "_rank_jit", "_decay_jit", "_cov_jit")
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def backend(request, monkeypatch):
+    """numba: 编译核函数 (未安装 numba 时跳过)；numpy: 强制走向量化回退"""
+    if request.param == "numba":
+        if ts_ops.njit is None:
+            pytest.skip("未安装 numba")
+    else:
+        for name in JIT_KERNELS:
+            monkeypatch.setattr(ts_ops, name, None)
+    return request.param
+
+
+def _panel(seed):
+    rng = np.random.default_rng(seed)
+    x = np.round(rng.normal(0, 1, (NUM_DAYS, NUM_STOCKS)), 1)  # 保留一位小数，制造并列值
+    x[5, 0] = np.nan
+    x[20:23, 1] = np.nan
+    x[:8, 2] = np.nan                 # 上市前缺失
+    x[-1, 3] = np.nan
+    x[30:45, 4] = 1.5                 # 常数段: 相关系数应为 NaN，协方差为 0
+    return x
+
+
+@pytest.fixture(scope="module")
+def x():
+    return _panel(0)
+
+
+@pytest.fixture(scope="module")
+def y():
+    y = _panel(1)
+    y[40:, 5] = np.nan
+    return y
+
+
+def _decay_weights(d):
+    weights = np.arange(1, d + 1, dtype=float)   # 窗口内由旧到新
+    return weights / weights.sum()
+
+
+REFERENCES = {
+    "ts_min": lambda r, d: r.min(),
+    "ts_max": lambda r, d: r.max(),
+    # np.argmax / argmin 取第一次出现的位置，即并列时较早的一天
+    "ts_argmax": lambda r, d: r.apply(lambda w: d - 1 - np.argmax(w), raw=True),
+    "ts_argmin": lambda r, d: r.apply(lambda w: d - 1 - np.argmin(w), raw=True),
+    "ts_rank": lambda r, d: r.rank(pct=True),
+    "decay_linear": lambda r, d: r.apply(lambda w: np.dot(w, _decay_weights(d)), raw=True),
+}
+
+
+def _pairwise_reference(name, x, y, d):
+    fx, fy = pd.DataFrame(x), pd.DataFrame(y)
+    if name == "covariance":
+        expected = fx.rolling(d).cov(fy).to_numpy()
+    else:
+        expected = fx.rolling(d).corr(fy).to_numpy(copy=True)
+        # 窗口内任一序列为常数时相关系数无定义
+        constant = (fx.rolling(d).std() == 0).to_numpy() | (fy.rolling(d).std() == 0).to_numpy()
+        expected[constant] = np.nan
+        expected[~np.isfinite(expected)] = np.nan
+    return expected
+
+
+@pytest.mark.parametrize("d", WINDOWS)
+@pytest.mark.parametrize("name", list(REFERENCES))
+def test_single_input_matches_pandas(backend, x, name, d):
+    expected = REFERENCES[name](pd.DataFrame(x).rolling(d), d).to_numpy()
+    result = getattr(ts_ops, name)(x, d)
+    assert result.shape == x.shape
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize("d", [2, 5, 10])
+@pytest.mark.parametrize("name", ["correlation", "covariance"])
+def test_pairwise_matches_pandas(backend, x, y, name, d):
+    result = getattr(ts_ops, name)(x, y, d)
+    np.testing.assert_allclose(result, _pairwise_reference(name, x, y, d), rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+def test_constant_window(backend, x, y):
+    d = 5
+    corr, cov = ts_ops.correlation(x, y, d), ts_ops.covariance(x, y, d)
+    # 第 4 列第 34..44 天窗口内 x 恒为 1.5
+    assert np.isnan(corr[34:45, 4]).all()
+    np.testing.assert_array_equal(cov[34:45, 4], 0.0)
+    assert np.isfinite(corr[45 + d - 1:, 4]).all()
+
+
+@pytest.mark.parametrize("name", list(REFERENCES))
+def test_warm_up_and_missing(backend, x, name):
+    d = 5
+    result = getattr(ts_ops, name)(x, d)
+    # 预热期: 前 d - 1 天没有完整窗口
+    assert np.isnan(result[:d - 1]).all()
+    assert np.isfinite(result[d - 1, 0])
+    # 缺失值影响其后 d 天 (含当天)
+    assert np.isnan(result[5:5 + d, 0]).all()
+    assert np.isfinite(result[5 + d, 0])
+    assert np.isnan(result[20:22 + d, 1]).all()
+    assert np.isfinite(result[22 + d, 1])
+    assert np.isnan(result[:8 + d - 1, 2]).all()
+    assert np.isnan(result[-1, 3])
+
+
+@pytest.mark.parametrize("name", list(REFERENCES) + ["correlation", "covariance"])
+def test_window_longer_than_history(backend, x, y, name):
+    func = getattr(ts_ops, name)
+    args = (x, y) if name in ("correlation", "covariance") else (x,)
+    assert np.isnan(func(*args, NUM_DAYS + 1)).all()
+
+
+def test_ties(backend):
+    """最值并列时取较早的一天，排名并列取平均名次"""
+    values = np.array([[1.0], [3.0], [2.0], [3.0], [0.0]])
+    np.testing.assert_array_equal(ts_ops.ts_argmax(values, 3)[2:, 0], [1.0, 2.0, 1.0])
+    np.testing.assert_array_equal(ts_ops.ts_argmin(values, 3)[2:, 0], [2.0, 1.0, 0.0])
+    np.testing.assert_allclose(ts_ops.ts_rank(values, 3)[2:, 0], [2 / 3, 2.5 / 3, 1 / 3])
+
+
+@pytest.mark.parametrize("name", list(REFERENCES) + ["correlation", "covariance"])
+def test_long_series_matches_panel(backend, x, y, name):
+    """长表 Series (按 by 分段，股票交错排列) 与 日期 x 股票 面板结果一致"""
+    codes = np.tile([f"{i:06d}" for i in range(NUM_STOCKS)], NUM_DAYS)
+    index = pd.RangeIndex(100, 100 + x.size)
+    long_x, long_y = pd.Series(x.ravel(), index=index), pd.Series(y.ravel(), index=index)
+    func = getattr(ts_ops, name)
+    if name in ("correlation", "covariance"):
+        panel, long = func(x, y, 5), func(long_x, long_y, 5, by=codes)
+    else:
+        panel, long = func(x, 5), func(long_x, 5, by=codes)
+    assert isinstance(long, pd.Series) and long.index.equals(index)
+    np.testing.assert_allclose(long.to_numpy().reshape(x.shape), panel, equal_nan=True)
+
+
+def test_backends_agree(x, y):
+    if ts_ops.njit is None:
+        pytest.skip("未安装 numba")
+    compiled = {name: getattr(ts_ops, name)(x, 5) for name in REFERENCES}
+    compiled["correlation"] = ts_ops.correlation(x, y, 5)
+    with pytest.MonkeyPatch.context() as mp:
+        for kernel in JIT_KERNELS:
+            mp.setattr(ts_ops, kernel, None)
+        for name, expected in compiled.items():
+            result = ts_ops.correlation(x, y, 5) if name == "correlation" else getattr(ts_ops, name)(x, 5)
+            np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        ts_ops.ts_max(np.zeros((3, 2)), 0)